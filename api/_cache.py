@@ -0,0 +1,335 @@
+"""
+Small TTL/LRU caches shared by the agent services.
+
+TTLCache is an in-process LRU with per-entry expiry. SQLiteCache is an optional
+on-disk tier that survives restarts (on Vercel only /tmp is writable, so point it
+there). TieredCache puts the two together and keeps hit/miss counters per tier.
+Values stored in the SQLite tier must be JSON serializable.
+
+SingleFlight coalesces concurrent identical async computations and serves the
+shared result for a short while after it finishes. Prefetcher starts work ahead of
+the request that will need it and hands over the finished or in-flight task.
+"""
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional
+
+_MISSING = object()
+
+
+def make_cache_key(*parts: Any, **params: Any) -> str:
+    """Build a stable cache key from positional parts and keyword params"""
+    canonical = json.dumps([parts, params], sort_keys=True, default=str, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase and collapse whitespace so trivially different strings share a key"""
+    return " ".join(text.lower().split())
+
+
+class TTLCache:
+    """Thread-safe in-memory LRU cache with a per-entry time to live"""
+
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """On-disk cache tier backed by a single SQLite table, with TTL and an entry cap"""
+
+    def __init__(self, path: str, max_entries: int = 5000, ttl_seconds: float = 86400, table: str = "cache"):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed ON {table} (accessed_at)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self.get_with_ttl(key, default)[0]
+
+    def get_with_ttl(self, key: str, default: Any = None) -> tuple:
+        """(value, seconds until it expires), or (default, None) on a miss"""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return default, None
+            value, expires_at = row
+            if expires_at <= now:
+                self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return default, None
+            self._conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+        return json.loads(value), expires_at - now
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        payload = json.dumps(value)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+                (key, payload, now + ttl, now),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+            overflow = self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0] - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    f"DELETE FROM {self.table} WHERE key IN "
+                    f"(SELECT key FROM {self.table} ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self.evictions += overflow
+            self._conn.commit()
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute(f"DELETE FROM {self.table}")
+            self._conn.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()[0]
+
+    def stats(self) -> dict:
+        return {
+            "path": self.path,
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class TieredCache:
+    """In-memory LRU in front of an optional SQLite tier; disk hits are promoted to memory until their disk expiry"""
+
+    def __init__(self, memory: TTLCache, disk: Optional[SQLiteCache] = None):
+        self.memory = memory
+        self.disk = disk
+        self.hits = 0
+        self.misses = 0
+
+    @classmethod
+    def create(cls, max_entries: int, ttl_seconds: float, disk_path: Optional[str] = None,
+               disk_max_entries: Optional[int] = None, table: str = "cache") -> "TieredCache":
+        disk = None
+        if disk_path:
+            disk = SQLiteCache(disk_path, max_entries=disk_max_entries or max_entries * 10,
+                               ttl_seconds=ttl_seconds, table=table)
+        return cls(TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds), disk)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        value = self.memory.get(key, _MISSING)
+        if value is _MISSING and self.disk is not None:
+            value, remaining = self.disk.get_with_ttl(key, _MISSING)
+            if value is not _MISSING:
+                # Promote with the time the entry has left, not a fresh TTL
+                self.memory.set(key, value, remaining)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl_seconds)
+        if self.disk is not None:
+            self.disk.set(key, value, ttl_seconds)
+
+    def delete(self, key: str) -> None:
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "memory": self.memory.stats(),
+            "disk": self.disk.stats() if self.disk is not None else None,
+        }
+
+
+class SingleFlight:
+    """Run at most one computation per key at a time and share its result.
+
+    Callers with the same key while a computation is in flight await that computation
+    instead of starting their own. The computation runs as its own task, so a caller
+    that disconnects does not cancel it for the others. Successful results are served
+    for result_ttl_seconds afterwards, if cacheable(result) says so; failures are not
+    remembered.
+    """
+
+    def __init__(self, result_ttl_seconds: float = 30, max_results: int = 256,
+                 cacheable: Optional[Callable[[Any], bool]] = None):
+        self._inflight = {}
+        self.cacheable = cacheable
+        self._recent = TTLCache(max_entries=max_results, ttl_seconds=result_ttl_seconds)
+        self.executed = 0
+        self.coalesced = 0
+        self.recent_hits = 0
+
+    async def run(self, key: str, compute: Callable[[], Awaitable[Any]]) -> Any:
+        recent = self._recent.get(key, _MISSING)
+        if recent is not _MISSING:
+            self.recent_hits += 1
+            return recent
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+            self.executed += 1
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: "asyncio.Future") -> None:
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        if self.cacheable is None or self.cacheable(task.result()):
+            self._recent.set(key, task.result())
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._inflight),
+            "executed": self.executed,
+            "coalesced": self.coalesced,
+            "recent_hits": self.recent_hits,
+        }
+
+
+class Prefetcher:
+    """Speculatively start async work that a later request is expected to need.
+
+    start(key, compute) runs compute() as a background task unless one is already
+    held for that key; get(key) returns the held task, finished or still running, or
+    None. Entries expire after ttl_seconds whether or not they were used, and at most
+    max_entries are held (the oldest is dropped first). Dropped tasks are left to
+    finish rather than cancelled.
+    """
+
+    def __init__(self, max_entries: int = 128, ttl_seconds: float = 120):
+        self._tasks = TTLCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+        self._running = set()
+        self.started = 0
+        self.used_done = 0
+        self.used_in_flight = 0
+
+    def start(self, key: str, compute: Callable[[], Awaitable[Any]]) -> bool:
+        """Start compute() for key; returns False if a task for key is already held"""
+        if self._tasks.get(key) is not None:
+            return False
+        task = asyncio.ensure_future(compute())
+        # Keep a strong reference until it finishes, even after the entry expires
+        self._running.add(task)
+        task.add_done_callback(self._running.discard)
+        self._tasks.set(key, task)
+        self.started += 1
+        return True
+
+    def get(self, key: str) -> Optional["asyncio.Future"]:
+        task = self._tasks.get(key)
+        if task is not None:
+            if task.done():
+                self.used_done += 1
+            else:
+                self.used_in_flight += 1
+        return task
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._tasks),
+            "running": len(self._running),
+            "started": self.started,
+            "used_done": self.used_done,
+            "used_in_flight": self.used_in_flight,
+            "evicted": self._tasks.evictions,
+        }
@@ -0,0 +1,333 @@
+"""
+Background job queue with pluggable job state storage.
+
+JobQueue runs submitted jobs on a fixed pool of asyncio workers, lowest priority
+number first and in submission order within a priority. Job state lives in a
+JobStore: MemoryJobStore within one process, or SQLiteJobStore to keep it across
+restarts (on Vercel only /tmp is writable, so point it there). When a job with a
+webhook_url finishes, its record is POSTed there.
+
+Jobs are plain JSON-serializable dicts:
+
+    id, kind, status (queued, running, succeeded, failed), priority, meta, payload,
+    result, error, webhook_url, webhook_status, created_at, started_at, finished_at
+
+Workers start with start() (call it at app startup) or else with the first
+submission. Jobs a previous process left queued in a SQLite store are picked up
+again then; jobs it left running are marked failed.
+
+Webhook URLs are caller-supplied and POSTed from inside the deployment, so
+check_webhook_url() only accepts http(s) URLs whose host resolves to public
+addresses. The queue checks again right before each POST and never follows redirects.
+"""
+import asyncio
+import ipaddress
+import itertools
+import json
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from api._logging import get_logger
+
+logger = get_logger("jobs")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+FINISHED_STATUSES = (SUCCEEDED, FAILED)
+
+
+class JobQueueFull(RuntimeError):
+    """Too many jobs are already waiting; the caller should retry later"""
+
+
+class UnsafeWebhookURL(ValueError):
+    """A URL that is not http(s) or points at a private, loopback or link-local address"""
+
+
+async def check_public_url(url: str, label: str = "URL") -> None:
+    """Raise UnsafeWebhookURL unless url is http(s) and every address its host resolves to is public.
+
+    Used for any caller-supplied URL the service fetches or posts to; label names it in errors.
+    """
+    parsed = urlsplit(url)
+    if parsed.scheme not in ("http", "https") or not parsed.hostname:
+        raise UnsafeWebhookURL(f"{label} must be an http(s) URL")
+    try:
+        port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    except ValueError:
+        raise UnsafeWebhookURL(f"{label} has an invalid port")
+    try:
+        infos = await asyncio.get_running_loop().getaddrinfo(parsed.hostname, port, type=socket.SOCK_STREAM)
+    except socket.gaierror as e:
+        raise UnsafeWebhookURL(f"{label} host does not resolve: {e}")
+    for *_, sockaddr in infos:
+        address = ipaddress.ip_address(sockaddr[0].split("%")[0])
+        if address.version == 6 and address.ipv4_mapped:
+            address = address.ipv4_mapped
+        if not address.is_global or address.is_multicast:
+            raise UnsafeWebhookURL(f"{label} resolves to a non-public address ({address})")
+
+
+async def check_webhook_url(url: str) -> None:
+    await check_public_url(url, "webhook_url")
+
+
+def new_job(kind: str, payload: dict, priority: int = 1, meta: Optional[dict] = None,
+            webhook_url: Optional[str] = None) -> dict:
+    return {
+        "id": uuid.uuid4().hex,
+        "kind": kind,
+        "status": QUEUED,
+        "priority": priority,
+        "meta": meta or {},
+        "payload": payload,
+        "result": None,
+        "error": None,
+        "webhook_url": webhook_url,
+        "webhook_status": None,
+        "created_at": time.time(),
+        "started_at": None,
+        "finished_at": None,
+    }
+
+
+def public_job(job: dict) -> dict:
+    """A job record as returned to clients, without its input payload"""
+    return {key: value for key, value in job.items() if key != "payload"}
+
+
+class MemoryJobStore:
+    """Job records in a dict, dropped ttl_seconds after creation or beyond max_jobs (oldest first)"""
+
+    def __init__(self, ttl_seconds: float = 86400, max_jobs: int = 10000):
+        self.ttl_seconds = ttl_seconds
+        self.max_jobs = max_jobs
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _prune(self) -> None:
+        cutoff = time.time() - self.ttl_seconds
+        while self._jobs:
+            oldest = next(iter(self._jobs.values()))
+            if oldest["created_at"] > cutoff and len(self._jobs) <= self.max_jobs:
+                break
+            self._jobs.popitem(last=False)
+
+    def put(self, job: dict) -> None:
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            self._prune()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields)
+            return dict(job)
+
+    def unfinished(self) -> List[dict]:
+        with self._lock:
+            return [dict(job) for job in self._jobs.values() if job["status"] not in FINISHED_STATUSES]
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job["status"]] = counts.get(job["status"], 0) + 1
+        return {"backend": "memory", "jobs": len(jobs), "by_status": counts}
+
+
+class SQLiteJobStore:
+    """Job records in a SQLite table, dropped ttl_seconds after creation"""
+
+    def __init__(self, path: str, ttl_seconds: float = 86400, table: str = "jobs"):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.table = table
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            "id TEXT PRIMARY KEY, status TEXT NOT NULL, data TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_status ON {table} (status)")
+        self._conn.commit()
+
+    def put(self, job: dict) -> None:
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO {self.table} (id, status, data, created_at) VALUES (?, ?, ?, ?)",
+                (job["id"], job["status"], json.dumps(job), job["created_at"]),
+            )
+            self._conn.execute(f"DELETE FROM {self.table} WHERE created_at <= ?", (time.time() - self.ttl_seconds,))
+            self._conn.commit()
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE id = ?", (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def update(self, job_id: str, **fields) -> Optional[dict]:
+        with self._lock:
+            row = self._conn.execute(f"SELECT data FROM {self.table} WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            job = json.loads(row[0])
+            job.update(fields)
+            self._conn.execute(
+                f"UPDATE {self.table} SET status = ?, data = ? WHERE id = ?", (job["status"], json.dumps(job), job_id)
+            )
+            self._conn.commit()
+        return job
+
+    def unfinished(self) -> List[dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT data FROM {self.table} WHERE status NOT IN (?, ?) ORDER BY created_at", FINISHED_STATUSES
+            ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+
+    def stats(self) -> dict:
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, COUNT(*) FROM {self.table} GROUP BY status").fetchall()
+        return {"backend": "sqlite", "path": self.path, "jobs": sum(count for _, count in rows),
+                "by_status": dict(rows)}
+
+
+class JobQueue:
+    """Priority queue of jobs served by a fixed number of asyncio workers.
+
+    handler(job) does the work and returns a JSON-serializable result; an exception
+    fails the job with its message. At most max_queued jobs may wait at once.
+    allow_private_webhooks skips the webhook address check (local development only).
+    """
+
+    def __init__(self, store, handler: Callable[[dict], Awaitable[Any]], workers: int = 3,
+                 max_queued: int = 500, webhook_client: Optional[httpx.AsyncClient] = None,
+                 webhook_timeout_seconds: float = 10.0, allow_private_webhooks: bool = False):
+        self.store = store
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_queued = max_queued
+        self.webhook_client = webhook_client
+        self._owns_webhook_client = webhook_client is None
+        self.webhook_timeout_seconds = webhook_timeout_seconds
+        self.allow_private_webhooks = allow_private_webhooks
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._sequence = itertools.count()
+        self._tasks = []
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+
+    def start(self) -> None:
+        """Start the workers and resume the store's queued jobs; must run inside the event loop"""
+        if self._queue is not None:
+            return
+        self._queue = asyncio.PriorityQueue()
+        for job in self.store.unfinished():
+            if job["status"] == QUEUED:
+                self._queue.put_nowait((job["priority"], next(self._sequence), job["id"]))
+            else:
+                self.store.update(job["id"], status=FAILED, error="Interrupted by a restart",
+                                  finished_at=time.time())
+        self._tasks = [asyncio.ensure_future(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, kind: str, payload: dict, priority: int = 1, meta: Optional[dict] = None,
+               webhook_url: Optional[str] = None) -> dict:
+        """Queue a job and return its record; raises JobQueueFull when the backlog is at its cap"""
+        self.start()
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull(f"{self._queue.qsize()} jobs already queued")
+        job = new_job(kind, payload, priority, meta, webhook_url)
+        self.store.put(job)
+        self._queue.put_nowait((priority, next(self._sequence), job["id"]))
+        return job
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job worker failed", extra={"job_id": job_id})
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str) -> None:
+        job = self.store.get(job_id)
+        if job is None or job["status"] != QUEUED:
+            return
+        job = self.store.update(job_id, status=RUNNING, started_at=time.time())
+        self.running += 1
+        try:
+            result = await self.handler(job)
+        except Exception as e:
+            self.failed += 1
+            job = self.store.update(job_id, status=FAILED, error=str(e) or type(e).__name__,
+                                    finished_at=time.time())
+        else:
+            self.completed += 1
+            job = self.store.update(job_id, status=SUCCEEDED, result=result, finished_at=time.time())
+        finally:
+            self.running -= 1
+        if job is not None and job.get("webhook_url"):
+            await self._notify(job)
+
+    async def _notify(self, job: dict) -> None:
+        """POST the finished job to its webhook; the outcome is recorded as webhook_status"""
+        if self.webhook_client is None:
+            self.webhook_client = httpx.AsyncClient(follow_redirects=False)
+        try:
+            if not self.allow_private_webhooks:
+                await check_webhook_url(job["webhook_url"])
+            response = await self.webhook_client.post(job["webhook_url"], json=public_job(job),
+                                                      timeout=self.webhook_timeout_seconds,
+                                                      follow_redirects=False)
+            status = response.status_code
+        except UnsafeWebhookURL as e:
+            logger.warning("Job webhook blocked: %s", e, extra={"job_id": job["id"]})
+            status = "blocked"
+        except Exception as e:
+            logger.warning("Job webhook failed: %s", e, extra={"job_id": job["id"]})
+            status = type(e).__name__
+        self.store.update(job["id"], webhook_status=status)
+
+    async def close(self) -> None:
+        """Stop the workers; queued jobs stay in the store for the next process"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        if self._owns_webhook_client and self.webhook_client is not None:
+            await self.webhook_client.aclose()
+            self.webhook_client = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "store": self.store.stats(),
+        }
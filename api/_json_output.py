@@ -0,0 +1,186 @@
+"""
+Parsing of JSON model output.
+
+The agents ask the model for a JSON response (and pass a response schema when
+structured output is enabled), so the common case is a clean JSON document that
+validates in a single pydantic parse. Older prompts, fallbacks and cut-off
+generations still produce ```json fenced blocks, leading prose or truncated
+documents; the tolerant path below recovers those without another model call.
+"""
+import json
+import re
+from typing import Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from api._logging import get_logger
+
+logger = get_logger("json_output")
+
+_FENCED_BLOCK = re.compile(r"```(?:json)?\s*\n?(.*?)(?:\n?```|$)", re.DOTALL)
+
+
+def extract_json_candidate(text: str) -> str:
+    """Pull the most likely JSON document out of model text"""
+    stripped = text.strip()
+    if stripped.startswith("{") or stripped.startswith("["):
+        return stripped
+
+    fenced = _FENCED_BLOCK.search(stripped)
+    if fenced:
+        return fenced.group(1).strip()
+
+    start = stripped.find("{")
+    if start == -1:
+        return stripped
+    end = stripped.rfind("}")
+    return stripped[start:end + 1] if end > start else stripped[start:]
+
+
+def balanced_json_prefix(text: str) -> Optional[str]:
+    """The text from the first { or [ through its matching close bracket, or None if it never closes.
+
+    Recovers a complete document followed by trailing prose ('{"a": 1}\nHope this helps!').
+    """
+    match = re.search(r"[{\[]", text)
+    if match is None:
+        return None
+    depth = 0
+    in_string = False
+    escaped = False
+    for index in range(match.start(), len(text)):
+        char = text[index]
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            depth += 1
+        elif char in "}]":
+            depth -= 1
+            if depth == 0:
+                return text[match.start():index + 1]
+    return None
+
+
+def load_json_candidate(text: str):
+    """Parse the JSON in model text: the extracted candidate, its balanced prefix, then a truncation repair"""
+    candidate = extract_json_candidate(text)
+    for recover in (str, balanced_json_prefix, repair_truncated_json):
+        attempt = recover(candidate)
+        if attempt is None:
+            continue
+        try:
+            return json.loads(attempt)
+        except json.JSONDecodeError:
+            continue
+    return None
+
+
+def repair_truncated_json(text: str) -> str:
+    """Close any string, object or array left open by a truncated generation"""
+    stack = []
+    in_string = False
+    escaped = False
+    last_safe_cut = 0
+    for index, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]":
+            if stack:
+                stack.pop()
+            last_safe_cut = index + 1
+        elif char == ",":
+            last_safe_cut = index
+
+    if not stack and not in_string:
+        return text
+
+    repaired = text + ('"' if in_string else "")
+    try:
+        json.loads(repaired + "".join(reversed(stack)))
+        return repaired + "".join(reversed(stack))
+    except json.JSONDecodeError:
+        pass
+
+    # Drop the dangling key/value after the last complete element and close again
+    repaired = text[:last_safe_cut].rstrip().rstrip(",")
+    stack = []
+    in_string = False
+    escaped = False
+    for char in repaired:
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append("}" if char == "{" else "]")
+        elif char in "}]" and stack:
+            stack.pop()
+    return repaired + "".join(reversed(stack))
+
+
+def parse_json_output(text: str, schema: Optional[Type[BaseModel]] = None) -> Optional[dict]:
+    """Parse model output into a dict, validating against schema when one is given.
+
+    Tries a single pydantic parse of the raw text first. If that fails, the JSON is
+    extracted from fences or prose and repaired if truncated. JSON that parses but does
+    not match the schema is still returned as-is. Returns None if no JSON can be recovered.
+    """
+    if not text:
+        return None
+
+    if schema is not None and text.lstrip().startswith("{"):
+        try:
+            return schema.model_validate_json(text).model_dump()
+        except ValidationError:
+            pass
+
+    data = load_json_candidate(text)
+    if not isinstance(data, dict):
+        return None
+
+    if schema is not None:
+        try:
+            return schema.model_validate(data).model_dump()
+        except ValidationError as e:
+            logger.warning("Model output did not match %s: %s errors", schema.__name__, e.error_count())
+    return data
+
+
+def parse_model_output(text: str, schema: Type[BaseModel]) -> Optional[BaseModel]:
+    """Parse model output into a schema instance, or None if it has no JSON matching the schema"""
+    if not text:
+        return None
+    if text.lstrip().startswith("{"):
+        try:
+            return schema.model_validate_json(text)
+        except ValidationError:
+            pass
+    data = parse_json_output(text)
+    if data is None:
+        return None
+    try:
+        return schema.model_validate(data)
+    except ValidationError:
+        return None
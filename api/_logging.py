@@ -0,0 +1,182 @@
+"""
+Structured logging for the agent services.
+
+Records go through a QueueHandler, so the request path only enqueues; a background
+QueueListener thread formats them (JSON lines by default) and writes to stderr.
+
+  - LOG_LEVEL sets the level. It defaults to WARNING on Vercel production
+    deployments and INFO everywhere else.
+  - LOG_FORMAT=text switches to plain lines for local development.
+  - RequestContextMiddleware gives every request a correlation ID (the incoming
+    X-Request-ID header or a fresh one). It is stamped on each record logged while
+    serving that request and echoed back in the X-Request-ID response header.
+  - DEBUG records are sampled per request: LOG_DEBUG_SAMPLE_RATE (default 0.01)
+    of requests keep their full debug trail, the rest drop it before it is queued.
+
+Keyword fields passed via extra= are emitted as JSON fields.
+"""
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import uuid
+
+LOGGER_NAMESPACE = "fashion"
+REQUEST_ID_HEADER = "x-request-id"
+
+request_id_var = contextvars.ContextVar("request_id", default=None)
+debug_sampled_var = contextvars.ContextVar("debug_sampled", default=None)
+
+# Attributes every LogRecord has; anything else came in through extra=
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_configure_lock = threading.Lock()
+_listener = None
+
+
+def default_log_level() -> str:
+    if os.getenv("VERCEL_ENV") == "production":
+        return "WARNING"
+    return "INFO"
+
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", default_log_level()).upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json").lower()
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamp the request ID on each record and drop debug records of unsampled requests"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get() or "-"
+        if record.levelno <= logging.DEBUG:
+            sampled = debug_sampled_var.get()
+            if sampled is None:
+                sampled = random.random() < LOG_DEBUG_SAMPLE_RATE
+            return sampled
+        return True
+
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        if record.request_id != "-":
+            entry["request_id"] = record.request_id
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES and key != "request_id":
+                entry[key] = value
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = record.stack_info
+        return json.dumps(entry, default=str)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that keeps a record's message and traceback apart.
+
+    The stock prepare() folds the formatted traceback into msg and clears exc_info
+    before enqueueing, which left the JSON formatter nothing to put in its exc_info
+    field. Here the traceback is formatted into exc_text instead. Like the stock version
+    this runs on the emitting thread, before the record is enqueued, so the queue
+    carries plain strings rather than references to live frames.
+    """
+
+    _exception_formatter = logging.Formatter()
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = self._exception_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s")
+
+
+def configure_logging() -> None:
+    """Install the queue handler and start the writer thread, once per process"""
+    global _listener
+    with _configure_lock:
+        if _listener is not None:
+            return
+        stream_handler = logging.StreamHandler(sys.stderr)
+        stream_handler.setFormatter(TextFormatter() if LOG_FORMAT == "text" else JSONFormatter())
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = ContextQueueHandler(log_queue)
+        queue_handler.addFilter(RequestContextFilter())
+
+        root = logging.getLogger(LOGGER_NAMESPACE)
+        root.setLevel(LOG_LEVEL)
+        root.addHandler(queue_handler)
+        root.propagate = False
+
+        _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=False)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+def debug_enabled(logger: logging.Logger) -> bool:
+    """Whether a debug record from logger would be kept for the current request"""
+    if not logger.isEnabledFor(logging.DEBUG):
+        return False
+    sampled = debug_sampled_var.get()
+    return sampled if sampled is not None else random.random() < LOG_DEBUG_SAMPLE_RATE
+
+
+def get_logger(name: str) -> logging.Logger:
+    """Logger under the service namespace; configures the pipeline on first use"""
+    configure_logging()
+    return logging.getLogger(f"{LOGGER_NAMESPACE}.{name}")
+
+
+class RequestContextMiddleware:
+    """ASGI middleware assigning each request a correlation ID and a debug sampling decision"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER.encode():
+                request_id = value.decode("latin-1")[:64]
+                break
+        request_id = request_id or uuid.uuid4().hex[:16]
+        id_token = request_id_var.set(request_id)
+        sampled_token = debug_sampled_var.set(random.random() < LOG_DEBUG_SAMPLE_RATE)
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [(REQUEST_ID_HEADER.encode(), request_id.encode())]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(id_token)
+            debug_sampled_var.reset(sampled_token)
@@ -0,0 +1,125 @@
+"""
+Perceptual hashing of photos and a near-duplicate index over the hashes.
+
+dhash() is a 64-bit difference hash: the image is reduced to a 9x8 grayscale
+thumbnail and each bit records whether a pixel is brighter than its right-hand
+neighbour. Recompressed, resized or lightly cropped copies of a photo land within
+a few bits of each other, so Hamming distance measures how alike two photos are.
+
+PerceptualHashIndex maps hashes to stored values and finds the nearest stored hash
+within max_distance bits. Lookups use multi-index hashing: the 64 bits are split
+into max_distance + 1 blocks, and by the pigeonhole principle any hash within
+max_distance bits of a query matches it exactly in at least one block. So only
+entries sharing a block with the query are compared, instead of the whole index.
+The index is bounded (LRU by max_entries) and entries expire after ttl_seconds.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+HASH_BITS = 64
+
+
+def dhash(image, hash_size: int = 8) -> int:
+    """Difference hash of a PIL image, as a hash_size * hash_size bit integer"""
+    from PIL import Image
+
+    small = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.BOX)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class PerceptualHashIndex:
+    """Bounded map from perceptual hashes to values with near-duplicate lookup.
+
+    Values are stored per context (any hashable, e.g. the request parameters the
+    value was computed with) and a lookup only matches entries of the same context.
+    """
+
+    def __init__(self, max_distance: int = 6, max_entries: int = 2048, ttl_seconds: float = 86400):
+        self.max_distance = max(0, min(max_distance, HASH_BITS - 1))
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        blocks = self.max_distance + 1
+        bounds = [round(i * HASH_BITS / blocks) for i in range(blocks + 1)]
+        self._blocks = [(start, (1 << (end - start)) - 1) for start, end in zip(bounds, bounds[1:])]
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._buckets = [dict() for _ in self._blocks]
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.compared = 0
+
+    def _block_values(self, value: int):
+        return [(value >> shift) & mask for shift, mask in self._blocks]
+
+    def _remove(self, key: tuple) -> None:
+        value, _, _ = self._entries.pop(key)
+        for bucket, block in zip(self._buckets, self._block_values(value)):
+            members = bucket.get(block)
+            if members is not None:
+                members.discard(key)
+                if not members:
+                    del bucket[block]
+
+    def add(self, value: int, context: Hashable, payload: Any) -> None:
+        key = (value, context)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, payload, time.monotonic() + self.ttl_seconds)
+            for bucket, block in zip(self._buckets, self._block_values(value)):
+                bucket.setdefault(block, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def nearest(self, value: int, context: Hashable) -> Optional[tuple]:
+        """(payload, distance) of the closest live entry within max_distance, or None"""
+        now = time.monotonic()
+        with self._lock:
+            candidates = set()
+            for bucket, block in zip(self._buckets, self._block_values(value)):
+                candidates.update(bucket.get(block, ()))
+            best_key, best_distance = None, self.max_distance + 1
+            for key in candidates:
+                if key[1] != context:
+                    continue
+                self.compared += 1
+                if self._entries[key][2] <= now:
+                    self._remove(key)
+                    continue
+                distance = hamming_distance(value, key[0])
+                if distance < best_distance:
+                    best_key, best_distance = key, distance
+            if best_key is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best_key)
+            self.hits += 1
+            return self._entries[best_key][1], best_distance
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "max_distance": self.max_distance,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "compared": self.compared,
+        }
@@ -0,0 +1,199 @@
+"""
+Token-budget compaction of prompt sections.
+
+Model output that is fed back into a later prompt (the analysis JSON in particular)
+is re-emitted as compact canonical JSON, search snippets are de-duplicated, and
+every section is held to a token budget. Tokens are estimated at CHARS_PER_TOKEN
+characters each, which is close enough for budgeting without a tokenizer round trip.
+
+When a section is over its budget, long strings are shortened (to whole sentences
+where possible) before any list items are dropped, lists named in keep_lists (the
+colour palettes) are never trimmed, and a warning is logged.
+"""
+import json
+import re
+from typing import Any, Iterable, List, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from api._json_output import load_json_candidate
+from api._logging import get_logger
+
+logger = get_logger("prompt_budget")
+
+CHARS_PER_TOKEN = 4
+ELLIPSIS = "…"
+
+# Analysis lists the recommendation prompt relies on in full
+COLOR_LISTS = ("best_colors", "colors_to_avoid")
+
+_WORD = re.compile(r"[a-z0-9$]+")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+
+# Progressively tighter (max list items, max words per string) limits tried by
+# fit_json_to_budget: strings are shortened first, list items only dropped after that
+_SHRINK_STEPS = ((None, None), (None, 40), (None, 25), (None, 15), (6, 15), (4, 12), (3, 10), (2, 8))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def collapse_whitespace(text: str) -> str:
+    return " ".join(text.split())
+
+
+def truncate_to_tokens(text: str, budget: int) -> str:
+    """Cut text to roughly budget tokens, at a word boundary where possible"""
+    limit = budget * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text[:max(0, limit - len(ELLIPSIS))]
+    if " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip(" ,;:") + ELLIPSIS
+
+
+def compact_json(data: Any) -> str:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+
+
+def drop_empty(value: Any) -> Any:
+    """Recursively drop None, empty strings and empty containers"""
+    if isinstance(value, dict):
+        cleaned = {key: drop_empty(item) for key, item in value.items()}
+        return {key: item for key, item in cleaned.items() if item not in (None, "", [], {})}
+    if isinstance(value, list):
+        cleaned = [drop_empty(item) for item in value]
+        return [item for item in cleaned if item not in (None, "", [], {})]
+    if isinstance(value, str):
+        return collapse_whitespace(value)
+    return value
+
+
+def shorten_words(text: str, max_words: int) -> str:
+    """Cut text to max_words, keeping whole leading sentences when at least one fits"""
+    words = text.split()
+    if len(words) <= max_words:
+        return text
+    kept = []
+    for sentence in _SENTENCE_END.split(text):
+        sentence_words = sentence.split()
+        if len(kept) + len(sentence_words) > max_words:
+            break
+        kept.extend(sentence_words)
+    if kept:
+        return " ".join(kept)
+    return " ".join(words[:max_words]) + ELLIPSIS
+
+
+def _shrink(value: Any, max_items: Optional[int], max_words: Optional[int], keep_lists: frozenset,
+            keep_items: bool = False) -> Any:
+    if isinstance(value, dict):
+        return {key: _shrink(item, max_items, max_words, keep_lists, key in keep_lists)
+                for key, item in value.items()}
+    if isinstance(value, list):
+        items = value if max_items is None or keep_items else value[:max_items]
+        return [_shrink(item, max_items, max_words, keep_lists) for item in items]
+    if isinstance(value, str) and max_words is not None:
+        return shorten_words(value, max_words)
+    return value
+
+
+def fit_json_to_budget(data: Any, budget: int, keep_lists: Iterable[str] = ()) -> str:
+    """Compact JSON for data, shortening long strings, then list tails, until it fits the budget.
+
+    The structure (every key) is kept, and lists under a key in keep_lists keep all
+    their items. Logs a warning when anything had to be cut.
+    """
+    keep = frozenset(keep_lists)
+    text = ""
+    for step, (max_items, max_words) in enumerate(_SHRINK_STEPS):
+        text = compact_json(_shrink(data, max_items, max_words, keep))
+        if estimate_tokens(text) <= budget:
+            break
+    if step:
+        logger.warning("Prompt section trimmed to fit its token budget", extra={
+            "budget_tokens": budget, "full_tokens_est": estimate_tokens(compact_json(data)),
+            "max_items": max_items, "max_words": max_words,
+        })
+    return text
+
+
+def compact_model_json(text: str, budget: int, schema: Optional[Type[BaseModel]] = None,
+                       keep_lists: Iterable[str] = ()) -> str:
+    """Re-emit JSON model output (fenced, prose-wrapped or bare) in compact canonical form.
+
+    When it validates against schema only the schema's fields are kept, in schema
+    order. Text that is not JSON is whitespace-collapsed and truncated instead.
+    """
+    data = load_json_candidate(text)
+    if not isinstance(data, dict):
+        collapsed = collapse_whitespace(text)
+        if estimate_tokens(collapsed) > budget:
+            logger.warning("Non-JSON prompt section truncated to its token budget",
+                           extra={"budget_tokens": budget, "full_tokens_est": estimate_tokens(collapsed)})
+        return truncate_to_tokens(collapsed, budget)
+    if schema is not None:
+        try:
+            data = schema.model_validate(data).model_dump()
+        except ValidationError:
+            pass
+    return fit_json_to_budget(drop_empty(data), budget, keep_lists)
+
+
+def _shingles(text: str, size: int = 3) -> set:
+    words = _WORD.findall(text.lower())
+    if len(words) < size:
+        return {" ".join(words)} if words else set()
+    return {" ".join(words[i:i + size]) for i in range(len(words) - size + 1)}
+
+
+def dedupe_snippets(snippets: Iterable[dict], threshold: float = 0.6) -> List[dict]:
+    """Drop snippets whose URL was already seen or whose text mostly repeats an earlier one.
+
+    Near-duplicates are detected by Jaccard similarity of word 3-gram shingles over
+    title plus content; the first occurrence wins.
+    """
+    kept = []
+    seen_urls = set()
+    kept_shingles = []
+    for snippet in snippets:
+        url = snippet.get("url")
+        if url and url in seen_urls:
+            continue
+        shingles = _shingles(f"{snippet.get('title', '')} {snippet.get('content', '')}")
+        if shingles and any(len(shingles & other) / len(shingles | other) >= threshold for other in kept_shingles):
+            continue
+        if url:
+            seen_urls.add(url)
+        kept_shingles.append(shingles)
+        kept.append(snippet)
+    return kept
+
+
+def fit_lines_to_budget(lines: Iterable[str], budget: int) -> List[str]:
+    """Keep whole lines, in order, while they fit the budget (the first line is truncated if needed)"""
+    kept = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget:
+            if not kept:
+                kept.append(truncate_to_tokens(line, budget))
+            break
+        kept.append(line)
+        used += cost
+    return kept
+
+
+def size_report(before: str, after: str) -> dict:
+    before_tokens = estimate_tokens(before)
+    after_tokens = estimate_tokens(after)
+    return {
+        "before_chars": len(before),
+        "after_chars": len(after),
+        "before_tokens_est": before_tokens,
+        "after_tokens_est": after_tokens,
+        "saved_pct": round(100 * (1 - after_tokens / before_tokens), 1) if before_tokens else 0.0,
+    }
@@ -0,0 +1,183 @@
+"""
+Bucketed memoization of outfit recommendations.
+
+Recommendations depend mostly on a handful of discrete fields, and most users fall
+into the same few dozen combinations of them. analysis_fingerprint() reduces a
+request to that bucket:
+
+  body type, skin undertone, best-colors set, occasion, budget tier and style
+
+RecommendationCache stores the agent's output per bucket (LRU + TTL in memory, with
+an optional SQLite tier). Entries younger than fresh_seconds are served as-is; older
+ones are still served but refreshed in the background, until ttl_seconds expires
+them for good.
+
+A cached recommendation was written for another user in the same bucket, so
+personalize_recommendations() rewrites the outfit names and styling tips from this
+user's own analysis and preferences. It is string templating, not a model call.
+"""
+import asyncio
+import json
+import re
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from api._cache import TieredCache, make_cache_key, normalize_text
+from api._json_output import parse_json_output
+
+# Keyword -> tier, checked in order; budget strings are free text ("mid-range", "$50-100", "luxury")
+_BUDGET_KEYWORDS = (
+    ("luxury", ("luxury", "designer", "high-end", "high end", "premium")),
+    ("budget", ("budget", "low", "cheap", "affordable", "thrift")),
+    ("mid", ("mid", "moderate", "medium", "average")),
+)
+_AMOUNT = re.compile(r"\d+(?:,\d{3})*")
+
+
+def budget_tier(budget_range: Optional[str]) -> str:
+    """Reduce a free-text budget to budget, mid or luxury (or the normalized text if unrecognized)"""
+    text = normalize_text(budget_range or "")
+    for tier, keywords in _BUDGET_KEYWORDS:
+        if any(keyword in text for keyword in keywords):
+            return tier
+    amounts = [int(amount.replace(",", "")) for amount in _AMOUNT.findall(text)]
+    if amounts:
+        top = max(amounts)
+        return "budget" if top < 100 else "mid" if top < 300 else "luxury"
+    return text
+
+
+def preference_styles(user_preferences: Any) -> list:
+    """The user's style choices, from either a "style" string or a "styleTypes" list"""
+    if not isinstance(user_preferences, dict):
+        return []
+    styles = user_preferences.get("styleTypes") or []
+    if isinstance(styles, str):
+        styles = [styles]
+    if isinstance(user_preferences.get("style"), str):
+        styles = [user_preferences["style"], *styles]
+    return [style for style in styles if isinstance(style, str) and style.strip()]
+
+
+def analysis_fingerprint(analysis: Optional[dict], user_preferences: Any, occasion: str,
+                         budget_range: str) -> Optional[str]:
+    """Canonical bucket key for a recommendation request, or None if the analysis lacks the fields"""
+    if not isinstance(analysis, dict):
+        return None
+    body = analysis.get("body_analysis") or {}
+    colors = analysis.get("color_analysis") or {}
+    body_type = normalize_text(str(body.get("body_type") or ""))
+    undertone = normalize_text(str(colors.get("skin_undertone") or ""))
+    if not body_type or not undertone:
+        return None
+    bucket = {
+        "body_type": body_type,
+        "undertone": undertone,
+        "best_colors": sorted({normalize_text(str(color)) for color in colors.get("best_colors") or []}),
+        "occasion": normalize_text(occasion or ""),
+        "budget": budget_tier(budget_range),
+        "style": sorted({normalize_text(style) for style in preference_styles(user_preferences)}) or ["casual"],
+    }
+    return make_cache_key("recommendation-bucket", bucket)
+
+
+def _lower_first(text: str) -> str:
+    return text[:1].lower() + text[1:] if text[:2] != text[:2].upper() else text
+
+
+def personalize_recommendations(text: str, analysis: Optional[dict], user_preferences: Any) -> str:
+    """Adapt a bucket's cached recommendations to this user.
+
+    Each outfit name is prefixed with one of the user's style choices, and each
+    outfit's tips open with the user's own key features and preferred colors.
+    Text that is not recommendation JSON is returned unchanged.
+    """
+    data = parse_json_output(text)
+    if not isinstance(data, dict) or not isinstance(data.get("outfit_recommendations"), list):
+        return text
+    analysis = analysis if isinstance(analysis, dict) else {}
+    features = [feature.strip().rstrip(".") for feature in (analysis.get("body_analysis") or {}).get("key_features") or []
+                if isinstance(feature, str) and feature.strip()]
+    styles = preference_styles(user_preferences)
+    liked_colors = []
+    if isinstance(user_preferences, dict) and isinstance(user_preferences.get("colors"), list):
+        liked_colors = [color for color in user_preferences["colors"] if isinstance(color, str) and color.strip()]
+
+    for index, outfit in enumerate(data["outfit_recommendations"]):
+        if not isinstance(outfit, dict):
+            continue
+        name = str(outfit.get("name") or "")
+        if styles:
+            style = styles[index % len(styles)].strip()
+            if style.lower() not in name.lower():
+                outfit["name"] = f"{style.title()} {name}".strip()
+
+        tips = [tip for tip in outfit.get("styling_tips") or [] if isinstance(tip, str)]
+        personal = []
+        if features:
+            personal.append(f"Let the look play up your {_lower_first(features[index % len(features)])}.")
+        if liked_colors:
+            outfit_colors = json.dumps(outfit.get("items") or {}).lower()
+            missing = [color for color in liked_colors if color.lower() not in outfit_colors]
+            if missing:
+                personal.append(f"Work in {missing[0]}, one of your favorite colors, through an accessory or layer.")
+        outfit["styling_tips"] = personal + tips
+    return json.dumps(data, ensure_ascii=False)
+
+
+class RecommendationCache:
+    """Per-bucket recommendation store with a stale-while-revalidate freshness policy"""
+
+    def __init__(self, store: TieredCache, fresh_seconds: float):
+        self.store = store
+        self.fresh_seconds = fresh_seconds
+        self._refreshing = {}
+        self.fresh_hits = 0
+        self.stale_hits = 0
+        self.refreshes = 0
+
+    def get(self, key: str) -> Optional[tuple]:
+        """(entry, age_seconds, stale) for a cached bucket, or None"""
+        entry = self.store.get(key)
+        if entry is None:
+            return None
+        age = max(0.0, time.time() - entry.get("stored_at", 0))
+        stale = age >= self.fresh_seconds
+        if stale:
+            self.stale_hits += 1
+        else:
+            self.fresh_hits += 1
+        return entry, age, stale
+
+    def set(self, key: str, recommendations: str, search_data: dict) -> None:
+        self.store.set(key, {"recommendations": recommendations, "search_data": search_data,
+                             "stored_at": time.time()})
+
+    def refresh(self, key: str, compute: Callable[[], Awaitable[Optional[tuple]]]) -> None:
+        """Recompute a stale bucket in the background, at most once at a time per bucket.
+
+        compute() returns (recommendations, search_data) to store, or None to keep the entry.
+        """
+        if key in self._refreshing:
+            return
+
+        async def run():
+            try:
+                result = await compute()
+                if result is not None:
+                    self.set(key, *result)
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.ensure_future(run())
+        self.refreshes += 1
+
+    def stats(self) -> dict:
+        return {
+            "fresh_seconds": self.fresh_seconds,
+            "fresh_hits": self.fresh_hits,
+            "stale_hits": self.stale_hits,
+            "refreshes": self.refreshes,
+            "refreshing": len(self._refreshing),
+            "store": self.store.stats(),
+        }
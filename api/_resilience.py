@@ -0,0 +1,281 @@
+"""
+Retry, deadline, circuit breaking and hedging for calls to model providers.
+
+resilient_call() runs an async operation under a RetryPolicy:
+
+  - the whole call, retries included, must finish within deadline_seconds
+  - each attempt is capped at attempt_timeout_seconds and by the remaining budget
+  - retries back off with full jitter, and a retry whose backoff would not leave
+    enough of the budget for another attempt is not started
+  - an optional CircuitBreaker (one per model, see get_circuit_breaker) makes calls
+    fail fast with CircuitOpenError while the provider keeps failing
+  - with hedge_percentile set, a second copy of a slow attempt is started once it
+    runs past that percentile of recent latencies, and the first to succeed wins
+
+Only transient errors (timeouts, connection errors, 408/429/5xx responses) count
+against the breaker. They are also what gets retried by default; callers can pass
+their own is_retryable, e.g. to also retry unusable model output or to never
+retry a paid render that merely timed out.
+"""
+import asyncio
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+
+class DeadlineExceeded(TimeoutError):
+    """The call's total latency budget ran out before an attempt succeeded"""
+
+
+class AttemptTimeout(TimeoutError):
+    """A single attempt ran past its timeout"""
+
+
+class CircuitOpenError(RuntimeError):
+    """The provider's circuit breaker is open, so the call was not attempted"""
+
+
+def error_status_code(error: BaseException) -> Optional[int]:
+    """HTTP status carried by a provider SDK exception, if any"""
+    for attribute in ("code", "status_code", "status"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return int(value)
+    response = getattr(error, "response", None)
+    status = getattr(response, "status_code", None)
+    return int(status) if isinstance(status, int) else None
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Whether an error is worth retrying and says something about provider health"""
+    if isinstance(error, (TimeoutError, ConnectionError, httpx.TransportError)):
+        return True
+    return error_status_code(error) in TRANSIENT_STATUS_CODES
+
+
+class RetryPolicy:
+    """How hard resilient_call tries before giving up"""
+
+    def __init__(self, max_attempts: int = 3, deadline_seconds: float = 60.0,
+                 attempt_timeout_seconds: Optional[float] = None, base_delay_seconds: float = 0.5,
+                 max_delay_seconds: float = 8.0, min_attempt_seconds: float = 1.0,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20):
+        self.max_attempts = max(1, max_attempts)
+        self.deadline_seconds = deadline_seconds
+        self.attempt_timeout_seconds = attempt_timeout_seconds
+        self.base_delay_seconds = base_delay_seconds
+        self.max_delay_seconds = max_delay_seconds
+        self.min_attempt_seconds = min_attempt_seconds
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+
+    def backoff(self, retry_number: int) -> float:
+        """Full-jitter exponential backoff before retry number retry_number (0-based)"""
+        ceiling = min(self.max_delay_seconds, self.base_delay_seconds * (2 ** retry_number))
+        return random.uniform(0, ceiling)
+
+
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
+
+    After failure_threshold transient failures in a row the circuit opens and calls
+    are refused for reset_timeout_seconds. Then a single probe call is let through:
+    success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_seconds = reset_timeout_seconds
+        self._lock = threading.Lock()
+        self.state = "closed"
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout_seconds:
+                self.state = "half_open"
+                self._probe_in_flight = False
+            if self.state == "closed":
+                return True
+            if self.state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.consecutive_failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            if self.state == "half_open" or self.consecutive_failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+    def release(self) -> None:
+        """Give back a call that ended without an outcome (cancelled), so a half-open
+        circuit lets the next call probe instead of waiting on this one forever"""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def stats(self) -> dict:
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+        }
+
+
+_circuit_breakers: Dict[str, CircuitBreaker] = {}
+_circuit_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(name: str, failure_threshold: int = 5, reset_timeout_seconds: float = 30.0) -> CircuitBreaker:
+    """Return the process-wide breaker for a model or provider, creating it on first use"""
+    with _circuit_breakers_lock:
+        breaker = _circuit_breakers.get(name)
+        if breaker is None:
+            breaker = _circuit_breakers[name] = CircuitBreaker(name, failure_threshold, reset_timeout_seconds)
+        return breaker
+
+
+def circuit_breaker_stats() -> dict:
+    with _circuit_breakers_lock:
+        return {name: breaker.stats() for name, breaker in _circuit_breakers.items()}
+
+
+class LatencyTracker:
+    """Rolling window of successful attempt latencies, used to pick the hedge delay"""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, q: float, min_samples: int = 1) -> Optional[float]:
+        if len(self._samples) < max(1, min_samples):
+            return None
+        ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def _run_attempt(operation: Callable[[], Awaitable[Any]], timeout: float,
+                       hedge_delay: Optional[float]) -> tuple:
+    """Run one attempt, hedged after hedge_delay if given. Returns (result, hedged)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    tasks = [asyncio.ensure_future(operation())]
+    hedged = False
+    try:
+        if hedge_delay is not None and hedge_delay < timeout:
+            done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+            if not done:
+                tasks.append(asyncio.ensure_future(operation()))
+                hedged = True
+
+        error = None
+        while tasks:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            done, pending = await asyncio.wait(tasks, timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                break
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), hedged
+                error = task.exception()
+            tasks = list(pending)
+        if error is not None and not tasks:
+            raise error
+        raise AttemptTimeout(f"Attempt timed out after {timeout:.1f}s")
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def resilient_call(
+    operation: Callable[[], Awaitable[Any]],
+    policy: RetryPolicy,
+    breaker: Optional[CircuitBreaker] = None,
+    latency: Optional[LatencyTracker] = None,
+    is_retryable: Callable[[BaseException], bool] = is_transient_error,
+    on_attempt: Optional[Callable[[int, float, Optional[BaseException], bool], None]] = None,
+    on_retry: Optional[Callable[[int, float, BaseException], Awaitable[None]]] = None,
+) -> Any:
+    """Call operation() until it succeeds, following policy.
+
+    operation must be safe to run more than once (and concurrently, when hedging).
+    on_attempt(attempt, seconds, error, hedged) is called after every attempt and
+    on_retry(attempt, delay, error) is awaited before each retry. Raises
+    CircuitOpenError, DeadlineExceeded or the last attempt's error.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + policy.deadline_seconds
+    last_error: Optional[BaseException] = None
+
+    for attempt in range(1, policy.max_attempts + 1):
+        if breaker is not None and not breaker.allow():
+            raise CircuitOpenError(f"Circuit for {breaker.name} is open") from last_error
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"Gave up after {policy.deadline_seconds:.1f}s") from last_error
+        timeout = min(remaining, policy.attempt_timeout_seconds or remaining)
+        hedge_delay = None
+        if policy.hedge_percentile is not None and latency is not None:
+            hedge_delay = latency.percentile(policy.hedge_percentile, policy.hedge_min_samples)
+
+        started = loop.time()
+        try:
+            result, hedged = await _run_attempt(operation, timeout, hedge_delay)
+        except Exception as e:
+            last_error = e
+            if breaker is not None:
+                # A non-transient error (bad request, unusable output) still means the provider answered
+                if is_transient_error(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+            if on_attempt:
+                on_attempt(attempt, loop.time() - started, e, False)
+            if not is_retryable(e) or attempt == policy.max_attempts:
+                raise
+            delay = policy.backoff(attempt - 1)
+            if deadline - loop.time() - delay < policy.min_attempt_seconds:
+                raise DeadlineExceeded(f"No budget left to retry after {attempt} attempts") from e
+            if on_retry:
+                await on_retry(attempt, delay, e)
+            await asyncio.sleep(delay)
+            continue
+        except BaseException:
+            # Cancelled (a caller's timeout, a disconnected client): no verdict on the provider
+            if breaker is not None:
+                breaker.release()
+            raise
+
+        elapsed = loop.time() - started
+        if breaker is not None:
+            breaker.record_success()
+        if latency is not None:
+            latency.observe(elapsed)
+        if on_attempt:
+            on_attempt(attempt, elapsed, None, hedged)
+        return result
+
+    raise DeadlineExceeded("No attempts were made") from last_error
@@ -0,0 +1,24 @@
+"""
+JSON response class shared by the agent services.
+
+FastJSONResponse renders with orjson when it is installed (several times faster than
+the standard library encoder, and it serializes the dicts pydantic's model_dump
+produces directly) and falls back to Starlette's compact JSONResponse otherwise.
+Each app uses it as its default_response_class.
+
+model_response() renders a pydantic response model directly. Returning the model from
+an endpoint instead would make FastAPI dump it, validate the dump against the
+response_model and dump it again.
+"""
+import importlib.util
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from pydantic import BaseModel
+
+# ORJSONResponse imports fine without orjson and only fails at render time, so check for it
+FastJSONResponse = ORJSONResponse if importlib.util.find_spec("orjson") is not None else JSONResponse
+
+
+def model_response(model: BaseModel, status_code: int = 200) -> JSONResponse:
+    """Serialize a response model in a single pass, leaving out unset optional fields"""
+    return FastJSONResponse(model.model_dump(mode="json", exclude_none=True), status_code=status_code)
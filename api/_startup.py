@@ -0,0 +1,51 @@
+"""
+Cold-start timing for the agent services.
+
+Each service creates a StartupTimer as the first thing it does, marks the end of
+its import with finish(), and wraps lazy first-use construction of heavy clients
+and agents in measure(). The timings are logged as they happen and exposed on /ping,
+so a cold start can be attributed to import work versus first-request setup.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+from api._logging import get_logger
+
+logger = get_logger("startup")
+
+
+class StartupTimer:
+    """Records module import time and the cost of lazily initialized components"""
+
+    def __init__(self, service: str):
+        self.service = service
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.import_ms = None
+        self.lazy_init_ms = {}
+
+    def finish(self) -> None:
+        """Mark the end of module import and print the timing report"""
+        self.import_ms = round((time.perf_counter() - self._started) * 1000, 2)
+        logger.info("%s imported in %sms", self.service, self.import_ms,
+                    extra={"service": self.service, "import_ms": self.import_ms})
+
+    @contextmanager
+    def measure(self, component: str):
+        """Time the first construction of a lazily initialized component"""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = round((time.perf_counter() - started) * 1000, 2)
+            with self._lock:
+                self.lazy_init_ms[component] = elapsed_ms
+            logger.info("%s initialized %s in %sms", self.service, component, elapsed_ms,
+                        extra={"service": self.service, "component": component, "lazy_init_ms": elapsed_ms})
+
+    def report(self) -> dict:
+        return {
+            "import_ms": self.import_ms,
+            "lazy_init_ms": dict(self.lazy_init_ms),
+        }
@@ -0,0 +1,81 @@
+"""
+Helpers for streaming responses and bounded fan-out shared by the agent services.
+"""
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple
+
+from fastapi.responses import StreamingResponse
+
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+def sse_frame(event: str, data: Any) -> str:
+    """Format one Server-Sent Events frame"""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def sse_response(frames: AsyncIterator[str]) -> StreamingResponse:
+    """Wrap an async iterator of SSE frames in a non-buffered streaming response"""
+    return StreamingResponse(frames, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
+async def iter_bounded(
+    worker: Callable[[Any], Awaitable[Any]],
+    items: Iterable[Any],
+    limit: int,
+) -> AsyncIterator[Tuple[int, Any, Optional[Exception]]]:
+    """Run worker(item) for every item with at most limit calls in flight.
+
+    Yields (index, result, error) tuples in completion order. A failing item yields its
+    exception instead of raising, so one bad item never stops the rest. Pending work is
+    cancelled if the consumer stops iterating (e.g. the client disconnected).
+    """
+    semaphore = asyncio.Semaphore(max(1, limit))
+
+    async def run(index: int, item: Any):
+        async with semaphore:
+            try:
+                return index, await worker(item), None
+            except Exception as e:
+                return index, None, e
+
+    tasks = [asyncio.create_task(run(index, item)) for index, item in enumerate(items)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+async def stream_batch_frames(
+    worker: Callable[[str], Awaitable[dict]],
+    keys: list,
+    limit: int,
+    key_name: str = "key",
+) -> AsyncIterator[str]:
+    """Run worker(key) for each unique key with bounded concurrency and yield SSE frames.
+
+    Every input position gets an "item" frame as soon as its key finishes, carrying
+    either the worker's result dict or an "error". Duplicate keys are computed once.
+    A final "done" frame reports the totals.
+    """
+    unique_keys = list(dict.fromkeys(keys))
+    positions = {}
+    for index, key in enumerate(keys):
+        positions.setdefault(key, []).append(index)
+
+    succeeded = 0
+    failed = 0
+    async for unique_index, result, error in iter_bounded(worker, unique_keys, limit):
+        key = unique_keys[unique_index]
+        for index in positions[key]:
+            if error is None:
+                succeeded += 1
+                yield sse_frame("item", {"index": index, key_name: key, **result})
+            else:
+                failed += 1
+                detail = getattr(error, "detail", None) or str(error)
+                yield sse_frame("item", {"index": index, key_name: key, "error": detail})
+    yield sse_frame("done", {"total": len(keys), "succeeded": succeeded, "failed": failed})
@@ -1,17 +1,58 @@
+from api._startup import StartupTimer
+
+startup_timer = StartupTimer("agents")
+
 import os
 import sys
 import json
 import asyncio
+import functools
+import random
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Optional
+from typing import TYPE_CHECKING, List, Optional, Union
 from dotenv import load_dotenv
-from google.adk.agents import LlmAgent
-from google.adk import Runner
-from google.adk.sessions import InMemorySessionService
-from google.genai import types
-from tavily import TavilyClient
-import json
+import uuid
+from contextlib import asynccontextmanager
+from api._cache import Prefetcher, SingleFlight, TieredCache, make_cache_key, normalize_text
+from api._json_output import parse_json_output, parse_model_output
+from api._logging import RequestContextMiddleware, debug_enabled, get_logger
+from api._metrics import HTTPMetricsMiddleware, MetricsRegistry
+from api._prompt_budget import (
+    COLOR_LISTS,
+    collapse_whitespace,
+    compact_model_json,
+    dedupe_snippets,
+    drop_empty,
+    fit_json_to_budget,
+    fit_lines_to_budget,
+    size_report,
+    truncate_to_tokens,
+)
+from api._recommendation_cache import RecommendationCache, analysis_fingerprint, personalize_recommendations
+from api._resilience import (
+    CircuitOpenError,
+    DeadlineExceeded,
+    LatencyTracker,
+    RetryPolicy,
+    circuit_breaker_stats,
+    get_circuit_breaker,
+    is_transient_error,
+    resilient_call,
+)
+from api._responses import FastJSONResponse, model_response
+from api._streaming import sse_frame, sse_response, stream_batch_frames
+
+# google.adk, google.genai and tavily are slow to import, so they are imported on first
+# use (see the get_* functions below) rather than at module load
+if TYPE_CHECKING:
+    from google.adk import Runner
+    from google.adk.agents import LlmAgent
+
+logger = get_logger("agents")
 
 # Load environment variables from .env.local file
 load_dotenv('.env.local')
@@ -19,17 +60,122 @@ load_dotenv('.env.local')
 # Load Google API key from environment
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
-    print("GOOGLE_API_KEY not found in environment variables", file=sys.stderr)
+    logger.error("GOOGLE_API_KEY not found in environment variables")
     raise ValueError("GOOGLE_API_KEY must be set")
 
-# Load Tavily API key from environment
+# Load Tavily API key from environment; the client itself is built on first search
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
-if TAVILY_API_KEY:
-    tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
-    print("Tavily API client initialized successfully", file=sys.stderr)
-else:
-    tavily_client = None
-    print("TAVILY_API_KEY not found - search functionality will be limited", file=sys.stderr)
+if not TAVILY_API_KEY:
+    logger.warning("TAVILY_API_KEY not found - search functionality will be limited")
+
+@functools.lru_cache(maxsize=None)
+def get_tavily_client():
+    """Build the Tavily client on first use, or return None if no API key is set"""
+    if not TAVILY_API_KEY:
+        return None
+    with startup_timer.measure("tavily_client"):
+        from tavily import TavilyClient
+        client = TavilyClient(api_key=TAVILY_API_KEY)
+    logger.info("Tavily API client initialized successfully")
+    return client
+
+# Search stage configuration. The Tavily client is synchronous, so searches run on a
+# small bounded pool instead of blocking the event loop, each with its own timeout.
+SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "6"))
+SEARCH_TIMEOUT_SECONDS = float(os.getenv("SEARCH_TIMEOUT_SECONDS", "8"))
+search_executor = ThreadPoolExecutor(max_workers=SEARCH_MAX_WORKERS, thread_name_prefix="tavily-search")
+
+# Identical analysis/recommendation requests that arrive while one is running (Inngest
+# retries, double submits) share its result, which is also reused for a short while after
+# unless it is the canned fallback (see is_upstream_result).
+request_coalescer = SingleFlight(
+    result_ttl_seconds=float(os.getenv("COALESCE_RESULT_TTL_SECONDS", "30")),
+    cacheable=lambda result: is_upstream_result(result)
+)
+
+# Speculative search prefetch. The recommendation searches only depend on occasion, style
+# and budget, which /analyze-photo already has, so it starts them in the background and
+# /recommend-outfit picks up the finished or in-flight results. Unused entries expire.
+SEARCH_PREFETCH_ENABLED = os.getenv("SEARCH_PREFETCH_ENABLED", "true").lower() == "true"
+search_prefetcher = Prefetcher(
+    max_entries=int(os.getenv("SEARCH_PREFETCH_MAX_ENTRIES", "128")),
+    ttl_seconds=float(os.getenv("SEARCH_PREFETCH_TTL_SECONDS", "120"))
+)
+
+# Bucketed recommendation cache, off by default. Requests are bucketed by body type,
+# undertone, best colors, occasion, budget tier and style; a bucket's recommendations
+# are reused (personalized per user) for RECOMMENDATION_CACHE_FRESH_SECONDS, then served
+# while being refreshed in the background until RECOMMENDATION_CACHE_TTL_SECONDS.
+RECOMMENDATION_CACHE_ENABLED = os.getenv("RECOMMENDATION_CACHE_ENABLED", "false").lower() == "true"
+recommendation_cache = RecommendationCache(
+    TieredCache.create(
+        max_entries=int(os.getenv("RECOMMENDATION_CACHE_MAX_ENTRIES", "256")),
+        ttl_seconds=float(os.getenv("RECOMMENDATION_CACHE_TTL_SECONDS", "86400")),
+        disk_path=os.getenv("RECOMMENDATION_CACHE_PATH") or None,
+        table="recommendations",
+    ),
+    fresh_seconds=float(os.getenv("RECOMMENDATION_CACHE_FRESH_SECONDS", "21600"))
+)
+
+# Batch photo analysis limits
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_PHOTOS = int(os.getenv("BATCH_MAX_PHOTOS", "50"))
+
+# Search result cache. Occasion x style x budget is a small space, so most searches are
+# repeats. SEARCH_CACHE_PATH enables an on-disk SQLite tier (use /tmp on Vercel).
+search_cache = TieredCache.create(
+    max_entries=int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "512")),
+    ttl_seconds=float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "21600")),
+    disk_path=os.getenv("SEARCH_CACHE_PATH") or None,
+    table="tavily_search",
+)
+
+# Agent call resilience. Each call gets a total latency budget with jittered backoff
+# between attempts, and a circuit breaker per model fails calls straight to the fallback
+# response while the provider is unhealthy. AGENT_HEDGE_PERCENTILE (e.g. 0.95) starts a
+# second attempt once the first runs slower than that percentile of recent calls.
+AGENT_MAX_ATTEMPTS = int(os.getenv("AGENT_MAX_ATTEMPTS", "3"))
+AGENT_DEADLINE_SECONDS = float(os.getenv("AGENT_DEADLINE_SECONDS", "90"))
+AGENT_ATTEMPT_TIMEOUT_SECONDS = float(os.getenv("AGENT_ATTEMPT_TIMEOUT_SECONDS", "60"))
+AGENT_RETRY_BASE_DELAY_SECONDS = float(os.getenv("AGENT_RETRY_BASE_DELAY_SECONDS", "0.5"))
+AGENT_RETRY_MAX_DELAY_SECONDS = float(os.getenv("AGENT_RETRY_MAX_DELAY_SECONDS", "4"))
+AGENT_HEDGE_PERCENTILE = float(os.getenv("AGENT_HEDGE_PERCENTILE", "0")) or None
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+agent_latency = {}
+
+# Recommendation prompt compaction. The analysis is re-sent as compact canonical JSON,
+# near-duplicate search snippets are dropped, and each section is held to a token budget.
+# The analysis budget leaves headroom over a full FashionAnalysis (~250 tokens compact).
+PROMPT_COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+PROMPT_ANALYSIS_TOKEN_BUDGET = int(os.getenv("PROMPT_ANALYSIS_TOKEN_BUDGET", "450"))
+PROMPT_PREFERENCES_TOKEN_BUDGET = int(os.getenv("PROMPT_PREFERENCES_TOKEN_BUDGET", "80"))
+PROMPT_SEARCH_SECTION_TOKEN_BUDGET = int(os.getenv("PROMPT_SEARCH_SECTION_TOKEN_BUDGET", "110"))
+PROMPT_SNIPPET_TOKEN_BUDGET = 25
+# Building the uncompacted prompt for the before/after size report costs as much as the
+# compaction itself, so it is only done for requests logging at debug level and for
+# this fraction of the rest (which feeds the recommendation_prompt_tokens histogram)
+PROMPT_SIZE_SAMPLE_RATE = float(os.getenv("PROMPT_SIZE_SAMPLE_RATE", "0.01"))
+
+# Per-stage metrics, served on /metrics in Prometheus text format
+metrics = MetricsRegistry()
+search_seconds = metrics.histogram(
+    "tavily_search_seconds", "Latency of each Tavily search helper", ("helper", "outcome"))
+agent_attempt_seconds = metrics.histogram(
+    "agent_attempt_seconds", "Duration of each ADK agent run attempt", ("agent", "outcome"))
+agent_retries = metrics.counter("agent_retries", "Agent attempts retried after a retryable error", ("agent",))
+agent_fallbacks = metrics.counter(
+    "agent_fallback_responses", "Fallback responses served, by why the agent call gave up", ("agent", "reason"))
+agent_runs_in_flight = metrics.gauge("agent_runs_in_flight", "Agent runs currently in progress", ("agent",))
+style_session_stage_seconds = metrics.histogram(
+    "style_session_stage_seconds", "Duration of each /style-session stage", ("stage",))
+search_prefetch_lookups = metrics.counter(
+    "search_prefetch_lookups", "Search stages served from a prefetch, by its state", ("outcome",))
+recommendation_cache_lookups = metrics.counter(
+    "recommendation_cache_lookups", "Recommendation cache lookups by outcome", ("outcome",))
+recommendation_prompt_tokens = metrics.histogram(
+    "recommendation_prompt_tokens", "Estimated recommendation prompt size before and after compaction", ("form",),
+    buckets=(250, 500, 750, 1000, 1500, 2000, 3000, 4000, 6000, 8000))
 
 # Define request schemas for fashion analysis
 class FashionAnalysisRequest(BaseModel):
@@ -38,15 +184,126 @@ class FashionAnalysisRequest(BaseModel):
     occasion: str
     constraints: Optional[str] = None
     text_description: Optional[str] = None
+    budget_range: Optional[str] = None
+
+class BatchPhotoAnalysisRequest(BaseModel):
+    photo_urls: List[str]
+    user_preferences: dict
+    occasion: str
+    constraints: Optional[str] = None
+    text_description: Optional[str] = None
+    max_concurrency: Optional[int] = None
 
 class OutfitRecommendationRequest(BaseModel):
-    analysis_result: str
+    analysis_result: Union[str, dict]
+    user_preferences: dict
+    occasion: str
+    budget_range: str
+    bypass_cache: bool = False
+
+class StyleSessionRequest(BaseModel):
+    photo_url: str
     user_preferences: dict
     occasion: str
     budget_range: str
+    constraints: Optional[str] = None
+    text_description: Optional[str] = None
+    bypass_cache: bool = False
+
+# Response schemas, mirroring the OUTPUT FORMAT in each agent's instruction. With structured
+# output enabled they are passed to the model as its response schema.
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() == "true"
+
+class BodyAnalysis(BaseModel):
+    body_type: str
+    key_features: List[str]
+    proportions: str
+
+class ColorAnalysis(BaseModel):
+    skin_undertone: str
+    best_colors: List[str]
+    colors_to_avoid: List[str]
+
+class StyleAssessment(BaseModel):
+    current_style: str
+    strengths: List[str]
+    improvement_areas: List[str]
+
+class FashionAnalysis(BaseModel):
+    body_analysis: BodyAnalysis
+    color_analysis: ColorAnalysis
+    style_assessment: StyleAssessment
+    recommendations_summary: str
+
+class OutfitPiece(BaseModel):
+    item: str
+    color: str
+    why: str
+
+class OutfitAccessory(BaseModel):
+    item: str
+    why: str
+
+class OutfitItems(BaseModel):
+    top: OutfitPiece
+    bottom: OutfitPiece
+    shoes: OutfitPiece
+    accessories: List[OutfitAccessory]
+
+class OutfitRecommendation(BaseModel):
+    name: str
+    description: str
+    items: OutfitItems
+    styling_tips: List[str]
+    budget_estimate: str
+    occasion_fit: str
+
+class OutfitRecommendations(BaseModel):
+    outfit_recommendations: List[OutfitRecommendation]
+    general_styling_advice: List[str]
+    shopping_tips: List[str]
+    image_generation_prompt: str
+
+# Endpoint responses. Model output is returned as a structured object when it matches its
+# schema, or as the raw model text when it does not. With ?legacy_text=true the text the
+# endpoints used to return is included as well, for clients that still parse it themselves.
+class AnalysisResponse(BaseModel):
+    analysis: Optional[Union[FashionAnalysis, str]] = None
+    analysis_text: Optional[str] = None
+    error: Optional[str] = None
+
+class RecommendationResponse(BaseModel):
+    recommendations: Optional[Union[OutfitRecommendations, str]] = None
+    recommendations_text: Optional[str] = None
+    search_data: Optional[dict] = None
+    prompt_size: Optional[dict] = None
+    recommendation_cache: Optional[dict] = None
+    error: Optional[str] = None
+
+class StyleSessionResponse(AnalysisResponse, RecommendationResponse):
+    timings: Optional[dict] = None
+
+def typed_result(response_model, result: dict, legacy_text: bool) -> BaseModel:
+    """A pipeline result as response_model, with its model text fields parsed into their schemas"""
+    fields = dict(result)
+    for key, schema in (("analysis", FashionAnalysis), ("recommendations", OutfitRecommendations)):
+        text = result.get(key)
+        if text is None:
+            continue
+        parsed = parse_model_output(text, schema)
+        fields[key] = parsed if parsed is not None else text
+        if legacy_text:
+            fields[f"{key}_text"] = text
+    return response_model(**fields)
+
+def agent_response(response_model, result: dict, legacy_text: bool) -> FastJSONResponse:
+    """Render a pipeline result, see typed_result"""
+    return model_response(typed_result(response_model, result, legacy_text))
 
 # Initialize FastAPI app with root path for Vercel
-app = FastAPI(title="AI Fashion Guru Agents (ADK)")
+app = FastAPI(title="AI Fashion Guru Agents (ADK)", default_response_class=FastJSONResponse)
+app.add_middleware(HTTPMetricsMiddleware, registry=metrics)
+app.add_middleware(RequestContextMiddleware)
 
 @app.get("/ping")
 async def health_check():
@@ -55,16 +312,27 @@ async def health_check():
         "status": "ok",
         "service": "AI Fashion Guru Agents (Google ADK)",
         "google_api_key_set": bool(GOOGLE_API_KEY),
-        "tavily_api_configured": bool(tavily_client),
+        "tavily_api_configured": bool(TAVILY_API_KEY),
+        "search_cache": search_cache.stats(),
+        "request_coalescing": request_coalescer.stats(),
+        "search_prefetch": search_prefetcher.stats(),
+        "recommendation_cache": recommendation_cache.stats() if RECOMMENDATION_CACHE_ENABLED else None,
+        "circuit_breakers": circuit_breaker_stats(),
         "vercel_url": os.getenv("VERCEL_URL", "not set"),
         "python_version": sys.version,
-        "adk_imported": True,
+        "adk_imported": "google.adk" in sys.modules,
+        "startup": startup_timer.report(),
     }
 
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and in-flight gauges in Prometheus text format"""
+    return metrics.response()
+
 @app.get("/test-search")
 async def test_search():
     """Test endpoint to verify Tavily search functionality"""
-    if not tavily_client:
+    if not TAVILY_API_KEY:
         return {
             "error": "Tavily API not configured",
             "instructions": "Set TAVILY_API_KEY in .env.local to enable search functionality"
@@ -88,136 +356,236 @@ async def test_search():
         }
 
 # Fashion Analysis Agent using Google ADK
-fashion_analysis_agent = LlmAgent(
-    name="fashion_analysis_agent",
-    model="gemini-2.5-flash",
-    description="Expert fashion stylist and image analyst specializing in body type assessment, color analysis, and style recommendations",
-    instruction=(
-        "You are an expert fashion stylist and image analyst with deep knowledge of body types, color theory, style principles, and current fashion trends.\n\n"
-        "Your role is to analyze uploaded photos and provide comprehensive fashion analysis.\n\n"
-        "ANALYSIS PROCESS:\n"
-        "1. **Body Shape Analysis**:\n"
-        "   - Assess body proportions (shoulders, waist, hips)\n"
-        "   - Identify body type (pear, apple, hourglass, rectangle, inverted triangle)\n"
-        "   - Note posture and overall silhouette\n"
-        "   - Consider height proportions\n\n"
-        "2. **Skin Tone Assessment**:\n"
-        "   - Determine undertones (warm, cool, neutral)\n"
-        "   - Assess overall complexion\n"
-        "   - Identify most flattering color palette\n"
-        "   - Note hair color and eye color if visible\n\n"
-        "3. **Current Style Evaluation**:\n"
-        "   - Analyze existing clothing choices\n"
-        "   - Identify style preferences shown\n"
-        "   - Assess fit and proportions of current outfit\n"
-        "   - Note what works well and what could be improved\n\n"
-        "4. **Professional Assessment**:\n"
-        "   - Consider the specified occasion requirements\n"
-        "   - Factor in user's stated style preferences\n"
-        "   - Account for any constraints or requirements\n"
-        "   - Assess lifestyle and practical considerations\n\n"
-        "OUTPUT FORMAT (JSON):\n"
-        "{\n"
-        "  \"body_analysis\": {\n"
-        "    \"body_type\": \"identified body type\",\n"
-        "    \"key_features\": [\"feature1\", \"feature2\"],\n"
-        "    \"proportions\": \"description of proportions\"\n"
-        "  },\n"
-        "  \"color_analysis\": {\n"
-        "    \"skin_undertone\": \"warm/cool/neutral\",\n"
-        "    \"best_colors\": [\"color1\", \"color2\", \"color3\"],\n"
-        "    \"colors_to_avoid\": [\"color1\", \"color2\"]\n"
-        "  },\n"
-        "  \"style_assessment\": {\n"
-        "    \"current_style\": \"description\",\n"
-        "    \"strengths\": [\"strength1\", \"strength2\"],\n"
-        "    \"improvement_areas\": [\"area1\", \"area2\"]\n"
-        "  },\n"
-        "  \"recommendations_summary\": \"Brief overview of styling direction\"\n"
-        "}\n\n"
-        "Be specific, professional, and constructive in your analysis. Return only the JSON response."
-    ),
-    tools=[]
-)
+@functools.lru_cache(maxsize=None)
+def get_fashion_analysis_agent() -> "LlmAgent":
+    """Build the fashion analysis agent on first use"""
+    with startup_timer.measure("fashion_analysis_agent"):
+        from google.adk.agents import LlmAgent
+        return LlmAgent(
+            name="fashion_analysis_agent",
+            model="gemini-2.5-flash",
+            description="Expert fashion stylist and image analyst specializing in body type assessment, color analysis, and style recommendations",
+            instruction=(
+                "You are an expert fashion stylist and image analyst with deep knowledge of body types, color theory, style principles, and current fashion trends.\n\n"
+                "Your role is to analyze uploaded photos and provide comprehensive fashion analysis.\n\n"
+                "ANALYSIS PROCESS:\n"
+                "1. **Body Shape Analysis**:\n"
+                "   - Assess body proportions (shoulders, waist, hips)\n"
+                "   - Identify body type (pear, apple, hourglass, rectangle, inverted triangle)\n"
+                "   - Note posture and overall silhouette\n"
+                "   - Consider height proportions\n\n"
+                "2. **Skin Tone Assessment**:\n"
+                "   - Determine undertones (warm, cool, neutral)\n"
+                "   - Assess overall complexion\n"
+                "   - Identify most flattering color palette\n"
+                "   - Note hair color and eye color if visible\n\n"
+                "3. **Current Style Evaluation**:\n"
+                "   - Analyze existing clothing choices\n"
+                "   - Identify style preferences shown\n"
+                "   - Assess fit and proportions of current outfit\n"
+                "   - Note what works well and what could be improved\n\n"
+                "4. **Professional Assessment**:\n"
+                "   - Consider the specified occasion requirements\n"
+                "   - Factor in user's stated style preferences\n"
+                "   - Account for any constraints or requirements\n"
+                "   - Assess lifestyle and practical considerations\n\n"
+                "OUTPUT FORMAT (JSON):\n"
+                "{\n"
+                "  \"body_analysis\": {\n"
+                "    \"body_type\": \"identified body type\",\n"
+                "    \"key_features\": [\"feature1\", \"feature2\"],\n"
+                "    \"proportions\": \"description of proportions\"\n"
+                "  },\n"
+                "  \"color_analysis\": {\n"
+                "    \"skin_undertone\": \"warm/cool/neutral\",\n"
+                "    \"best_colors\": [\"color1\", \"color2\", \"color3\"],\n"
+                "    \"colors_to_avoid\": [\"color1\", \"color2\"]\n"
+                "  },\n"
+                "  \"style_assessment\": {\n"
+                "    \"current_style\": \"description\",\n"
+                "    \"strengths\": [\"strength1\", \"strength2\"],\n"
+                "    \"improvement_areas\": [\"area1\", \"area2\"]\n"
+                "  },\n"
+                "  \"recommendations_summary\": \"Brief overview of styling direction\"\n"
+                "}\n\n"
+                "Be specific, professional, and constructive in your analysis. Return only the JSON response."
+            ),
+            tools=[],
+            output_schema=FashionAnalysis if STRUCTURED_OUTPUT_ENABLED else None,
+            disallow_transfer_to_parent=STRUCTURED_OUTPUT_ENABLED,
+            disallow_transfer_to_peers=STRUCTURED_OUTPUT_ENABLED
+        )
 
 # Outfit Recommendation Agent using Google ADK
-outfit_recommendation_agent = LlmAgent(
-    name="outfit_recommendation_agent",
-    model="gemini-2.5-flash",
-    description="Professional fashion stylist creating specific outfit recommendations based on body analysis and user preferences",
-    instruction=(
-        "You are a professional fashion stylist who creates specific, actionable outfit recommendations based on body analysis, user preferences, and occasion requirements.\n\n"
-        "Your expertise includes:\n"
-        "- Current fashion trends and timeless style principles\n"
-        "- Specific clothing items, brands, and where to find them\n"
-        "- Styling techniques for different body types\n"
-        "- Color coordination and pattern mixing\n"
-        "- Occasion-appropriate dressing\n"
-        "- Budget-conscious styling solutions\n\n"
-        "RECOMMENDATION PROCESS:\n"
-        "1. **Analyze Input Data**:\n"
-        "   - Review the fashion analysis results\n"
-        "   - PRIORITIZE user's budget constraints (budget-friendly: under $50, mid-range: $50-150, premium: $150-300, luxury: $300+)\n"
-        "   - Consider user's style preferences and any additional constraints\n"
-        "   - Factor in occasion requirements\n\n"
-        "2. **Create Budget-Appropriate Outfit Recommendations**:\n"
-        "   - Design 3 complete outfit options WITHIN the specified budget range\n"
-        "   - Ensure each outfit flatters the identified body type\n"
-        "   - Use colors that complement the skin tone\n"
-        "   - Include specific items (tops, bottoms, shoes, accessories) with realistic price points\n"
-        "   - Recommend specific brands that match the budget tier\n"
-        "   - Provide styling tips for each outfit\n\n"
-        "3. **Budget-Conscious Practical Details**:\n"
-        "   - Suggest specific brands and EXACT price ranges within budget\n"
-        "   - Explain why each choice works for the user AND fits their budget\n"
-        "   - Include where to shop for each budget tier (fast fashion, mid-range, designer, luxury)\n"
-        "   - Provide money-saving tips when relevant\n"
-        "   - Include styling and fit tips\n\n"
-        "OUTPUT FORMAT (JSON):\n"
-        "{\n"
-        "  \"outfit_recommendations\": [\n"
-        "    {\n"
-        "      \"name\": \"Outfit name/theme\",\n"
-        "      \"description\": \"Overall look description\",\n"
-        "      \"items\": {\n"
-        "        \"top\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
-        "        \"bottom\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
-        "        \"shoes\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
-        "        \"accessories\": [{\"item\": \"accessory\", \"why\": \"reasoning\"}]\n"
-        "      },\n"
-        "      \"styling_tips\": [\"tip1\", \"tip2\"],\n"
-        "      \"budget_estimate\": \"price range\",\n"
-        "      \"occasion_fit\": \"how it fits the occasion\"\n"
-        "    }\n"
-        "  ],\n"
-        "  \"general_styling_advice\": [\"advice1\", \"advice2\"],\n"
-        "  \"shopping_tips\": [\"tip1\", \"tip2\"],\n"
-        "  \"image_generation_prompt\": \"Detailed description for AI image generation\"\n"
-        "}\n\n"
-        "Focus on practical, achievable recommendations that build confidence. Return only the JSON response."
-    ),
-    tools=[]
-)
+@functools.lru_cache(maxsize=None)
+def get_outfit_recommendation_agent() -> "LlmAgent":
+    """Build the outfit recommendation agent on first use"""
+    with startup_timer.measure("outfit_recommendation_agent"):
+        from google.adk.agents import LlmAgent
+        return LlmAgent(
+            name="outfit_recommendation_agent",
+            model="gemini-2.5-flash",
+            description="Professional fashion stylist creating specific outfit recommendations based on body analysis and user preferences",
+            instruction=(
+                "You are a professional fashion stylist who creates specific, actionable outfit recommendations based on body analysis, user preferences, and occasion requirements.\n\n"
+                "Your expertise includes:\n"
+                "- Current fashion trends and timeless style principles\n"
+                "- Specific clothing items, brands, and where to find them\n"
+                "- Styling techniques for different body types\n"
+                "- Color coordination and pattern mixing\n"
+                "- Occasion-appropriate dressing\n"
+                "- Budget-conscious styling solutions\n\n"
+                "RECOMMENDATION PROCESS:\n"
+                "1. **Analyze Input Data**:\n"
+                "   - Review the fashion analysis results\n"
+                "   - PRIORITIZE user's budget constraints (budget-friendly: under $50, mid-range: $50-150, premium: $150-300, luxury: $300+)\n"
+                "   - Consider user's style preferences and any additional constraints\n"
+                "   - Factor in occasion requirements\n\n"
+                "2. **Create Budget-Appropriate Outfit Recommendations**:\n"
+                "   - Design 3 complete outfit options WITHIN the specified budget range\n"
+                "   - Ensure each outfit flatters the identified body type\n"
+                "   - Use colors that complement the skin tone\n"
+                "   - Include specific items (tops, bottoms, shoes, accessories) with realistic price points\n"
+                "   - Recommend specific brands that match the budget tier\n"
+                "   - Provide styling tips for each outfit\n\n"
+                "3. **Budget-Conscious Practical Details**:\n"
+                "   - Suggest specific brands and EXACT price ranges within budget\n"
+                "   - Explain why each choice works for the user AND fits their budget\n"
+                "   - Include where to shop for each budget tier (fast fashion, mid-range, designer, luxury)\n"
+                "   - Provide money-saving tips when relevant\n"
+                "   - Include styling and fit tips\n\n"
+                "OUTPUT FORMAT (JSON):\n"
+                "{\n"
+                "  \"outfit_recommendations\": [\n"
+                "    {\n"
+                "      \"name\": \"Outfit name/theme\",\n"
+                "      \"description\": \"Overall look description\",\n"
+                "      \"items\": {\n"
+                "        \"top\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
+                "        \"bottom\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
+                "        \"shoes\": {\"item\": \"specific item\", \"color\": \"color\", \"why\": \"reasoning\"},\n"
+                "        \"accessories\": [{\"item\": \"accessory\", \"why\": \"reasoning\"}]\n"
+                "      },\n"
+                "      \"styling_tips\": [\"tip1\", \"tip2\"],\n"
+                "      \"budget_estimate\": \"price range\",\n"
+                "      \"occasion_fit\": \"how it fits the occasion\"\n"
+                "    }\n"
+                "  ],\n"
+                "  \"general_styling_advice\": [\"advice1\", \"advice2\"],\n"
+                "  \"shopping_tips\": [\"tip1\", \"tip2\"],\n"
+                "  \"image_generation_prompt\": \"Detailed description for AI image generation\"\n"
+                "}\n\n"
+                "Focus on practical, achievable recommendations that build confidence. Return only the JSON response."
+            ),
+            tools=[],
+            output_schema=OutfitRecommendations if STRUCTURED_OUTPUT_ENABLED else None,
+            disallow_transfer_to_parent=STRUCTURED_OUTPUT_ENABLED,
+            disallow_transfer_to_peers=STRUCTURED_OUTPUT_ENABLED
+        )
 
 # Multi-agent coordinator
-fashion_coordinator = LlmAgent(
-    name="fashion_coordinator",
-    model="gemini-2.5-flash", 
-    description="Coordinates fashion analysis and outfit recommendation workflow",
-    instruction="You coordinate between fashion analysis and outfit recommendation agents to provide comprehensive styling advice.",
-    sub_agents=[fashion_analysis_agent, outfit_recommendation_agent]
-)
+@functools.lru_cache(maxsize=None)
+def get_fashion_coordinator() -> "LlmAgent":
+    """Build the coordinator agent on first use (not used by the endpoints)"""
+    with startup_timer.measure("fashion_coordinator"):
+        from google.adk.agents import LlmAgent
+        return LlmAgent(
+            name="fashion_coordinator",
+            model="gemini-2.5-flash", 
+            description="Coordinates fashion analysis and outfit recommendation workflow",
+            instruction="You coordinate between fashion analysis and outfit recommendation agents to provide comprehensive styling advice.",
+            sub_agents=[get_fashion_analysis_agent(), get_outfit_recommendation_agent()]
+        )
+
+# Long-lived ADK runners, one per agent
+ADK_APP_NAME = "fashion-designer-ai"
+ADK_USER_ID = "api_user"
+
+class AgentRunnerPool:
+    """Keeps one Runner and InMemorySessionService per agent for the life of the process.
+
+    Each agent call gets its own short-lived session which is deleted as soon as the
+    call finishes, so the session store does not grow with traffic.
+    """
+
+    def __init__(self):
+        self._runners = {}
+
+    def get_runner(self, agent: "LlmAgent") -> "Runner":
+        runner = self._runners.get(agent.name)
+        if runner is None:
+            from google.adk import Runner
+            from google.adk.sessions import InMemorySessionService
+            runner = Runner(
+                app_name=ADK_APP_NAME,
+                agent=agent,
+                session_service=InMemorySessionService()
+            )
+            self._runners[agent.name] = runner
+        return runner
+
+    @asynccontextmanager
+    async def session(self, agent: "LlmAgent"):
+        runner = self.get_runner(agent)
+        session_id = f"session_{uuid.uuid4().hex}"
+        await runner.session_service.create_session(
+            app_name=ADK_APP_NAME,
+            user_id=ADK_USER_ID,
+            session_id=session_id
+        )
+        try:
+            yield runner, ADK_USER_ID, session_id
+        finally:
+            await runner.session_service.delete_session(
+                app_name=ADK_APP_NAME,
+                user_id=ADK_USER_ID,
+                session_id=session_id
+            )
+
+agent_runner_pool = AgentRunnerPool()
 
 # Fashion Search Utility Functions using Tavily API
+async def tavily_search(query: str, **params) -> dict:
+    """Run a Tavily search through the result cache, on the search executor on a miss"""
+    cache_key = make_cache_key(normalize_text(query), **params)
+    cached = search_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def search_and_store() -> dict:
+        response = get_tavily_client().search(query=query, **params)
+        if response and "results" in response:
+            search_cache.set(cache_key, response)
+        return response
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(search_executor, search_and_store)
+
+def timed_search(search):
+    """Record a search helper's latency in tavily_search_seconds, labeled by outcome"""
+    @functools.wraps(search)
+    async def wrapper(*args, **kwargs):
+        with search_seconds.time(helper=search.__name__, outcome="ok") as labels:
+            try:
+                result = await search(*args, **kwargs)
+            except asyncio.CancelledError:
+                labels["outcome"] = "timeout"
+                raise
+            if not result.get("success"):
+                labels["outcome"] = "error" if "success" in result else "disabled"
+            return result
+    return wrapper
+
+@timed_search
 async def search_fashion_trends(occasion: str, style: str, season: str = "2025") -> dict:
     """Search for current fashion trends based on occasion and style"""
-    if not tavily_client:
+    if not TAVILY_API_KEY:
         return {"trends": [], "error": "Search API not available"}
     
     try:
         query = f"fashion trends {season} {style} {occasion} clothing outfit ideas"
-        response = tavily_client.search(
-            query=query,
+        response = await tavily_search(
+            query,
             search_depth="advanced",
             max_results=5,
             exclude_domains=["pinterest.com", "spam-sites.com"]
@@ -234,19 +602,20 @@ async def search_fashion_trends(occasion: str, style: str, season: str = "2025")
         
         return {"trends": trends_info, "query": query, "success": True}
     except Exception as e:
-        print(f"Error searching fashion trends: {str(e)}", file=sys.stderr)
+        logger.warning("Error searching fashion trends: %s", e)
         return {"trends": [], "error": str(e), "success": False}
 
+@timed_search
 async def search_clothing_prices(item_type: str, budget: str, brand_preference: str = "") -> dict:
     """Search for clothing prices and shopping information"""
-    if not tavily_client:
+    if not TAVILY_API_KEY:
         return {"pricing": [], "error": "Search API not available"}
     
     try:
         brand_query = f"{brand_preference} " if brand_preference else ""
         query = f"{brand_query}{item_type} price {budget} where to buy shopping"
-        response = tavily_client.search(
-            query=query,
+        response = await tavily_search(
+            query,
             search_depth="basic",
             max_results=5,
             exclude_domains=["aliexpress.com", "wish.com"]
@@ -263,19 +632,20 @@ async def search_clothing_prices(item_type: str, budget: str, brand_preference:
         
         return {"pricing": pricing_info, "query": query, "success": True}
     except Exception as e:
-        print(f"Error searching clothing prices: {str(e)}", file=sys.stderr)
+        logger.warning("Error searching clothing prices: %s", e)
         return {"pricing": [], "error": str(e), "success": False}
 
+@timed_search
 async def search_fashion_brands(budget_range: str, style: str, item_category: str = "") -> dict:
     """Search for fashion brands that match budget and style preferences"""
-    if not tavily_client:
+    if not TAVILY_API_KEY:
         return {"brands": [], "error": "Search API not available"}
     
     try:
         category_query = f"{item_category} " if item_category else ""
         query = f"best {style} {category_query}fashion brands {budget_range} affordable quality"
-        response = tavily_client.search(
-            query=query,
+        response = await tavily_search(
+            query,
             search_depth="basic", 
             max_results=4
         )
@@ -291,120 +661,32 @@ async def search_fashion_brands(budget_range: str, style: str, item_category: st
         
         return {"brands": brand_info, "query": query, "success": True}
     except Exception as e:
-        print(f"Error searching fashion brands: {str(e)}", file=sys.stderr)
+        logger.warning("Error searching fashion brands: %s", e)
         return {"brands": [], "error": str(e), "success": False}
 
-async def run_agent_with_input(agent: LlmAgent, user_input: str, max_retries: int = 3) -> str:
-    """Run an ADK agent with user input and return the response with error handling and retries"""
-    
-    for attempt in range(max_retries):
-        try:
-            print(f"Agent run attempt {attempt + 1}/{max_retries} for {agent.name}", file=sys.stderr)
-            
-            # Create a runner for the agent
-            session_service = InMemorySessionService()
-            runner = Runner(
-                app_name="fashion-designer-ai",
-                agent=agent,
-                session_service=session_service
-            )
-            
-            # Create content object for the user input
-            content = types.Content(role='user', parts=[types.Part(text=user_input)])
-            
-            # Generate unique session ID based on input hash and attempt
-            import hashlib
-            session_id = f"session_{hashlib.md5(f'{user_input}_{attempt}'.encode()).hexdigest()[:8]}"
-            user_id = "api_user"
-            
-            # Create session if it doesn't exist
-            existing_session = await session_service.get_session(
-                app_name="fashion-designer-ai",
-                user_id=user_id,
-                session_id=session_id
-            )
-            
-            if not existing_session:
-                await session_service.create_session(
-                    app_name="fashion-designer-ai",
-                    user_id=user_id,
-                    session_id=session_id
-                )
-            
-            # Run the agent with proper parameters
-            response_text = ""
-            tool_calls_detected = False
-            tool_calls_successful = False
-            
-            async for event in runner.run_async(
-                user_id=user_id,
-                session_id=session_id,
-                new_message=content
-            ):
-                # Log event details for debugging
-                print(f"Event type: {type(event).__name__}, Author: {getattr(event, 'author', 'N/A')}", file=sys.stderr)
-                
-                # Check for tool usage
-                if hasattr(event, 'tool_calls') and event.tool_calls:
-                    tool_calls_detected = True
-                    print(f"Tool calls detected: {len(event.tool_calls)}", file=sys.stderr)
-                    
-                    # Validate tool call results
-                    for tool_call in event.tool_calls:
-                        if hasattr(tool_call, 'result') and tool_call.result:
-                            tool_calls_successful = True
-                            print(f"Tool call successful: {tool_call.name if hasattr(tool_call, 'name') else 'unknown'}", file=sys.stderr)
-                
-                if event.is_final_response():
-                    response_text = event.content.parts[0].text
-                    
-                    # Validate response quality
-                    if len(response_text.strip()) < 10:
-                        raise ValueError(f"Response too short: {response_text}")
-                    
-                    # For agents with tools, verify they actually used tools when expected
-                    if agent.tools and "search" in user_input.lower() and not tool_calls_detected:
-                        print(f"Warning: Expected tool usage but none detected", file=sys.stderr)
-                    
-                    # Check if response indicates tool failure
-                    if "I cannot" in response_text or "unable to access" in response_text.lower():
-                        raise ValueError(f"Agent indicated tool failure: {response_text[:100]}")
-                    
-                    print(f"Successful response from {agent.name} on attempt {attempt + 1}", file=sys.stderr)
-                    return response_text
-            
-            # If we reach here, no final response was found
-            raise ValueError("No final response generated from agent")
-            
-        except Exception as e:
-            error_msg = str(e)
-            print(f"Attempt {attempt + 1} failed for {agent.name}: {error_msg}", file=sys.stderr)
-            
-            # Check for specific error types that indicate we should retry
-            retry_errors = [
-                "Tool use with function calling is unsupported",
-                "INVALID_ARGUMENT",
-                "Session not found",
-                "No final response",
-                "Response too short",
-                "tool failure"
-            ]
-            
-            should_retry = any(retry_error in error_msg for retry_error in retry_errors)
-            
-            if attempt < max_retries - 1 and should_retry:
-                import asyncio
-                # Exponential backoff: wait 1s, then 2s, then 4s
-                wait_time = 2 ** attempt
-                print(f"Retrying in {wait_time} seconds...", file=sys.stderr)
-                await asyncio.sleep(wait_time)
-                continue
-            else:
-                # Final attempt failed or non-retryable error
-                if should_retry:
-                    # Provide fallback response based on agent type
-                    if agent.name == "fashion_analysis_agent":
-                        fallback_response = """```json
+async def run_search_with_timeout(search, result_key: str, timeout: float = SEARCH_TIMEOUT_SECONDS) -> dict:
+    """Await a single search coroutine, turning a timeout into an empty partial result"""
+    try:
+        return await asyncio.wait_for(search, timeout=timeout)
+    except asyncio.TimeoutError:
+        logger.warning("Search for %s timed out after %ss", result_key, timeout)
+        return {result_key: [], "error": f"Search timed out after {timeout}s", "success": False}
+
+async def run_search_stage(occasion: str, style: str, budget_range: str) -> tuple:
+    """Run the trends, pricing and brand searches concurrently.
+
+    Each search has its own timeout, so one slow lookup only drops its own section
+    of the search context instead of delaying the whole recommendation.
+    """
+    trends_data, pricing_data, brands_data = await asyncio.gather(
+        run_search_with_timeout(search_fashion_trends(occasion, style), "trends"),
+        run_search_with_timeout(search_clothing_prices("clothing", budget_range), "pricing"),
+        run_search_with_timeout(search_fashion_brands(budget_range, style), "brands"),
+    )
+    return trends_data, pricing_data, brands_data
+
+# Responses served when an agent keeps failing with a retryable error
+FALLBACK_ANALYSIS_RESPONSE = """```json
 {
   "body_analysis": {
     "body_type": "Unable to analyze from image",
@@ -424,11 +706,8 @@ async def run_agent_with_input(agent: LlmAgent, user_input: str, max_retries: in
   "recommendations_summary": "Due to technical limitations, providing general styling guidance. Please try again for detailed analysis."
 }
 ```"""
-                        print(f"Using fallback response for {agent.name}", file=sys.stderr)
-                        return fallback_response
-                    else:
-                        # For outfit recommendation agent
-                        fallback_response = """```json
+
+FALLBACK_RECOMMENDATION_RESPONSE = """```json
 {
   "outfit_recommendations": [
     {
@@ -450,110 +729,640 @@ async def run_agent_with_input(agent: LlmAgent, user_input: str, max_retries: in
   "image_generation_prompt": "Professional person wearing classic work attire in office setting"
 }
 ```"""
-                        print(f"Using fallback response for {agent.name}", file=sys.stderr)
-                        return fallback_response
-                else:
-                    raise e
 
-@app.post("/analyze-photo")
-async def analyze_photo(request: FashionAnalysisRequest):
+FALLBACK_ANALYSIS = parse_json_output(FALLBACK_ANALYSIS_RESPONSE, FashionAnalysis)
+
+class AgentResponseError(ValueError):
+    """The agent finished without a usable response; another attempt may do better"""
+
+# Errors ADK surfaces without an HTTP status that still tend to clear up on retry
+AGENT_RETRYABLE_MESSAGES = (
+    "Tool use with function calling is unsupported",
+    "INVALID_ARGUMENT",
+    "Session not found",
+)
+
+def is_retryable_agent_error(error: BaseException) -> bool:
+    if isinstance(error, AgentResponseError) or is_transient_error(error):
+        return True
+    return any(message in str(error) for message in AGENT_RETRYABLE_MESSAGES)
+
+async def run_agent_once(agent: "LlmAgent", user_input: str, run_kwargs: dict, emit) -> str:
+    """Run a single agent attempt in a fresh session and return the final response text"""
+    from google.genai import types
+    
+    # Create content object for the user input
+    content = types.Content(role='user', parts=[types.Part(text=user_input)])
+    
+    # Borrow the agent's pooled runner and a fresh session that is dropped afterwards
+    async with agent_runner_pool.session(agent) as (runner, user_id, session_id):
+        tool_calls_detected = False
+        response_text = None
+        debug = logger.isEnabledFor(logging.DEBUG)
+        
+        # The stream is read to the end rather than returning at the final response:
+        # abandoning it early leaves ADK's inner generators to the garbage collector,
+        # whose tracing spans then fail to detach and log a traceback per call
+        events = runner.run_async(
+            user_id=user_id,
+            session_id=session_id,
+            new_message=content,
+            **run_kwargs
+        )
+        try:
+            async for event in events:
+                if debug:
+                    logger.debug("Agent event", extra={"agent": agent.name, "event_type": type(event).__name__,
+                                                       "author": getattr(event, 'author', None),
+                                                       "partial": bool(getattr(event, 'partial', False))})
+                
+                # Forward partial text chunks to streaming callers
+                if getattr(event, 'partial', False) and event.content and event.content.parts:
+                    chunk = "".join(part.text or "" for part in event.content.parts)
+                    if chunk:
+                        await emit("partial", {"agent": agent.name, "text": chunk})
+                    continue
+                
+                # Check for tool usage
+                if hasattr(event, 'tool_calls') and event.tool_calls:
+                    tool_calls_detected = True
+                    if debug:
+                        logger.debug("Tool calls detected", extra={"agent": agent.name, "tool_calls": len(event.tool_calls)})
+                
+                if event.is_final_response() and event.content and event.content.parts:
+                    response_text = event.content.parts[0].text
+        finally:
+            await events.aclose()
+    
+    # If we reach here without text, no final response was found
+    if response_text is None:
+        raise AgentResponseError("No final response generated from agent")
+    
+    # Validate response quality
+    if len(response_text.strip()) < 10:
+        raise AgentResponseError(f"Response too short: {response_text}")
+    
+    # For agents with tools, verify they actually used tools when expected
+    if agent.tools and "search" in user_input.lower() and not tool_calls_detected:
+        logger.info("Expected tool usage but none detected", extra={"agent": agent.name})
+    
+    # Check if response indicates tool failure
+    if "I cannot" in response_text or "unable to access" in response_text.lower():
+        raise AgentResponseError(f"Agent indicated tool failure: {response_text[:100]}")
+    
+    return response_text
+
+async def run_agent_with_input(agent: "LlmAgent", user_input: str, max_retries: Optional[int] = None, on_event=None) -> str:
+    """Run an ADK agent with user input and return the response with error handling and retries
+
+    Attempts run under the agent retry policy: a total AGENT_DEADLINE_SECONDS budget,
+    jittered backoff between attempts and a circuit breaker per model. Once retries,
+    budget or circuit give out on a retryable error the canned fallback response is
+    returned; other errors are raised.
+
+    When on_event is given it is awaited as on_event(stage, data) for stage markers
+    (agent_started, retry, fallback) and for partial model text, and the runner is
+    switched to SSE streaming mode so partial text arrives as it is generated.
+    Streaming calls are never hedged, so partial text comes from a single attempt.
+    """
+    from google.adk.agents.run_config import RunConfig, StreamingMode
+    
+    async def emit(stage: str, data: dict):
+        if on_event:
+            await on_event(stage, data)
+
+    run_kwargs = {}
+    if on_event:
+        run_kwargs["run_config"] = RunConfig(streaming_mode=StreamingMode.SSE)
+    
+    policy = RetryPolicy(
+        max_attempts=max_retries or AGENT_MAX_ATTEMPTS,
+        deadline_seconds=AGENT_DEADLINE_SECONDS,
+        attempt_timeout_seconds=AGENT_ATTEMPT_TIMEOUT_SECONDS,
+        base_delay_seconds=AGENT_RETRY_BASE_DELAY_SECONDS,
+        max_delay_seconds=AGENT_RETRY_MAX_DELAY_SECONDS,
+        hedge_percentile=None if on_event else AGENT_HEDGE_PERCENTILE,
+    )
+    breaker = get_circuit_breaker(f"gemini:{agent.model}", CIRCUIT_FAILURE_THRESHOLD, CIRCUIT_RESET_SECONDS)
+    latency = agent_latency.setdefault(agent.name, LatencyTracker())
+    attempts_started = 0
+
+    async def attempt() -> str:
+        nonlocal attempts_started
+        attempts_started += 1
+        logger.debug("Agent run attempt %s/%s for %s", attempts_started, policy.max_attempts, agent.name)
+        await emit("agent_started", {"agent": agent.name, "attempt": attempts_started})
+        return await run_agent_once(agent, user_input, run_kwargs, emit)
+
+    def record_attempt(attempt_number: int, seconds: float, error: Optional[BaseException], hedged: bool):
+        if error is None:
+            outcome = "hedged_success" if hedged else "success"
+            logger.debug("Successful response from %s on attempt %s", agent.name, attempt_number,
+                         extra={"agent": agent.name, "attempt": attempt_number, "seconds": round(seconds, 3), "hedged": hedged})
+        else:
+            outcome = "retryable_error" if is_retryable_agent_error(error) else "error"
+            logger.warning("Attempt %s failed for %s: %s", attempt_number, agent.name, error,
+                           extra={"agent": agent.name, "attempt": attempt_number, "outcome": outcome})
+        agent_attempt_seconds.observe(seconds, agent=agent.name, outcome=outcome)
+
+    async def before_retry(attempt_number: int, delay: float, error: BaseException):
+        logger.info("Retrying %s in %.2f seconds", agent.name, delay)
+        agent_retries.inc(agent=agent.name)
+        await emit("retry", {"agent": agent.name, "attempt": attempt_number, "wait_seconds": round(delay, 2), "error": str(error)})
+
+    with agent_runs_in_flight.track(agent=agent.name):
+        try:
+            return await resilient_call(
+                attempt,
+                policy,
+                breaker=breaker,
+                latency=latency,
+                is_retryable=is_retryable_agent_error,
+                on_attempt=record_attempt,
+                on_retry=before_retry,
+            )
+        except Exception as e:
+            if isinstance(e, CircuitOpenError):
+                reason = "circuit_open"
+            elif isinstance(e, DeadlineExceeded):
+                reason = "deadline"
+            elif is_retryable_agent_error(e):
+                reason = "retries_exhausted"
+            else:
+                raise
+            # Provide fallback response based on agent type
+            logger.warning("Using fallback response for %s (%s): %s", agent.name, reason, e,
+                           extra={"agent": agent.name, "reason": reason})
+            agent_fallbacks.inc(agent=agent.name, reason=reason)
+            await emit("fallback", {"agent": agent.name, "reason": reason})
+            if agent.name == "fashion_analysis_agent":
+                return FALLBACK_ANALYSIS_RESPONSE
+            return FALLBACK_RECOMMENDATION_RESPONSE
+
+def build_analysis_prompt(request: FashionAnalysisRequest) -> str:
+    """Create the detailed prompt for the fashion analysis agent"""
+    return (
+        f"Please analyze this photo for fashion styling purposes.\n\n"
+        f"Photo URL: {request.photo_url}\n\n"
+        f"User Preferences: {request.user_preferences}\n"
+        f"Occasion: {request.occasion}\n"
+        f"Additional Constraints: {request.constraints or 'None'}\n"
+        f"Additional Context from User: {request.text_description or 'None'}\n\n"
+        f"Provide a comprehensive fashion analysis following the specified JSON format."
+    )
+
+def build_search_context(trends_data: dict, pricing_data: dict, brands_data: dict,
+                         compact: bool = PROMPT_COMPACTION_ENABLED) -> str:
+    """Summarize successful search results into prompt sections"""
+    if compact:
+        return build_compact_search_context(trends_data, pricing_data, brands_data)
+    search_context = ""
+    if trends_data.get("success"):
+        trends_summary = "\n".join([f"- {trend.get('title', '')}: {trend.get('content', '')[:100]}..." 
+                                   for trend in trends_data.get("trends", [])])
+        search_context += f"\n\nCURRENT FASHION TRENDS:\n{trends_summary}"
+    
+    if pricing_data.get("success"):
+        pricing_summary = "\n".join([f"- {price.get('title', '')}: {price.get('content', '')[:100]}..." 
+                                    for price in pricing_data.get("pricing", [])])
+        search_context += f"\n\nPRICING INFORMATION:\n{pricing_summary}"
+    
+    if brands_data.get("success"):
+        brands_summary = "\n".join([f"- {brand.get('title', '')}: {brand.get('content', '')[:100]}..." 
+                                   for brand in brands_data.get("brands", [])])
+        search_context += f"\n\nRECOMMENDED BRANDS:\n{brands_summary}"
+    return search_context
+
+def build_compact_search_context(trends_data: dict, pricing_data: dict, brands_data: dict) -> str:
+    """Search context with duplicate snippets removed and each section held to its token budget"""
+    sections = (
+        ("CURRENT FASHION TRENDS", trends_data, "trends"),
+        ("PRICING INFORMATION", pricing_data, "pricing"),
+        ("RECOMMENDED BRANDS", brands_data, "brands"),
+    )
+    # De-duplicate across sections, so a page found by two searches is only sent once
+    unique = dedupe_snippets(
+        dict(snippet, section=key)
+        for _, data, key in sections if data.get("success")
+        for snippet in data.get(key, [])
+    )
+    search_context = ""
+    for heading, data, key in sections:
+        if not data.get("success"):
+            continue
+        lines = [
+            f"- {collapse_whitespace(snippet.get('title', ''))}: "
+            f"{truncate_to_tokens(collapse_whitespace(snippet.get('content', '')), PROMPT_SNIPPET_TOKEN_BUDGET)}"
+            for snippet in unique if snippet["section"] == key
+        ]
+        kept = fit_lines_to_budget(lines, PROMPT_SEARCH_SECTION_TOKEN_BUDGET)
+        if kept:
+            search_context += f"\n\n{heading}:\n" + "\n".join(kept)
+    return search_context
+
+def compact_preferences(user_preferences) -> str:
+    """User preferences as compact JSON without empty values, instead of a Python repr"""
+    if not isinstance(user_preferences, dict):
+        return truncate_to_tokens(collapse_whitespace(str(user_preferences)), PROMPT_PREFERENCES_TOKEN_BUDGET)
+    return fit_json_to_budget(drop_empty(user_preferences), PROMPT_PREFERENCES_TOKEN_BUDGET)
+
+def build_recommendation_prompt(request: OutfitRecommendationRequest, search_context: str,
+                                compact: bool = PROMPT_COMPACTION_ENABLED,
+                                parsed_analysis: Optional[dict] = None) -> str:
+    """Create the detailed prompt for the outfit recommendation agent.
+
+    parsed_analysis, when the caller already has the analysis as a dict, saves
+    re-extracting it from request.analysis_result.
+    """
+    analysis = request.analysis_result
+    preferences = request.user_preferences
+    if isinstance(analysis, dict):
+        parsed_analysis = analysis if parsed_analysis is None else parsed_analysis
+        analysis = json.dumps(analysis)
+    if compact:
+        if parsed_analysis is not None:
+            analysis = fit_json_to_budget(drop_empty(parsed_analysis), PROMPT_ANALYSIS_TOKEN_BUDGET, COLOR_LISTS)
+        else:
+            analysis = compact_model_json(analysis, PROMPT_ANALYSIS_TOKEN_BUDGET, FashionAnalysis, COLOR_LISTS)
+        preferences = compact_preferences(preferences)
+    return (
+        f"Based on the following fashion analysis, create specific outfit recommendations:\n\n"
+        f"ANALYSIS RESULTS:\n{analysis}\n\n"
+        f"USER PREFERENCES: {preferences}\n"
+        f"OCCASION: {request.occasion}\n"
+        f"BUDGET RANGE: {request.budget_range}"
+        f"{search_context}\n\n"
+        f"Using the current trends, pricing information, and brand recommendations above, "
+        f"please provide 3 complete outfit recommendations following the specified JSON format. "
+        f"Include specific items, brands from the research above when relevant, styling tips, "
+        f"and an image generation prompt for visualizing the user in the recommended outfits. "
+        f"Incorporate the real-time fashion data to make recommendations more current and actionable."
+    )
+
+async def perform_photo_analysis(request: FashionAnalysisRequest, on_event=None) -> dict:
+    """Run the fashion analysis agent for a request"""
+    user_prompt = build_analysis_prompt(request)
+    analysis_result = await run_agent_with_input(get_fashion_analysis_agent(), user_prompt, on_event=on_event)
+    return {"analysis": analysis_result}
+
+async def coalesced_photo_analysis(request: FashionAnalysisRequest) -> dict:
+    """Run perform_photo_analysis, sharing the result with identical concurrent requests"""
+    key = make_cache_key("analyze-photo", request.model_dump())
+    return await request_coalescer.run(key, lambda: perform_photo_analysis(request))
+
+async def coalesced_outfit_recommendation(request: OutfitRecommendationRequest) -> dict:
+    """Run perform_outfit_recommendation, sharing the result with identical concurrent requests"""
+    key = make_cache_key("recommend-outfit", request.model_dump())
+    return await request_coalescer.run(key, lambda: perform_outfit_recommendation(request))
+
+def preferred_style(user_preferences) -> str:
+    """Style used for the searches, from the user's preferences"""
+    return user_preferences.get("style", "casual") if isinstance(user_preferences, dict) else "casual"
+
+def search_stage_key(occasion: str, style: str, budget_range: str) -> str:
+    return make_cache_key("search-stage", normalize_text(occasion), normalize_text(style), normalize_text(budget_range))
+
+def prefetch_search_stage(user_preferences, occasion: str, budget_range: Optional[str]) -> None:
+    """Start the recommendation searches for an analysis request in the background.
+
+    The budget comes from the request or, as sent by the Inngest flow, the "budget"
+    preference; without one there is nothing to prefetch.
+    """
+    if not SEARCH_PREFETCH_ENABLED:
+        return
+    if not budget_range and isinstance(user_preferences, dict):
+        budget_range = user_preferences.get("budget")
+    if not occasion or not isinstance(budget_range, str) or not budget_range:
+        return
+    style = preferred_style(user_preferences)
+    search_prefetcher.start(search_stage_key(occasion, style, budget_range),
+                            lambda: run_search_stage(occasion, style, budget_range))
+
+async def take_prefetched_search(occasion: str, style: str, budget_range: str) -> Optional[tuple]:
+    """Results of a prefetched search stage, waiting for it if still running, or None"""
+    if not SEARCH_PREFETCH_ENABLED:
+        return None
+    task = search_prefetcher.get(search_stage_key(occasion, style, budget_range))
+    if task is None:
+        search_prefetch_lookups.inc(outcome="miss")
+        return None
+    search_prefetch_lookups.inc(outcome="done" if task.done() else "in_flight")
+    try:
+        # Shielded: several recommendations may share the prefetch, and one going away must not cancel it
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        logger.warning("Prefetched search failed, searching again", exc_info=True)
+        return None
+
+async def run_search_stage_for(user_preferences, occasion: str, budget_range: str, on_event=None) -> tuple:
+    """Run the search stage for a request's preferences; returns (trends, pricing, brands, search_data)"""
+    style = preferred_style(user_preferences)
+    logger.debug("Searching for fashion data", extra={"style": style, "occasion": occasion, "budget": budget_range})
+    
+    # Search for trends, pricing and brands concurrently, unless /analyze-photo already started them
+    search_results = await take_prefetched_search(occasion, style, budget_range)
+    if search_results is None:
+        search_results = await run_search_stage(occasion, style, budget_range)
+    trends_data, pricing_data, brands_data = search_results
+    search_data = {
+        "trends_found": len(trends_data.get("trends", [])),
+        "pricing_found": len(pricing_data.get("pricing", [])),
+        "brands_found": len(brands_data.get("brands", []))
+    }
+    if on_event:
+        await on_event("search_done", search_data)
+    return trends_data, pricing_data, brands_data, search_data
+
+def recommendation_bucket(request: OutfitRecommendationRequest, parsed_analysis: Optional[dict]) -> Optional[str]:
+    """Recommendation cache key for a request, or None if it should not use the cache"""
+    if not RECOMMENDATION_CACHE_ENABLED or request.bypass_cache:
+        return None
+    if parsed_analysis is None or parsed_analysis == FALLBACK_ANALYSIS:
+        return None
+    return analysis_fingerprint(parsed_analysis, request.user_preferences, request.occasion, request.budget_range)
+
+async def cached_recommendation(request: OutfitRecommendationRequest, parsed_analysis: dict, bucket: str,
+                                on_event=None) -> Optional[dict]:
+    """Serve a request from its bucket's cached recommendations, personalized, or return None"""
+    cached = recommendation_cache.get(bucket)
+    if cached is None:
+        recommendation_cache_lookups.inc(outcome="miss")
+        return None
+    entry, age, stale = cached
+    recommendation_cache_lookups.inc(outcome="stale" if stale else "fresh")
+    if stale:
+        recommendation_cache.refresh(bucket, lambda: refresh_recommendation(request, parsed_analysis))
+    cache_info = {"bucket": bucket[:16], "age_seconds": round(age, 1), "stale": stale}
+    if on_event:
+        await on_event("cache_hit", cache_info)
+    return {
+        "recommendations": personalize_recommendations(
+            entry["recommendations"], parsed_analysis, request.user_preferences),
+        "search_data": entry["search_data"],
+        "recommendation_cache": cache_info
+    }
+
+def is_upstream_result(result: dict) -> bool:
+    """Whether a pipeline result came from the models rather than a canned fallback response"""
+    return (result.get("analysis") != FALLBACK_ANALYSIS_RESPONSE
+            and result.get("recommendations") != FALLBACK_RECOMMENDATION_RESPONSE)
+
+def remember_recommendation(bucket: str, result: dict) -> None:
+    """Store an agent result for its bucket, unless it is the fallback response"""
+    if result["recommendations"] != FALLBACK_RECOMMENDATION_RESPONSE:
+        recommendation_cache.set(bucket, result["recommendations"], result["search_data"])
+
+async def refresh_recommendation(request: OutfitRecommendationRequest, parsed_analysis: dict) -> Optional[tuple]:
+    """Recompute a stale bucket from the request that found it stale"""
+    try:
+        search_results = await run_search_stage_for(request.user_preferences, request.occasion, request.budget_range)
+        result = await recommend_with_search(request, search_results, parsed_analysis=parsed_analysis)
+    except Exception:
+        logger.warning("Refreshing a cached recommendation failed", exc_info=True)
+        return None
+    if result["recommendations"] == FALLBACK_RECOMMENDATION_RESPONSE:
+        return None
+    return result["recommendations"], result["search_data"]
+
+async def perform_outfit_recommendation(request: OutfitRecommendationRequest, on_event=None) -> dict:
+    """Run the search stage and the outfit recommendation agent for a request"""
+    parsed_analysis = request.analysis_result
+    if isinstance(parsed_analysis, str):
+        parsed_analysis = parse_json_output(parsed_analysis, FashionAnalysis)
+    bucket = recommendation_bucket(request, parsed_analysis)
+    if bucket:
+        cached = await cached_recommendation(request, parsed_analysis, bucket, on_event)
+        if cached is not None:
+            return cached
+    
+    search_results = await run_search_stage_for(
+        request.user_preferences, request.occasion, request.budget_range, on_event)
+    result = await recommend_with_search(request, search_results, on_event=on_event, parsed_analysis=parsed_analysis)
+    if bucket:
+        remember_recommendation(bucket, result)
+    return result
+
+async def recommend_with_search(request: OutfitRecommendationRequest, search_results: tuple, on_event=None,
+                                parsed_analysis: Optional[dict] = None) -> dict:
+    """Run the outfit recommendation agent on the results of run_search_stage_for"""
+    trends_data, pricing_data, brands_data, search_data = search_results
+    
+    # Create detailed prompt for outfit recommendations, enhanced with search results
+    search_context = build_search_context(trends_data, pricing_data, brands_data)
+    user_prompt = build_recommendation_prompt(request, search_context, parsed_analysis=parsed_analysis)
+    result = {}
+    if PROMPT_COMPACTION_ENABLED and (debug_enabled(logger) or random.random() < PROMPT_SIZE_SAMPLE_RATE):
+        raw_prompt = build_recommendation_prompt(
+            request, build_search_context(trends_data, pricing_data, brands_data, compact=False), compact=False)
+        prompt_size = size_report(raw_prompt, user_prompt)
+        recommendation_prompt_tokens.observe(prompt_size["before_tokens_est"], form="raw")
+        recommendation_prompt_tokens.observe(prompt_size["after_tokens_est"], form="compact")
+        logger.debug("Compacted recommendation prompt", extra=prompt_size)
+        result["prompt_size"] = prompt_size
+    
+    # Run the outfit recommendation agent using ADK
+    recommendations = await run_agent_with_input(get_outfit_recommendation_agent(), user_prompt, on_event=on_event)
+    
+    return {
+        "recommendations": recommendations,
+        "search_data": search_data,
+        **result
+    }
+
+async def perform_style_session(request: StyleSessionRequest, on_event=None) -> dict:
+    """Analyze a photo and recommend outfits for it in one pass.
+
+    The searches only depend on occasion, style and budget, so they run while the
+    analysis agent works instead of after it. The analysis is parsed once and handed
+    to the recommendation stage in memory. Stage durations are returned as timings.
+    """
+    started = time.perf_counter()
+    timings = {}
+
+    async def timed(stage: str, work):
+        stage_started = time.perf_counter()
+        try:
+            return await work
+        finally:
+            elapsed = time.perf_counter() - stage_started
+            timings[f"{stage}_seconds"] = round(elapsed, 3)
+            style_session_stage_seconds.observe(elapsed, stage=stage)
+
+    search_task = asyncio.create_task(timed("search", run_search_stage_for(
+        request.user_preferences, request.occasion, request.budget_range, on_event)))
+    try:
+        analysis_request = FashionAnalysisRequest(
+            photo_url=request.photo_url,
+            user_preferences=request.user_preferences,
+            occasion=request.occasion,
+            constraints=request.constraints,
+            text_description=request.text_description
+        )
+        analysis = (await timed("analysis", perform_photo_analysis(analysis_request, on_event)))["analysis"]
+        if on_event:
+            await on_event("analysis_done", {"chars": len(analysis)})
+        parsed_analysis = parse_json_output(analysis, FashionAnalysis)
+        recommendation_request = OutfitRecommendationRequest(
+            analysis_result=analysis,
+            user_preferences=request.user_preferences,
+            occasion=request.occasion,
+            budget_range=request.budget_range,
+            bypass_cache=request.bypass_cache
+        )
+        bucket = recommendation_bucket(recommendation_request, parsed_analysis)
+        recommendation = None
+        if bucket:
+            recommendation = await cached_recommendation(recommendation_request, parsed_analysis, bucket, on_event)
+        if recommendation is None:
+            search_results = await timed("search_wait", search_task)
+    except BaseException:
+        search_task.cancel()
+        raise
+
+    if recommendation is not None:
+        search_task.cancel()
+    else:
+        recommendation = await timed("recommendation", recommend_with_search(
+            recommendation_request, search_results, on_event=on_event, parsed_analysis=parsed_analysis))
+        if bucket:
+            remember_recommendation(bucket, recommendation)
+    timings["total_seconds"] = round(time.perf_counter() - started, 3)
+    return {"analysis": analysis, **recommendation, "timings": timings}
+
+async def coalesced_style_session(request: StyleSessionRequest) -> dict:
+    """Run perform_style_session, sharing the result with identical concurrent requests"""
+    key = make_cache_key("style-session", request.model_dump())
+    return await request_coalescer.run(key, lambda: perform_style_session(request))
+
+def stream_pipeline(pipeline, response_model, legacy_text: bool = False):
+    """Run pipeline(on_event) in the background and stream its stage markers over SSE.
+
+    The last frame is either "result", carrying the pipeline result typed as
+    response_model (see typed_result), or "error".
+    """
+    async def frames():
+        queue = asyncio.Queue()
+
+        async def on_event(stage: str, data: dict):
+            await queue.put(sse_frame(stage, data))
+
+        async def run():
+            try:
+                result = await pipeline(on_event)
+                typed = typed_result(response_model, result, legacy_text)
+                await on_event("result", typed.model_dump(mode="json", exclude_none=True))
+            except Exception as e:
+                logger.exception("Error in streaming pipeline")
+                await on_event("error", {"detail": str(e)})
+            finally:
+                await queue.put(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                frame = await queue.get()
+                if frame is None:
+                    break
+                yield frame
+        finally:
+            # Stop the agent if the client disconnects mid-stream
+            task.cancel()
+
+    return sse_response(frames())
+
+@app.post("/analyze-photo", response_model=AnalysisResponse, response_model_exclude_none=True)
+async def analyze_photo(request: FashionAnalysisRequest, legacy_text: bool = False):
     """Analyze uploaded photo for fashion styling recommendations using Google ADK"""
     try:
         if not request.photo_url:
             return {"error": "No photo URL provided."}
         
-        # Create detailed prompt for fashion analysis
-        user_prompt = (
-            f"Please analyze this photo for fashion styling purposes.\n\n"
-            f"Photo URL: {request.photo_url}\n\n"
-            f"User Preferences: {request.user_preferences}\n"
-            f"Occasion: {request.occasion}\n"
-            f"Additional Constraints: {request.constraints or 'None'}\n"
-            f"Additional Context from User: {request.text_description or 'None'}\n\n"
-            f"Provide a comprehensive fashion analysis following the specified JSON format."
-        )
-        
+        prefetch_search_stage(request.user_preferences, request.occasion, request.budget_range)
         # Run the fashion analysis agent using ADK
-        analysis_result = await run_agent_with_input(fashion_analysis_agent, user_prompt)
-        
-        return {"analysis": analysis_result}
+        return agent_response(AnalysisResponse, await coalesced_photo_analysis(request), legacy_text)
     
     except Exception as e:
-        print(f"Error in photo analysis: {str(e)}", file=sys.stderr)
+        logger.exception("Error in photo analysis")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@app.post("/recommend-outfit")
-async def recommend_outfit(request: OutfitRecommendationRequest):
+@app.post("/analyze-photo/stream")
+async def analyze_photo_stream(request: FashionAnalysisRequest, legacy_text: bool = False):
+    """Streaming variant of /analyze-photo that sends stage markers and partial text over SSE"""
+    if not request.photo_url:
+        return {"error": "No photo URL provided."}
+    
+    prefetch_search_stage(request.user_preferences, request.occasion, request.budget_range)
+    return stream_pipeline(lambda on_event: perform_photo_analysis(request, on_event), AnalysisResponse, legacy_text)
+
+@app.post("/analyze-photo/batch")
+async def analyze_photo_batch(request: BatchPhotoAnalysisRequest, legacy_text: bool = False):
+    """Analyze many photos with shared preferences, streaming each result over SSE as it finishes"""
+    if not request.photo_urls:
+        return {"error": "No photo URLs provided."}
+    if len(request.photo_urls) > BATCH_MAX_PHOTOS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_PHOTOS} photos")
+    
+    prefetch_search_stage(request.user_preferences, request.occasion, None)
+    
+    async def analyze(photo_url: str) -> dict:
+        result = await coalesced_photo_analysis(FashionAnalysisRequest(
+            photo_url=photo_url,
+            user_preferences=request.user_preferences,
+            occasion=request.occasion,
+            constraints=request.constraints,
+            text_description=request.text_description
+        ))
+        return typed_result(AnalysisResponse, result, legacy_text).model_dump(mode="json", exclude_none=True)
+    
+    limit = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    return sse_response(stream_batch_frames(analyze, request.photo_urls, limit, key_name="photo_url"))
+
+@app.post("/recommend-outfit", response_model=RecommendationResponse, response_model_exclude_none=True)
+async def recommend_outfit(request: OutfitRecommendationRequest, legacy_text: bool = False):
     """Generate specific outfit recommendations based on analysis using Google ADK with Tavily search"""
     try:
         if not request.analysis_result:
             return {"error": "No analysis result provided."}
         
-        # Extract style and occasion for search
-        style = request.user_preferences.get("style", "casual") if isinstance(request.user_preferences, dict) else "casual"
-        occasion = request.occasion
-        budget_range = request.budget_range
-        
-        # Perform fashion searches to enhance recommendations
-        print(f"Searching for fashion data: style={style}, occasion={occasion}, budget={budget_range}", file=sys.stderr)
-        
-        # Search for current trends
-        trends_data = await search_fashion_trends(occasion, style)
-        
-        # Search for pricing information  
-        pricing_data = await search_clothing_prices("clothing", budget_range)
-        
-        # Search for brand recommendations
-        brands_data = await search_fashion_brands(budget_range, style)
-        
-        # Create enhanced prompt with search results
-        search_context = ""
-        if trends_data.get("success"):
-            trends_summary = "\n".join([f"- {trend.get('title', '')}: {trend.get('content', '')[:100]}..." 
-                                       for trend in trends_data.get("trends", [])])
-            search_context += f"\n\nCURRENT FASHION TRENDS:\n{trends_summary}"
-        
-        if pricing_data.get("success"):
-            pricing_summary = "\n".join([f"- {price.get('title', '')}: {price.get('content', '')[:100]}..." 
-                                        for price in pricing_data.get("pricing", [])])
-            search_context += f"\n\nPRICING INFORMATION:\n{pricing_summary}"
-        
-        if brands_data.get("success"):
-            brands_summary = "\n".join([f"- {brand.get('title', '')}: {brand.get('content', '')[:100]}..." 
-                                       for brand in brands_data.get("brands", [])])
-            search_context += f"\n\nRECOMMENDED BRANDS:\n{brands_summary}"
-        
-        # Create detailed prompt for outfit recommendations
-        user_prompt = (
-            f"Based on the following fashion analysis, create specific outfit recommendations:\n\n"
-            f"ANALYSIS RESULTS:\n{request.analysis_result}\n\n"
-            f"USER PREFERENCES: {request.user_preferences}\n"
-            f"OCCASION: {request.occasion}\n"
-            f"BUDGET RANGE: {request.budget_range}"
-            f"{search_context}\n\n"
-            f"Using the current trends, pricing information, and brand recommendations above, "
-            f"please provide 3 complete outfit recommendations following the specified JSON format. "
-            f"Include specific items, brands from the research above when relevant, styling tips, "
-            f"and an image generation prompt for visualizing the user in the recommended outfits. "
-            f"Incorporate the real-time fashion data to make recommendations more current and actionable."
-        )
-        
-        # Run the outfit recommendation agent using ADK
-        recommendations = await run_agent_with_input(outfit_recommendation_agent, user_prompt)
-        
-        return {
-            "recommendations": recommendations,
-            "search_data": {
-                "trends_found": len(trends_data.get("trends", [])),
-                "pricing_found": len(pricing_data.get("pricing", [])),
-                "brands_found": len(brands_data.get("brands", []))
-            }
-        }
+        return agent_response(RecommendationResponse, await coalesced_outfit_recommendation(request), legacy_text)
     
     except Exception as e:
-        print(f"Error in outfit recommendations: {str(e)}", file=sys.stderr)
+        logger.exception("Error in outfit recommendations")
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
 
+@app.post("/recommend-outfit/stream")
+async def recommend_outfit_stream(request: OutfitRecommendationRequest, legacy_text: bool = False):
+    """Streaming variant of /recommend-outfit that sends stage markers and partial text over SSE"""
+    if not request.analysis_result:
+        return {"error": "No analysis result provided."}
+    
+    return stream_pipeline(lambda on_event: perform_outfit_recommendation(request, on_event), RecommendationResponse, legacy_text)
+
+@app.post("/style-session", response_model=StyleSessionResponse, response_model_exclude_none=True)
+async def style_session(request: StyleSessionRequest, legacy_text: bool = False):
+    """Analyze a photo and recommend outfits in one request, searching while the analysis runs"""
+    try:
+        if not request.photo_url:
+            return {"error": "No photo URL provided."}
+        
+        return agent_response(StyleSessionResponse, await coalesced_style_session(request), legacy_text)
+    
+    except Exception as e:
+        logger.exception("Error in style session")
+        raise HTTPException(status_code=500, detail=f"Style session failed: {str(e)}")
+
+@app.post("/style-session/stream")
+async def style_session_stream(request: StyleSessionRequest, legacy_text: bool = False):
+    """Streaming variant of /style-session that sends stage markers and partial text over SSE"""
+    if not request.photo_url:
+        return {"error": "No photo URL provided."}
+    
+    return stream_pipeline(lambda on_event: perform_style_session(request, on_event), StyleSessionResponse, legacy_text)
+
+startup_timer.finish()
+
 # IMPORTANT: Handler for Vercel serverless functions
 # Vercel's Python runtime will automatically handle FastAPI apps
 # No additional configuration needed - just export the 'app' variable
\ No newline at end of file
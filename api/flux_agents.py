@@ -1,17 +1,126 @@
+from api._startup import StartupTimer
+
+startup_timer = StartupTimer("flux_agents")
+
 import os
-import replicate
+import asyncio
+import functools
+import hashlib
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+import httpx
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
 import json
+from api._cache import TTLCache, TieredCache, make_cache_key, normalize_text
+from api._jobs import (
+    JobQueue,
+    JobQueueFull,
+    MemoryJobStore,
+    SQLiteJobStore,
+    UnsafeWebhookURL,
+    check_public_url,
+    check_webhook_url,
+    public_job,
+)
+from api._logging import RequestContextMiddleware, get_logger
+from api._metrics import HTTPMetricsMiddleware, MetricsRegistry
+from api._resilience import RetryPolicy, circuit_breaker_stats, get_circuit_breaker, is_transient_error, resilient_call
+from api._responses import FastJSONResponse
+
+logger = get_logger("flux_agents")
+
+# Per-stage metrics, served on /metrics in Prometheus text format
+metrics = MetricsRegistry()
+replicate_run_seconds = metrics.histogram(
+    "replicate_run_seconds", "Duration of each replicate.run call", ("model", "outcome"))
+replicate_queue_seconds = metrics.histogram(
+    "replicate_queue_seconds", "Time a render waited for a free render worker")
+replicate_runs_in_flight = metrics.gauge(
+    "replicate_runs_in_flight", "Renders queued for or running on the render pool")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Resume jobs a previous process left queued in a persistent job store
+    render_jobs.start()
+    yield
+    await render_jobs.close()
+    if http_client is not None:
+        await http_client.aclose()
 
-app = FastAPI()
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+app.add_middleware(HTTPMetricsMiddleware, registry=metrics)
+app.add_middleware(RequestContextMiddleware)
 
 # Configuration
 REPLICATE_API_TOKEN = os.getenv("REPLICATE_API_TOKEN")
 if not REPLICATE_API_TOKEN:
     raise ValueError("REPLICATE_API_TOKEN environment variable is required")
 
+# Batch rendering configuration. replicate.run is blocking, so renders run on a bounded
+# pool; RENDER_MAX_CONCURRENCY caps parallel renders per batch, each with its own timeout.
+RENDER_MAX_CONCURRENCY = int(os.getenv("RENDER_MAX_CONCURRENCY", "3"))
+RENDER_TIMEOUT_SECONDS = float(os.getenv("RENDER_TIMEOUT_SECONDS", "120"))
+render_executor = ThreadPoolExecutor(
+    max_workers=int(os.getenv("RENDER_MAX_WORKERS", "8")),
+    thread_name_prefix="flux-render"
+)
+
+# Render cache keyed by the input photo's content hash plus the canonical prompt and
+# model parameters. Replicate delivery URLs expire after about an hour, so the TTL is
+# capped below RENDER_URL_MAX_AGE_SECONDS and hits are also checked against the age of
+# the render. RENDER_CACHE_PATH enables an on-disk SQLite tier (use /tmp on Vercel).
+FLUX_MODEL = "black-forest-labs/flux-kontext-max"
+RENDER_URL_MAX_AGE_SECONDS = 3300
+render_cache = TieredCache.create(
+    max_entries=int(os.getenv("RENDER_CACHE_MAX_ENTRIES", "256")),
+    ttl_seconds=min(float(os.getenv("RENDER_CACHE_TTL_SECONDS", "3000")), RENDER_URL_MAX_AGE_SECONDS),
+    disk_path=os.getenv("RENDER_CACHE_PATH") or None,
+    table="flux_render",
+)
+# Render resilience. Renders are paid and a blocking replicate.run cannot be cancelled, so
+# only explicit 429/5xx responses are retried (never timeouts) and renders are not hedged;
+# the circuit breaker stops sending renders while Replicate keeps failing.
+render_retry_policy = RetryPolicy(
+    max_attempts=int(os.getenv("RENDER_MAX_ATTEMPTS", "2")),
+    deadline_seconds=RENDER_TIMEOUT_SECONDS,
+    base_delay_seconds=float(os.getenv("RENDER_RETRY_BASE_DELAY_SECONDS", "1")),
+    max_delay_seconds=float(os.getenv("RENDER_RETRY_MAX_DELAY_SECONDS", "8")),
+)
+render_breaker = get_circuit_breaker(
+    f"replicate:{FLUX_MODEL}",
+    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+    reset_timeout_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+)
+
+def is_retryable_render_error(error: BaseException) -> bool:
+    if isinstance(error, (TimeoutError, httpx.TimeoutException)):
+        return False
+    return is_transient_error(error)
+
+@functools.lru_cache(maxsize=None)
+def get_replicate():
+    """Import the replicate client on first render rather than at module load"""
+    with startup_timer.measure("replicate"):
+        import replicate
+        return replicate
+
+# Photo hashes by URL, so a batch of renders for one photo downloads it only once. Photos
+# larger than PHOTO_FINGERPRINT_MAX_BYTES, on non-public hosts or behind a redirect are
+# not downloaded and are keyed by URL.
+PHOTO_FINGERPRINT_MAX_BYTES = int(os.getenv("PHOTO_FINGERPRINT_MAX_BYTES", str(15 * 1024 * 1024)))
+photo_fingerprint_cache = TTLCache(max_entries=256, ttl_seconds=600)
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared async HTTP client, creating it on first use"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(timeout=httpx.Timeout(10.0, connect=5.0), follow_redirects=False)
+    return http_client
+
 class OutfitVisualizationRequest(BaseModel):
     """Request model for outfit visualization generation"""
     user_photo_url: str
@@ -19,6 +128,7 @@ class OutfitVisualizationRequest(BaseModel):
     style_prompt: str
     background_setting: Optional[str] = "modern studio lighting"
     quality: Optional[str] = "high"
+    bypass_cache: Optional[bool] = False
 
 class GeneratedImageResponse(BaseModel):
     """Response model for generated images"""
@@ -29,7 +139,72 @@ class GeneratedImageResponse(BaseModel):
 @app.get("/ping")
 async def ping():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "flux-agents"}
+    return {"status": "healthy", "service": "flux-agents", "render_cache": render_cache.stats(),
+            "render_jobs": render_jobs.stats(), "circuit_breakers": circuit_breaker_stats(),
+            "startup": startup_timer.report()}
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and in-flight gauges in Prometheus text format"""
+    return metrics.response()
+
+def run_replicate(model_input: dict, submitted_at: float):
+    """Blocking replicate.run call for the render pool, timed separately from its queue wait"""
+    replicate_queue_seconds.observe(time.perf_counter() - submitted_at)
+    with replicate_run_seconds.time(model=FLUX_MODEL, outcome="ok"):
+        return get_replicate().run(FLUX_MODEL, input=model_input)
+
+async def photo_fingerprint(photo_url: str) -> str:
+    """Hash the input photo's bytes so re-uploads of the same image share cache entries.
+
+    Falls back to the URL itself if the photo cannot be downloaded, is over
+    PHOTO_FINGERPRINT_MAX_BYTES or is not on a public host.
+    """
+    fingerprint = photo_fingerprint_cache.get(photo_url)
+    if fingerprint is not None:
+        return fingerprint
+    try:
+        digest = hashlib.sha256()
+        await check_public_url(photo_url, "user_photo_url")
+        async with get_http_client().stream("GET", photo_url) as response:
+            response.raise_for_status()
+            content_length = response.headers.get("content-length")
+            if content_length and content_length.isdigit() and int(content_length) > PHOTO_FINGERPRINT_MAX_BYTES:
+                raise ValueError(f"Photo is {content_length} bytes, limit is {PHOTO_FINGERPRINT_MAX_BYTES}")
+            size = 0
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > PHOTO_FINGERPRINT_MAX_BYTES:
+                    raise ValueError(f"Photo exceeds the {PHOTO_FINGERPRINT_MAX_BYTES} byte limit")
+                digest.update(chunk)
+        fingerprint = f"sha256:{digest.hexdigest()}"
+        photo_fingerprint_cache.set(photo_url, fingerprint)
+        return fingerprint
+    except Exception as e:
+        logger.info("Could not hash input photo, keying render cache by URL: %s", e)
+        return f"url:{photo_url}"
+
+async def run_replicate_in_pool(model_input: dict, render_slot: Optional[asyncio.Semaphore] = None):
+    """Run a render on the render pool.
+
+    With render_slot, the slot is held until the blocking replicate.run returns, even if
+    the caller stops waiting: a timeout cannot stop a render that is already running.
+    """
+    if render_slot is not None:
+        await render_slot.acquire()
+    try:
+        future = asyncio.get_running_loop().run_in_executor(
+            render_executor,
+            functools.partial(run_replicate, model_input, time.perf_counter())
+        )
+    except BaseException:
+        if render_slot is not None:
+            render_slot.release()
+        raise
+    if render_slot is None:
+        return await future
+    future.add_done_callback(lambda _: render_slot.release())
+    return await asyncio.shield(future)
 
 @app.post("/generate-outfit-visualization")
 async def generate_outfit_visualization(request: OutfitVisualizationRequest):
@@ -37,6 +212,11 @@ async def generate_outfit_visualization(request: OutfitVisualizationRequest):
     Generate outfit visualization using FLUX.1 Kontext via Replicate
     Takes user photo and outfit description, returns image of user wearing the outfit
     """
+    return await render_visualization(request)
+
+async def render_visualization(request: OutfitVisualizationRequest,
+                               render_slot: Optional[asyncio.Semaphore] = None) -> dict:
+    """Render (or fetch from the cache) one visualization; see run_replicate_in_pool for render_slot"""
     try:
         # Construct the prompt specifically for outfit editing (NOT person generation)
         prompt = f"""Edit only the clothing in this image. Replace the current outfit with: {request.outfit_description}. 
@@ -45,92 +225,155 @@ async def generate_outfit_visualization(request: OutfitVisualizationRequest):
         Style: {request.style_prompt}. Keep original photo quality and lighting."""
         
         # Generate image using FLUX.1 Kontext via Replicate with enhanced quality parameters
-        output = replicate.run(
-            "black-forest-labs/flux-kontext-max",
-            input={
-                "prompt": prompt,
-                "input_image": request.user_photo_url,
-                "aspect_ratio": "3:4",
-                "output_format": "jpg",
-                "output_quality": 95,
-                "safety_tolerance": 2,
-                "prompt_upsampling": True,  # Enable for better detail generation
-                "guidance_scale": 3.5,  # Optimized for detail preservation
-                "num_inference_steps": 50  # Increased steps for higher quality
-            }
-        )
+        model_input = {
+            "prompt": prompt,
+            "input_image": request.user_photo_url,
+            "aspect_ratio": "3:4",
+            "output_format": "jpg",
+            "output_quality": 95,
+            "safety_tolerance": 2,
+            "prompt_upsampling": True,  # Enable for better detail generation
+            "guidance_scale": 3.5,  # Optimized for detail preservation
+            "num_inference_steps": 50  # Increased steps for higher quality
+        }
+        cache_key = None
+        if not request.bypass_cache:
+            cache_params = {key: value for key, value in model_input.items() if key not in ("prompt", "input_image")}
+            cache_key = make_cache_key(
+                FLUX_MODEL,
+                await photo_fingerprint(request.user_photo_url),
+                normalize_text(prompt),
+                quality=request.quality,
+                **cache_params
+            )
+            cached = render_cache.get(cache_key)
+            if cached is not None and time.time() - cached.get("rendered_at", 0) < RENDER_URL_MAX_AGE_SECONDS:
+                return {
+                    "success": True,
+                    "cached": True,
+                    "visualization": GeneratedImageResponse(**cached)
+                }
+        
+        with replicate_runs_in_flight.track():
+            output = await resilient_call(
+                lambda: run_replicate_in_pool(model_input, render_slot),
+                render_retry_policy,
+                breaker=render_breaker,
+                is_retryable=is_retryable_render_error
+            )
         
         if not output:
             raise HTTPException(status_code=500, detail="Failed to generate outfit visualization")
             
         # Replicate returns the image URL directly
         image_url = output if isinstance(output, str) else output[0]
+        visualization = GeneratedImageResponse(
+            image_url=str(image_url),
+            width=1024,  # Enhanced output size for 3:4 aspect ratio
+            height=1536
+        )
+        if cache_key:
+            render_cache.set(cache_key, {**visualization.model_dump(), "rendered_at": time.time()})
         
         return {
             "success": True,
-            "visualization": GeneratedImageResponse(
-                image_url=image_url,
-                width=1024,  # Enhanced output size for 3:4 aspect ratio
-                height=1536
-            )
+            "cached": False,
+            "visualization": visualization
         }
         
     except Exception as e:
-        print(f"[Flux] Error generating outfit visualization: {str(e)}")
+        logger.warning("Error generating outfit visualization: %s", e)
         raise HTTPException(
             status_code=500, 
             detail=f"Failed to generate outfit visualization: {str(e)}"
         )
 
+def build_outfit_description(outfit: dict) -> str:
+    """Create a short clothing description from an outfit recommendation"""
+    outfit_items = outfit.get('items', {})
+    top_item = outfit_items.get('top', {})
+    bottom_item = outfit_items.get('bottom', {})
+    shoes_item = outfit_items.get('shoes', {})
+    
+    return f"""
+    {top_item.get('item', 'shirt')} in {top_item.get('color', 'neutral')} color,
+    {bottom_item.get('item', 'pants')} in {bottom_item.get('color', 'neutral')} color,
+    {shoes_item.get('item', 'shoes')} in {shoes_item.get('color', 'neutral')} color
+    """.strip()
+
+async def render_outfit_isolated(
+    index: int,
+    outfit: dict,
+    visualization_request: OutfitVisualizationRequest,
+    semaphore: asyncio.Semaphore,
+    timeout_seconds: float
+) -> dict:
+    """Render one outfit of a batch, turning failures and timeouts into an error entry.
+
+    semaphore is taken per render and held until the render actually finishes, so
+    renders that outlive the timeout still count against the batch's limit.
+    """
+    outfit_name = outfit.get('name', f'Outfit {index+1}')
+    try:
+        result = await asyncio.wait_for(
+            render_visualization(visualization_request, render_slot=semaphore),
+            timeout=timeout_seconds
+        )
+        return {
+            "outfit_index": index,
+            "outfit_name": outfit_name,
+            "visualization": result['visualization'],
+            "outfit_data": outfit
+        }
+    except Exception as e:
+        error = f"Timed out after {timeout_seconds}s" if isinstance(e, asyncio.TimeoutError) else str(e)
+        logger.warning("Failed to generate visualization for outfit %s: %s", index + 1, error,
+                       extra={"outfit_index": index})
+        # Continue with other outfits even if one fails
+        return {
+            "outfit_index": index,
+            "outfit_name": outfit_name,
+            "error": error,
+            "outfit_data": outfit
+        }
+
 @app.post("/generate-multiple-outfits")
 async def generate_multiple_outfits(
     user_photo_url: str,
     outfits: List[dict],
     style_prompt: str = "high fashion photography",
-    background: str = "modern studio"
+    background: str = "modern studio",
+    max_parallel: int = RENDER_MAX_CONCURRENCY,
+    timeout_seconds: float = RENDER_TIMEOUT_SECONDS,
+    bypass_cache: bool = False
 ):
     """
     Generate multiple outfit visualizations from a list of outfit recommendations
+    Renders run concurrently (up to max_parallel at a time, at most RENDER_MAX_CONCURRENCY)
+    and are returned in completion order
     """
     try:
-        generated_visualizations = []
-        
-        for i, outfit in enumerate(outfits):
-            # Create outfit description from the outfit data
-            outfit_items = outfit.get('items', {})
-            top_item = outfit_items.get('top', {})
-            bottom_item = outfit_items.get('bottom', {})
-            shoes_item = outfit_items.get('shoes', {})
-            
-            outfit_description = f"""
-            {top_item.get('item', 'shirt')} in {top_item.get('color', 'neutral')} color,
-            {bottom_item.get('item', 'pants')} in {bottom_item.get('color', 'neutral')} color,
-            {shoes_item.get('item', 'shoes')} in {shoes_item.get('color', 'neutral')} color
-            """.strip()
-            
-            # Generate visualization for this outfit
-            visualization_request = OutfitVisualizationRequest(
-                user_photo_url=user_photo_url,
-                outfit_description=outfit_description,
-                style_prompt=style_prompt,
-                background_setting=background
+        semaphore = asyncio.Semaphore(min(max(1, max_parallel), RENDER_MAX_CONCURRENCY))
+        renders = [
+            render_outfit_isolated(
+                i,
+                outfit,
+                OutfitVisualizationRequest(
+                    user_photo_url=user_photo_url,
+                    outfit_description=build_outfit_description(outfit),
+                    style_prompt=style_prompt,
+                    background_setting=background,
+                    bypass_cache=bypass_cache
+                ),
+                semaphore,
+                timeout_seconds
             )
-            
-            try:
-                result = await generate_outfit_visualization(visualization_request)
-                generated_visualizations.append({
-                    "outfit_name": outfit.get('name', f'Outfit {i+1}'),
-                    "visualization": result['visualization'],
-                    "outfit_data": outfit
-                })
-            except Exception as e:
-                print(f"[Flux] Failed to generate visualization for outfit {i+1}: {str(e)}")
-                # Continue with other outfits even if one fails
-                generated_visualizations.append({
-                    "outfit_name": outfit.get('name', f'Outfit {i+1}'),
-                    "error": str(e),
-                    "outfit_data": outfit
-                })
+            for i, outfit in enumerate(outfits)
+        ]
+        
+        generated_visualizations = []
+        for completed in asyncio.as_completed(renders):
+            generated_visualizations.append(await completed)
         
         return {
             "success": True,
@@ -139,12 +382,130 @@ async def generate_multiple_outfits(
         }
         
     except Exception as e:
-        print(f"[Flux] Error in batch outfit generation: {str(e)}")
+        logger.exception("Error in batch outfit generation")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to generate outfit visualizations: {str(e)}"
         )
 
+# Render job queue. POST /jobs and /jobs/batch return job IDs right away instead of holding
+# the request open for the render; GET /jobs/{id} (or /jobs?ids=a,b) collects the results.
+# RENDER_JOB_WORKERS renders run at a time, previews ahead of full-quality renders, and a
+# webhook_url is called when a job finishes; it must resolve to a public address unless
+# RENDER_JOB_WEBHOOK_ALLOW_PRIVATE is set (local development). RENDER_JOB_STORE_PATH keeps
+# job state in SQLite (use /tmp on Vercel) instead of memory.
+RENDER_JOB_PRIORITIES = {"draft": 0, "preview": 0, "low": 0, "standard": 1, "medium": 1, "high": 2}
+RENDER_JOB_TTL_SECONDS = float(os.getenv("RENDER_JOB_TTL_SECONDS", "86400"))
+RENDER_JOB_WEBHOOK_ALLOW_PRIVATE = os.getenv("RENDER_JOB_WEBHOOK_ALLOW_PRIVATE", "false").lower() == "true"
+
+class RenderJobRequest(OutfitVisualizationRequest):
+    """Request model for a queued outfit visualization"""
+    webhook_url: Optional[str] = None
+
+class RenderBatchJobRequest(BaseModel):
+    """Request model for queueing a visualization of each outfit in a recommendation set"""
+    user_photo_url: str
+    outfits: List[dict]
+    style_prompt: str = "high fashion photography"
+    background: str = "modern studio"
+    quality: Optional[str] = "high"
+    bypass_cache: bool = False
+    webhook_url: Optional[str] = None
+
+def render_job_priority(quality: Optional[str]) -> int:
+    """Queue priority for a render (lower runs first): quick previews before full-quality renders"""
+    return RENDER_JOB_PRIORITIES.get(normalize_text(quality or ""), 1)
+
+async def run_render_job(job: dict) -> dict:
+    """Render a queued visualization, returning the job's result"""
+    request = OutfitVisualizationRequest(**job["payload"])
+    try:
+        result = await asyncio.wait_for(generate_outfit_visualization(request), timeout=RENDER_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        raise TimeoutError(f"Timed out after {RENDER_TIMEOUT_SECONDS}s")
+    except HTTPException as e:
+        raise RuntimeError(e.detail) from e
+    return {"cached": result["cached"], "visualization": result["visualization"].model_dump()}
+
+def create_render_job_store():
+    store_path = os.getenv("RENDER_JOB_STORE_PATH")
+    if store_path:
+        return SQLiteJobStore(store_path, ttl_seconds=RENDER_JOB_TTL_SECONDS, table="render_jobs")
+    return MemoryJobStore(ttl_seconds=RENDER_JOB_TTL_SECONDS)
+
+render_jobs = JobQueue(
+    create_render_job_store(),
+    run_render_job,
+    workers=int(os.getenv("RENDER_JOB_WORKERS", str(RENDER_MAX_CONCURRENCY))),
+    max_queued=int(os.getenv("RENDER_JOB_MAX_QUEUED", "200")),
+    allow_private_webhooks=RENDER_JOB_WEBHOOK_ALLOW_PRIVATE
+)
+
+async def check_render_webhook(webhook_url: Optional[str]) -> None:
+    """Reject webhook URLs the service must not call (non-http, private or internal hosts)"""
+    if webhook_url and not RENDER_JOB_WEBHOOK_ALLOW_PRIVATE:
+        try:
+            await check_webhook_url(webhook_url)
+        except UnsafeWebhookURL as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+def submit_render_job(request: OutfitVisualizationRequest, webhook_url: Optional[str], meta: Optional[dict] = None) -> dict:
+    if webhook_url and not webhook_url.startswith(("https://", "http://")):
+        raise HTTPException(status_code=400, detail="webhook_url must be an http(s) URL")
+    try:
+        job = render_jobs.submit("outfit_visualization", request.model_dump(),
+                                 priority=render_job_priority(request.quality), meta=meta, webhook_url=webhook_url)
+    except JobQueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Render queue is full: {e}")
+    return {"job_id": job["id"], "status": job["status"], "priority": job["priority"], **(meta or {})}
+
+@app.post("/jobs", status_code=202)
+async def submit_visualization_job(request: RenderJobRequest):
+    """Queue an outfit visualization and return its job ID without waiting for the render"""
+    await check_render_webhook(request.webhook_url)
+    visualization_request = OutfitVisualizationRequest(**request.model_dump(exclude={"webhook_url"}))
+    return submit_render_job(visualization_request, request.webhook_url)
+
+@app.post("/jobs/batch", status_code=202)
+async def submit_visualization_batch(request: RenderBatchJobRequest):
+    """Queue a visualization for every outfit at once and return one job ID per outfit"""
+    await check_render_webhook(request.webhook_url)
+    jobs = [
+        submit_render_job(
+            OutfitVisualizationRequest(
+                user_photo_url=request.user_photo_url,
+                outfit_description=build_outfit_description(outfit),
+                style_prompt=request.style_prompt,
+                background_setting=request.background,
+                quality=request.quality,
+                bypass_cache=request.bypass_cache
+            ),
+            request.webhook_url,
+            meta={"outfit_index": i, "outfit_name": outfit.get("name", f"Outfit {i+1}")}
+        )
+        for i, outfit in enumerate(request.outfits)
+    ]
+    return {"success": True, "jobs": jobs}
+
+@app.get("/jobs/{job_id}")
+async def get_visualization_job(job_id: str):
+    """Status of a queued visualization, with its result once it has succeeded"""
+    job = render_jobs.store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found or expired")
+    return public_job(job)
+
+@app.get("/jobs")
+async def get_visualization_jobs(ids: str):
+    """Status of several queued visualizations at once, from a comma-separated list of job IDs"""
+    jobs = []
+    for job_id in filter(None, (part.strip() for part in ids.split(","))):
+        job = render_jobs.store.get(job_id)
+        jobs.append(public_job(job) if job is not None else {"id": job_id, "status": "not_found"})
+    return {"jobs": jobs, "pending": sum(job["status"] in ("queued", "running") for job in jobs)}
+
+startup_timer.finish()
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8001)
\ No newline at end of file
@@ -1,15 +1,35 @@
+from api._startup import StartupTimer
+
+startup_timer = StartupTimer("gemini_agents")
+
 import os
 import sys
 import json
 import base64
+import asyncio
+import functools
+import hashlib
 from io import BytesIO
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
-from typing import Optional
-import google.generativeai as genai
-from PIL import Image
-import requests
+from typing import List, Optional, Union
+import httpx
 from dotenv import load_dotenv
+from api._cache import TTLCache, make_cache_key
+from api._json_output import parse_model_output
+from api._logging import RequestContextMiddleware, get_logger
+from api._metrics import HTTPMetricsMiddleware, MetricsRegistry
+from api._phash import PerceptualHashIndex, dhash
+from api._prompt_budget import COLOR_LISTS, compact_model_json, drop_empty, fit_json_to_budget
+from api._resilience import LatencyTracker, RetryPolicy, circuit_breaker_stats, get_circuit_breaker, resilient_call
+from api._responses import FastJSONResponse, model_response
+from api._streaming import sse_response, stream_batch_frames
+
+# google.generativeai and PIL are imported on first use rather than at module load,
+# so /ping and cold starts don't pay for them
+
+logger = get_logger("gemini_agents")
 
 # Load environment variables
 load_dotenv()
@@ -17,10 +37,148 @@ load_dotenv()
 # Configure Gemini
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
 if not GOOGLE_API_KEY:
-    print("GOOGLE_API_KEY not found in environment variables", file=sys.stderr)
+    logger.error("GOOGLE_API_KEY not found in environment variables")
     raise ValueError("GOOGLE_API_KEY must be set")
 
-genai.configure(api_key=GOOGLE_API_KEY)
+# Model handles are built once, on first use, and shared. Generation uses the async API,
+# with at most GEMINI_MAX_CONCURRENCY calls in flight per process.
+GEMINI_MODEL_NAME = "gemini-2.5-flash"
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "32"))
+gemini_semaphore = asyncio.Semaphore(GEMINI_MAX_CONCURRENCY)
+
+# Generation resilience: transient failures (429/5xx, timeouts) are retried with jittered
+# backoff inside a total GEMINI_DEADLINE_SECONDS budget, and a circuit breaker fails
+# calls fast while the model keeps failing. GEMINI_HEDGE_PERCENTILE (e.g. 0.95) starts a
+# second request once the first runs slower than that percentile of recent calls.
+gemini_retry_policy = RetryPolicy(
+    max_attempts=int(os.getenv("GEMINI_MAX_ATTEMPTS", "3")),
+    deadline_seconds=float(os.getenv("GEMINI_DEADLINE_SECONDS", "90")),
+    attempt_timeout_seconds=float(os.getenv("GEMINI_ATTEMPT_TIMEOUT_SECONDS", "60")),
+    base_delay_seconds=float(os.getenv("GEMINI_RETRY_BASE_DELAY_SECONDS", "0.5")),
+    max_delay_seconds=float(os.getenv("GEMINI_RETRY_MAX_DELAY_SECONDS", "4")),
+    hedge_percentile=float(os.getenv("GEMINI_HEDGE_PERCENTILE", "0")) or None,
+)
+gemini_breaker = get_circuit_breaker(
+    f"gemini:{GEMINI_MODEL_NAME}",
+    failure_threshold=int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+    reset_timeout_seconds=float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+)
+gemini_latency = LatencyTracker()
+
+# Per-stage metrics, served on /metrics in Prometheus text format
+metrics = MetricsRegistry()
+gemini_generate_seconds = metrics.histogram(
+    "gemini_generate_seconds", "Latency of each Gemini generate_content call", ("outcome",))
+gemini_generations_in_flight = metrics.gauge(
+    "gemini_generations_in_flight", "Gemini generations running or waiting for the concurrency cap")
+image_load_seconds = metrics.histogram(
+    "image_load_seconds", "Time to download and prepare a photo for Gemini", ("outcome", "cache"))
+image_decode_seconds = metrics.histogram(
+    "image_decode_seconds", "Time to decode, resize and re-encode a photo")
+photo_dedupe_lookups = metrics.counter(
+    "photo_dedupe_lookups", "Analyses looked up by perceptual photo hash, by outcome", ("outcome",))
+
+@functools.lru_cache(maxsize=None)
+def get_gemini_model():
+    """Import and configure google.generativeai and build the shared model handle"""
+    with startup_timer.measure("gemini_model"):
+        import google.generativeai as genai
+        genai.configure(api_key=GOOGLE_API_KEY)
+        return genai.GenerativeModel(GEMINI_MODEL_NAME)
+
+# With structured output enabled the response schemas below are sent as the model's
+# response_schema, so the reply is plain JSON that validates in a single parse.
+STRUCTURED_OUTPUT_ENABLED = os.getenv("STRUCTURED_OUTPUT_ENABLED", "true").lower() == "true"
+
+async def generate_with_gemini(contents, response_schema=None):
+    """Run an async Gemini generation under the shared concurrency cap and retry policy"""
+    gemini_model = get_gemini_model()
+    generation_config = None
+    if response_schema is not None and STRUCTURED_OUTPUT_ENABLED:
+        import google.generativeai as genai
+        generation_config = genai.GenerationConfig(
+            response_mime_type="application/json",
+            response_schema=response_schema
+        )
+    async def attempt():
+        async with gemini_semaphore:
+            return await gemini_model.generate_content_async(contents, generation_config=generation_config)
+
+    def record_attempt(attempt_number, seconds, error, hedged):
+        gemini_generate_seconds.observe(seconds, outcome="ok" if error is None else "error")
+        if error is not None:
+            logger.warning("Gemini attempt %s failed: %s", attempt_number, error, extra={"attempt": attempt_number})
+
+    with gemini_generations_in_flight.track():
+        return await resilient_call(attempt, gemini_retry_policy, breaker=gemini_breaker,
+                                    latency=gemini_latency, on_attempt=record_attempt)
+
+# Image download limits. Photos are streamed through a shared connection pool and the
+# download is aborted as soon as it is clearly not an image or exceeds IMAGE_MAX_BYTES.
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(15 * 1024 * 1024)))
+IMAGE_CONNECT_TIMEOUT_SECONDS = float(os.getenv("IMAGE_CONNECT_TIMEOUT_SECONDS", "5"))
+IMAGE_READ_TIMEOUT_SECONDS = float(os.getenv("IMAGE_READ_TIMEOUT_SECONDS", "15"))
+
+# Preprocessing applied before photos are sent to Gemini: orientation fix, downscale to
+# IMAGE_MAX_EDGE on the long side, metadata stripped, compact re-encode. Results are
+# cached by content hash so retries of the same photo skip the decode work.
+IMAGE_MAX_EDGE = int(os.getenv("IMAGE_MAX_EDGE", "1024"))
+IMAGE_OUTPUT_FORMAT = os.getenv("IMAGE_OUTPUT_FORMAT", "JPEG").upper()
+IMAGE_OUTPUT_QUALITY = int(os.getenv("IMAGE_OUTPUT_QUALITY", "85"))
+prepared_image_cache = TTLCache(
+    max_entries=int(os.getenv("PREPARED_IMAGE_CACHE_ENTRIES", "64")),
+    ttl_seconds=float(os.getenv("PREPARED_IMAGE_CACHE_TTL_SECONDS", "3600")),
+)
+
+# Near-duplicate photo dedupe, off by default. Each analyzed photo's perceptual hash is
+# indexed with its analysis and the request context (user_id, preferences, occasion,
+# constraints) it was made for; a re-upload within PHOTO_DEDUPE_MAX_DISTANCE bits
+# (recompressed, resized, lightly cropped) with the same context reuses that analysis
+# instead of calling Gemini. Photos of different people can hash that close (similar pose
+# against a plain background), so reuse is scoped to one user: requests without a
+# user_id are never deduplicated. Enabling it means a user may get back the analysis of
+# their own earlier, near-identical photo rather than a fresh one.
+PHOTO_DEDUPE_ENABLED = os.getenv("PHOTO_DEDUPE_ENABLED", "false").lower() == "true"
+analysis_index = PerceptualHashIndex(
+    max_distance=int(os.getenv("PHOTO_DEDUPE_MAX_DISTANCE", "6")),
+    max_entries=int(os.getenv("PHOTO_DEDUPE_MAX_ENTRIES", "2048")),
+    ttl_seconds=float(os.getenv("PHOTO_DEDUPE_TTL_SECONDS", "86400")),
+)
+
+# Batch photo analysis limits
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+BATCH_MAX_PHOTOS = int(os.getenv("BATCH_MAX_PHOTOS", "50"))
+
+# The analysis is fed back into the recommendation prompt as compact canonical JSON.
+# GeminiFashionAnalysis has about twice the fields of the ADK schema (a full analysis is
+# ~450-550 tokens compact), so it has its own, larger budget.
+PROMPT_COMPACTION_ENABLED = os.getenv("PROMPT_COMPACTION_ENABLED", "true").lower() == "true"
+PROMPT_ANALYSIS_TOKEN_BUDGET = int(os.getenv("GEMINI_PROMPT_ANALYSIS_TOKEN_BUDGET", "800"))
+PROMPT_PREFERENCES_TOKEN_BUDGET = int(os.getenv("PROMPT_PREFERENCES_TOKEN_BUDGET", "80"))
+
+http_client: Optional[httpx.AsyncClient] = None
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the shared async HTTP client, creating it on first use"""
+    global http_client
+    if http_client is None or http_client.is_closed:
+        http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=IMAGE_CONNECT_TIMEOUT_SECONDS,
+                read=IMAGE_READ_TIMEOUT_SECONDS,
+                write=IMAGE_READ_TIMEOUT_SECONDS,
+                pool=IMAGE_CONNECT_TIMEOUT_SECONDS,
+            ),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+            follow_redirects=True,
+        )
+    return http_client
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    if http_client is not None:
+        await http_client.aclose()
 
 # Define request schemas for fashion analysis
 class GeminiFashionAnalysisRequest(BaseModel):
@@ -28,15 +186,118 @@ class GeminiFashionAnalysisRequest(BaseModel):
     user_preferences: dict
     occasion: str
     constraints: Optional[str] = None
+    user_id: Optional[str] = None
+    bypass_cache: Optional[bool] = False
+
+class GeminiBatchPhotoAnalysisRequest(BaseModel):
+    photo_urls: List[str]
+    user_preferences: dict
+    occasion: str
+    constraints: Optional[str] = None
+    user_id: Optional[str] = None
+    max_concurrency: Optional[int] = None
 
 class GeminiOutfitRecommendationRequest(BaseModel):
-    analysis_result: str
+    analysis_result: Union[str, dict]
     user_preferences: dict
     occasion: str
     budget_range: str
 
+# Response schemas, mirroring the JSON formats in the analysis and recommendation prompts
+class GeminiBodyAnalysis(BaseModel):
+    body_type: str
+    key_features: List[str]
+    proportions: str
+    posture_notes: str
+
+class GeminiColorAnalysis(BaseModel):
+    skin_undertone: str
+    complexion_notes: str
+    best_colors: List[str]
+    colors_to_avoid: List[str]
+    hair_color: str
+    eye_color: str
+
+class GeminiCurrentStyleAnalysis(BaseModel):
+    current_outfit: str
+    fit_assessment: str
+    style_category: str
+    strengths: List[str]
+    improvement_areas: List[str]
+
+class GeminiBodyProportionAdvice(BaseModel):
+    silhouettes_to_emphasize: List[str]
+    areas_to_highlight: List[str]
+    styling_techniques: List[str]
+
+class GeminiOccasionSuitability(BaseModel):
+    current_appropriateness: str
+    needed_adjustments: List[str]
+
+class GeminiFashionAnalysis(BaseModel):
+    body_analysis: GeminiBodyAnalysis
+    color_analysis: GeminiColorAnalysis
+    current_style_analysis: GeminiCurrentStyleAnalysis
+    body_proportion_advice: GeminiBodyProportionAdvice
+    occasion_suitability: GeminiOccasionSuitability
+    recommendations_summary: str
+
+class GeminiOutfitPiece(BaseModel):
+    item: str
+    color: str
+    style_details: str
+    why: str
+
+class GeminiOutfitAccessory(BaseModel):
+    item: str
+    color: str
+    why: str
+
+class GeminiOutfitItems(BaseModel):
+    top: GeminiOutfitPiece
+    bottom: GeminiOutfitPiece
+    shoes: GeminiOutfitPiece
+    outerwear: GeminiOutfitPiece
+    accessories: List[GeminiOutfitAccessory]
+
+class GeminiOutfitRecommendation(BaseModel):
+    name: str
+    description: str
+    style_category: str
+    items: GeminiOutfitItems
+    styling_tips: List[str]
+    fit_notes: List[str]
+    budget_estimate: str
+    occasion_appropriateness: str
+    shopping_suggestions: List[str]
+
+class GeminiOutfitRecommendations(BaseModel):
+    outfit_recommendations: List[GeminiOutfitRecommendation]
+    general_styling_principles: List[str]
+    seasonal_considerations: str
+    care_and_maintenance: List[str]
+    image_generation_prompt: str
+
+# Endpoint responses. Model output is returned as a structured object when it matches its
+# schema, or as the raw model text when it does not; ?legacy_text=true also includes the
+# JSON text the endpoints used to return, for clients that still parse it themselves.
+class GeminiAnalysisResponse(BaseModel):
+    analysis: Union[GeminiFashionAnalysis, str]
+    analysis_text: Optional[str] = None
+    reused_analysis: Optional[dict] = None
+
+class GeminiRecommendationResponse(BaseModel):
+    recommendations: Union[GeminiOutfitRecommendations, str]
+    recommendations_text: Optional[str] = None
+
+def output_text(value) -> str:
+    return value if isinstance(value, str) else value.model_dump_json()
+
 # Initialize FastAPI app
-app = FastAPI(title="Gemini Fashion Agents", root_path="/api/gemini")
+app = FastAPI(title="Gemini Fashion Agents", root_path="/api/gemini", lifespan=lifespan,
+              default_response_class=FastJSONResponse)
+app.add_middleware(HTTPMetricsMiddleware, registry=metrics)
+app.add_middleware(RequestContextMiddleware)
 
 @app.get("/ping")
 async def health_check():
@@ -45,113 +306,263 @@ async def health_check():
         "status": "ok",
         "service": "Gemini Fashion Agents",
         "google_api_key_set": bool(GOOGLE_API_KEY),
+        "model": GEMINI_MODEL_NAME,
+        "max_concurrent_generations": GEMINI_MAX_CONCURRENCY,
+        "circuit_breakers": circuit_breaker_stats(),
+        "photo_dedupe": analysis_index.stats() if PHOTO_DEDUPE_ENABLED else None,
+        "startup": startup_timer.report(),
         "python_version": sys.version,
     }
 
-def load_image_from_url(image_url: str) -> Image.Image:
-    """Load image from URL for Gemini processing"""
-    try:
-        response = requests.get(image_url)
+@app.get("/metrics")
+async def metrics_endpoint():
+    """Per-stage latency histograms and in-flight gauges in Prometheus text format"""
+    return metrics.response()
+
+# Leading bytes of the image formats we accept. HEIC and AVIF are not accepted: Pillow
+# cannot decode them without a plugin, so they are rejected before the full download.
+IMAGE_SIGNATURES = (
+    b"\xff\xd8\xff",          # JPEG
+    b"\x89PNG\r\n\x1a\n",     # PNG
+    b"GIF87a",
+    b"GIF89a",
+)
+
+def looks_like_image(header: bytes) -> bool:
+    """Sniff the first bytes of a download to check it is a supported image format"""
+    if header.startswith(IMAGE_SIGNATURES):
+        return True
+    # WebP: RIFF....WEBP
+    return header[:4] == b"RIFF" and header[8:12] == b"WEBP"
+
+async def fetch_image_bytes(image_url: str, max_bytes: int = IMAGE_MAX_BYTES) -> bytes:
+    """Stream an image download, rejecting non-images and oversized bodies early"""
+    async with get_http_client().stream("GET", image_url) as response:
         response.raise_for_status()
-        return Image.open(BytesIO(response.content))
+        
+        content_type = response.headers.get("content-type", "")
+        if content_type and not content_type.startswith(("image/", "application/octet-stream", "binary/octet-stream")):
+            raise ValueError(f"URL did not return an image (content-type: {content_type})")
+        
+        content_length = response.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+            raise ValueError(f"Image is {content_length} bytes, limit is {max_bytes}")
+        
+        buffer = bytearray()
+        sniffed = False
+        async for chunk in response.aiter_bytes():
+            buffer.extend(chunk)
+            if len(buffer) > max_bytes:
+                raise ValueError(f"Image exceeds the {max_bytes} byte limit")
+            if not sniffed and len(buffer) >= 12:
+                if not looks_like_image(bytes(buffer[:12])):
+                    raise ValueError("Downloaded data is not a supported image format")
+                sniffed = True
+        
+        if not sniffed and not looks_like_image(bytes(buffer[:12])):
+            raise ValueError("Downloaded data is not a supported image format")
+        return bytes(buffer)
+
+def prepare_image_bytes(image_bytes: bytes, max_edge: int = IMAGE_MAX_EDGE,
+                        output_format: str = IMAGE_OUTPUT_FORMAT, quality: int = IMAGE_OUTPUT_QUALITY) -> tuple:
+    """Fix orientation, downscale, strip metadata and re-encode an image.
+
+    Returns (encoded_bytes, mime_type, perceptual_hash).
+    """
+    from PIL import Image, ImageOps
+    
+    with image_decode_seconds.time():
+        image = Image.open(BytesIO(image_bytes))
+        if image.format == "JPEG":
+            # Let the JPEG decoder skip straight to a reduced scale close to the target size
+            image.draft("RGB", (max_edge, max_edge))
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_edge, max_edge), Image.Resampling.LANCZOS)
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        perceptual_hash = dhash(image)
+    
+        # Saving without exif/icc arguments drops the original metadata
+        output = BytesIO()
+        save_options = {"quality": quality}
+        if output_format == "JPEG":
+            save_options["optimize"] = True
+        image.save(output, format=output_format, **save_options)
+        return output.getvalue(), f"image/{output_format.lower()}", perceptual_hash
+
+async def load_prepared_image(image_url: str) -> dict:
+    """Load image from URL and prepare it for Gemini processing.
+
+    Returns {"image": inline blob ({"mime_type", "data"}) that generate_content
+    accepts directly, "dhash": perceptual hash of the photo}.
+    """
+    try:
+        with image_load_seconds.time(outcome="ok", cache="hit") as labels:
+            image_bytes = await fetch_image_bytes(image_url)
+            cache_key = f"{hashlib.sha256(image_bytes).hexdigest()}:{IMAGE_MAX_EDGE}:{IMAGE_OUTPUT_FORMAT}:{IMAGE_OUTPUT_QUALITY}"
+            prepared = prepared_image_cache.get(cache_key)
+            if prepared is None:
+                labels["cache"] = "miss"
+                # Decoding and resizing is CPU bound, keep it off the event loop
+                data, mime_type, perceptual_hash = await asyncio.to_thread(prepare_image_bytes, image_bytes)
+                prepared = {"image": {"mime_type": mime_type, "data": data}, "dhash": perceptual_hash}
+                prepared_image_cache.set(cache_key, prepared)
+            return prepared
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to load image: {str(e)}")
 
-@app.post("/analyze-photo")
-async def analyze_photo_with_gemini(request: GeminiFashionAnalysisRequest):
-    """Analyze uploaded photo using Gemini 2.5 Flash with vision capabilities"""
-    try:
-        # Load the image
-        image = load_image_from_url(request.photo_url)
-        
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
-        # Create comprehensive fashion analysis prompt
-        analysis_prompt = f"""
-        You are an expert fashion stylist and image analyst. Analyze this photo comprehensively for fashion styling purposes.
+async def load_image_from_url(image_url: str) -> dict:
+    """Inline blob of a prepared photo, see load_prepared_image"""
+    return (await load_prepared_image(image_url))["image"]
 
-        User Context:
-        - Style Preferences: {request.user_preferences}
-        - Occasion: {request.occasion}
-        - Additional Constraints: {request.constraints or 'None'}
+def analysis_context(request: GeminiFashionAnalysisRequest) -> str:
+    """Key of the user and request parameters an analysis depends on besides the photo"""
+    return make_cache_key(request.user_id, request.user_preferences, request.occasion, request.constraints or "")
 
-        Please provide a detailed analysis in the following JSON format:
+async def perform_gemini_analysis(request: GeminiFashionAnalysisRequest) -> GeminiAnalysisResponse:
+    """Analyze a photo with Gemini, or reuse the analysis of a near-identical one"""
+    # Load the image
+    prepared = await load_prepared_image(request.photo_url)
+    image = prepared["image"]
+    
+    # Reuse the analysis of a near-identical photo analyzed for the same context
+    dedupe = PHOTO_DEDUPE_ENABLED and bool(request.user_id) and not request.bypass_cache
+    if dedupe:
+        match = analysis_index.nearest(prepared["dhash"], analysis_context(request))
+        photo_dedupe_lookups.inc(outcome="miss" if match is None else "hit")
+        if match is not None:
+            analysis, distance = match
+            return GeminiAnalysisResponse(analysis=analysis, reused_analysis={"hash_distance": distance})
+    
+    # Create comprehensive fashion analysis prompt
+    analysis_prompt = f"""
+    You are an expert fashion stylist and image analyst. Analyze this photo comprehensively for fashion styling purposes.
 
-        {{
-          "body_analysis": {{
-            "body_type": "identified body type (pear, apple, hourglass, rectangle, inverted triangle)",
-            "key_features": ["list of notable body features"],
-            "proportions": "detailed description of body proportions",
-            "posture_notes": "observations about posture and stance"
-          }},
-          "color_analysis": {{
-            "skin_undertone": "warm/cool/neutral",
-            "complexion_notes": "description of skin tone and complexion",
-            "best_colors": ["list of 5-6 most flattering colors"],
-            "colors_to_avoid": ["list of 3-4 colors to avoid"],
-            "hair_color": "observed hair color if visible",
-            "eye_color": "observed eye color if visible"
-          }},
-          "current_style_analysis": {{
-            "current_outfit": "description of what they're wearing",
-            "fit_assessment": "how well current clothes fit",
-            "style_category": "current style category (casual, professional, etc.)",
-            "strengths": ["what works well in current look"],
-            "improvement_areas": ["areas that could be enhanced"]
-          }},
-          "body_proportion_advice": {{
-            "silhouettes_to_emphasize": ["recommended silhouettes"],
-            "areas_to_highlight": ["body areas to accentuate"],
-            "styling_techniques": ["specific techniques for this body type"]
-          }},
-          "occasion_suitability": {{
-            "current_appropriateness": "how suitable current look is for stated occasion",
-            "needed_adjustments": ["adjustments needed for the occasion"]
-          }},
-          "recommendations_summary": "2-3 sentence summary of key styling recommendations"
-        }}
+    User Context:
+    - Style Preferences: {request.user_preferences}
+    - Occasion: {request.occasion}
+    - Additional Constraints: {request.constraints or 'None'}
 
-        Analyze the image carefully and provide specific, actionable insights. Focus on:
-        1. Accurate body type identification
-        2. Precise color analysis based on skin tone
-        3. Constructive assessment of current style
-        4. Specific recommendations for the stated occasion
-        5. Professional but encouraging tone
+    Please provide a detailed analysis in the following JSON format:
 
-        Return only the JSON response, no additional text.
-        """
-        
-        # Generate analysis with Gemini
-        response = model.generate_content([analysis_prompt, image])
-        
-        # Parse and validate JSON response
-        try:
-            analysis_result = json.loads(response.text)
-            return {"analysis": json.dumps(analysis_result)}
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw response
-            return {"analysis": response.text}
+    {{
+      "body_analysis": {{
+        "body_type": "identified body type (pear, apple, hourglass, rectangle, inverted triangle)",
+        "key_features": ["list of notable body features"],
+        "proportions": "detailed description of body proportions",
+        "posture_notes": "observations about posture and stance"
+      }},
+      "color_analysis": {{
+        "skin_undertone": "warm/cool/neutral",
+        "complexion_notes": "description of skin tone and complexion",
+        "best_colors": ["list of 5-6 most flattering colors"],
+        "colors_to_avoid": ["list of 3-4 colors to avoid"],
+        "hair_color": "observed hair color if visible",
+        "eye_color": "observed eye color if visible"
+      }},
+      "current_style_analysis": {{
+        "current_outfit": "description of what they're wearing",
+        "fit_assessment": "how well current clothes fit",
+        "style_category": "current style category (casual, professional, etc.)",
+        "strengths": ["what works well in current look"],
+        "improvement_areas": ["areas that could be enhanced"]
+      }},
+      "body_proportion_advice": {{
+        "silhouettes_to_emphasize": ["recommended silhouettes"],
+        "areas_to_highlight": ["body areas to accentuate"],
+        "styling_techniques": ["specific techniques for this body type"]
+      }},
+      "occasion_suitability": {{
+        "current_appropriateness": "how suitable current look is for stated occasion",
+        "needed_adjustments": ["adjustments needed for the occasion"]
+      }},
+      "recommendations_summary": "2-3 sentence summary of key styling recommendations"
+    }}
+
+    Analyze the image carefully and provide specific, actionable insights. Focus on:
+    1. Accurate body type identification
+    2. Precise color analysis based on skin tone
+    3. Constructive assessment of current style
+    4. Specific recommendations for the stated occasion
+    5. Professional but encouraging tone
+
+    Return only the JSON response, no additional text.
+    """
+    
+    # Generate analysis with Gemini
+    response = await generate_with_gemini([analysis_prompt, image], GeminiFashionAnalysis)
+    
+    # Parse and validate JSON response
+    analysis = parse_model_output(response.text, GeminiFashionAnalysis)
+    if analysis is not None:
+        if dedupe:
+            analysis_index.add(prepared["dhash"], analysis_context(request), analysis)
+        return GeminiAnalysisResponse(analysis=analysis)
+    # If JSON parsing fails, return the raw response
+    return GeminiAnalysisResponse(analysis=response.text)
+
+@app.post("/analyze-photo", response_model=GeminiAnalysisResponse, response_model_exclude_none=True)
+async def analyze_photo_with_gemini(request: GeminiFashionAnalysisRequest, legacy_text: bool = False):
+    """Analyze uploaded photo using Gemini 2.5 Flash with vision capabilities"""
+    try:
+        result = await perform_gemini_analysis(request)
+        if legacy_text:
+            result.analysis_text = output_text(result.analysis)
+        return model_response(result)
             
     except Exception as e:
-        print(f"Error in Gemini photo analysis: {str(e)}", file=sys.stderr)
+        logger.exception("Error in Gemini photo analysis")
         raise HTTPException(status_code=500, detail=f"Analysis failed: {str(e)}")
 
-@app.post("/recommend-outfit")
-async def recommend_outfit_with_gemini(request: GeminiOutfitRecommendationRequest):
+@app.post("/analyze-photo/batch")
+async def analyze_photo_batch_with_gemini(request: GeminiBatchPhotoAnalysisRequest, legacy_text: bool = False):
+    """Analyze many photos with shared preferences, streaming each result over SSE as it finishes.
+
+    Photos share the download pool and the prepared-image cache, and duplicate URLs are analyzed once.
+    """
+    if not request.photo_urls:
+        raise HTTPException(status_code=400, detail="No photo URLs provided")
+    if len(request.photo_urls) > BATCH_MAX_PHOTOS:
+        raise HTTPException(status_code=400, detail=f"Batch is limited to {BATCH_MAX_PHOTOS} photos")
+    
+    async def analyze(photo_url: str) -> dict:
+        result = await perform_gemini_analysis(GeminiFashionAnalysisRequest(
+            photo_url=photo_url,
+            user_preferences=request.user_preferences,
+            occasion=request.occasion,
+            constraints=request.constraints,
+            user_id=request.user_id
+        ))
+        if legacy_text:
+            result.analysis_text = output_text(result.analysis)
+        return result.model_dump(mode="json", exclude_none=True)
+    
+    limit = min(request.max_concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+    return sse_response(stream_batch_frames(analyze, request.photo_urls, limit, key_name="photo_url"))
+
+@app.post("/recommend-outfit", response_model=GeminiRecommendationResponse, response_model_exclude_none=True)
+async def recommend_outfit_with_gemini(request: GeminiOutfitRecommendationRequest, legacy_text: bool = False):
     """Generate outfit recommendations using Gemini based on analysis"""
     try:
-        # Initialize Gemini model
-        model = genai.GenerativeModel('gemini-2.5-flash')
-        
+        analysis = request.analysis_result
+        preferences = request.user_preferences
+        if PROMPT_COMPACTION_ENABLED and isinstance(analysis, dict):
+            analysis = fit_json_to_budget(drop_empty(analysis), PROMPT_ANALYSIS_TOKEN_BUDGET, COLOR_LISTS)
+        elif PROMPT_COMPACTION_ENABLED:
+            analysis = compact_model_json(analysis, PROMPT_ANALYSIS_TOKEN_BUDGET, GeminiFashionAnalysis, COLOR_LISTS)
+        elif isinstance(analysis, dict):
+            analysis = json.dumps(analysis)
+        if PROMPT_COMPACTION_ENABLED:
+            preferences = fit_json_to_budget(drop_empty(preferences), PROMPT_PREFERENCES_TOKEN_BUDGET)
+
         # Create outfit recommendation prompt
         recommendation_prompt = f"""
         You are a professional fashion stylist creating specific outfit recommendations based on the provided analysis.
 
         ANALYSIS RESULTS:
-        {request.analysis_result}
+        {analysis}
 
-        USER PREFERENCES: {request.user_preferences}
+        USER PREFERENCES: {preferences}
         OCCASION: {request.occasion}
         BUDGET RANGE: {request.budget_range}
 
@@ -225,20 +636,23 @@ async def recommend_outfit_with_gemini(request: GeminiOutfitRecommendationReques
         """
         
         # Generate recommendations
-        response = model.generate_content(recommendation_prompt)
+        response = await generate_with_gemini(recommendation_prompt, GeminiOutfitRecommendations)
         
         # Parse and validate JSON response
-        try:
-            recommendations = json.loads(response.text)
-            return {"recommendations": json.dumps(recommendations)}
-        except json.JSONDecodeError:
-            # If JSON parsing fails, return the raw response
-            return {"recommendations": response.text}
+        recommendations = parse_model_output(response.text, GeminiOutfitRecommendations)
+        # If JSON parsing fails, return the raw response
+        result = GeminiRecommendationResponse(
+            recommendations=recommendations if recommendations is not None else response.text)
+        if legacy_text:
+            result.recommendations_text = output_text(result.recommendations)
+        return model_response(result)
             
     except Exception as e:
-        print(f"Error in Gemini outfit recommendations: {str(e)}", file=sys.stderr)
+        logger.exception("Error in Gemini outfit recommendations")
         raise HTTPException(status_code=500, detail=f"Recommendation failed: {str(e)}")
 
+startup_timer.finish()
+
 # Export the app for Vercel
 if __name__ == "__main__":
     import uvicorn
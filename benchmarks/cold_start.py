@@ -0,0 +1,90 @@
+"""
+Cold-start benchmark for the three Python agent services.
+
+Each run starts a fresh interpreter per app and measures:
+  - import_ms:            importing the module (what every cold start pays)
+  - first_ping_ms:        the first /ping request through the ASGI app
+  - first_use_setup_ms:   building the lazily initialized clients and agents that the
+                          first real request would construct (no network calls are made)
+
+Usage (from the repo root):
+    python benchmarks/cold_start.py --runs 5 --output cold_start.json
+
+Dummy API keys are supplied when none are set, since only construction is measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+APPS = {
+    "agents": ["get_tavily_client", "get_fashion_analysis_agent", "get_outfit_recommendation_agent"],
+    "gemini_agents": ["get_gemini_model"],
+    "flux_agents": ["get_replicate"],
+}
+
+CHILD_SCRIPT = """
+import importlib, json, sys, time
+started = time.perf_counter()
+module = importlib.import_module("api." + sys.argv[1])
+imported = time.perf_counter()
+from fastapi.testclient import TestClient
+client = TestClient(module.app)
+ping_started = time.perf_counter()
+client.get("/ping").raise_for_status()
+ping_done = time.perf_counter()
+for getter in sys.argv[2:]:
+    getattr(module, getter)()
+setup_done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_ping_ms": (ping_done - ping_started) * 1000,
+    "first_use_setup_ms": (setup_done - ping_done) * 1000,
+}))
+"""
+
+
+def run_once(app: str, getters: list, env: dict) -> dict:
+    completed = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT, app, *getters],
+        capture_output=True, text=True, env=env, check=True,
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per app")
+    parser.add_argument("--apps", nargs="*", default=list(APPS), choices=list(APPS))
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ)
+    env.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+    env.setdefault("REPLICATE_API_TOKEN", "benchmark-placeholder")
+    env["PYTHONPATH"] = repo_root + os.pathsep + env.get("PYTHONPATH", "")
+
+    report = {"python": sys.version.split()[0], "runs": args.runs, "apps": {}}
+    for app in args.apps:
+        samples = [run_once(app, APPS[app], env) for _ in range(args.runs)]
+        report["apps"][app] = {
+            metric: {
+                "median": round(statistics.median(s[metric] for s in samples), 2),
+                "min": round(min(s[metric] for s in samples), 2),
+                "max": round(max(s[metric] for s in samples), 2),
+            }
+            for metric in samples[0]
+        }
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,231 @@
+"""
+CPU micro-benchmarks for the per-request hot paths of the Python agent services.
+
+Runs fully offline: placeholder API keys are set, Tavily is left unconfigured and
+photo downloads go through an in-process httpx mock transport, so no model, search
+or storage service is contacted. Covered paths:
+
+  - prompt assembly for /analyze-photo and /recommend-outfit (agents.py)
+  - search-context summarization of Tavily results (agents.py)
+  - JSON extraction from model output: clean JSON, fenced fallback strings,
+    prose-wrapped and truncated output (api/_json_output.py)
+  - load_image_from_url decode/resize/re-encode on representative JPEGs (gemini_agents.py)
+  - outfit description building for generate_multiple_outfits (flux_agents.py)
+
+Usage (from the repo root):
+    python benchmarks/cpu_hotpaths.py --output bench.json
+    python benchmarks/cpu_hotpaths.py --compare bench.json --threshold 0.15
+
+Results are JSON (time per operation in microseconds) keyed by benchmark name, so
+runs from different commits can be compared; --compare exits non-zero when any
+benchmark is slower than the baseline by more than the threshold.
+"""
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from io import BytesIO
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+os.environ.setdefault("GOOGLE_API_KEY", "benchmark-placeholder")
+os.environ.setdefault("REPLICATE_API_TOKEN", "benchmark-placeholder")
+os.environ.pop("TAVILY_API_KEY", None)
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+import httpx  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from api import agents, flux_agents, gemini_agents  # noqa: E402
+from api._json_output import parse_json_output  # noqa: E402
+
+
+def measure(fn, repeat: int, min_time: float) -> dict:
+    """Time fn() per call, calibrating the loop count so each repeat runs ~min_time seconds"""
+    loops = 1
+    while True:
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        elapsed = time.perf_counter() - started
+        if elapsed >= min_time / 4 or loops >= 1_000_000:
+            break
+        loops *= 4
+    loops = max(1, int(loops * (min_time / max(elapsed, 1e-9))))
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - started) / loops * 1e6)
+    return {
+        "us_per_op": round(statistics.median(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "loops": loops,
+        "repeat": repeat,
+    }
+
+
+def make_jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    """Build a photo-like JPEG (gradient plus sensor noise) with an EXIF orientation tag"""
+    gradient = Image.linear_gradient("L").resize((width, height))
+    noise = Image.effect_noise((width, height), 24)
+    image = Image.merge("RGB", (gradient, noise, Image.blend(gradient, noise, 0.5)))
+    exif = Image.Exif()
+    exif[0x0112] = orientation
+    output = BytesIO()
+    image.save(output, format="JPEG", quality=92, exif=exif)
+    return output.getvalue()
+
+
+def sample_search_results() -> tuple:
+    def results(key, count, length):
+        return {
+            key: [
+                {"title": f"Result {i} for {key}", "content": ("lorem ipsum dolor sit amet " * 20)[:length],
+                 "url": f"https://example.com/{key}/{i}"}
+                for i in range(count)
+            ],
+            "success": True,
+        }
+    return results("trends", 3, 300), results("pricing", 3, 200), results("brands", 2, 250)
+
+
+def build_benchmarks() -> dict:
+    analysis_request = agents.FashionAnalysisRequest(
+        photo_url="https://example.com/photo.jpg",
+        user_preferences={"style": "casual", "styleTypes": ["minimal", "classic"], "budget": "mid-range",
+                          "colors": ["navy", "cream"]},
+        occasion="work",
+        constraints="No heels",
+        text_description="I want to look polished for client meetings",
+    )
+    analysis_json = parse_json_output(agents.FALLBACK_ANALYSIS_RESPONSE)
+    recommendation_request = agents.OutfitRecommendationRequest(
+        analysis_result=agents.FALLBACK_ANALYSIS_RESPONSE,
+        user_preferences=analysis_request.user_preferences,
+        occasion="work",
+        budget_range="mid-range",
+    )
+    trends, pricing, brands = sample_search_results()
+    search_context = agents.build_search_context(trends, pricing, brands)
+
+    clean_recommendation = json.dumps(parse_json_output(agents.FALLBACK_RECOMMENDATION_RESPONSE))
+    prose_wrapped = "Here are your recommendations:\n" + clean_recommendation + "\nEnjoy!"
+    truncated = clean_recommendation[: int(len(clean_recommendation) * 0.8)]
+
+    outfits = parse_json_output(agents.FALLBACK_RECOMMENDATION_RESPONSE)["outfit_recommendations"] * 3
+
+    benchmarks = {
+        "agents.build_analysis_prompt": lambda: agents.build_analysis_prompt(analysis_request),
+        "agents.build_search_context": lambda: agents.build_search_context(trends, pricing, brands),
+        "agents.build_recommendation_prompt": lambda: agents.build_recommendation_prompt(
+            recommendation_request, search_context),
+        "json.parse_clean_schema": lambda: parse_json_output(clean_recommendation, agents.OutfitRecommendations),
+        "json.parse_fenced_fallback_analysis": lambda: parse_json_output(
+            agents.FALLBACK_ANALYSIS_RESPONSE, agents.FashionAnalysis),
+        "json.parse_fenced_fallback_recommendation": lambda: parse_json_output(
+            agents.FALLBACK_RECOMMENDATION_RESPONSE, agents.OutfitRecommendations),
+        "json.parse_prose_wrapped": lambda: parse_json_output(prose_wrapped, agents.OutfitRecommendations),
+        "json.parse_truncated": lambda: parse_json_output(truncated, agents.OutfitRecommendations),
+        "flux.build_outfit_descriptions_x3": lambda: [flux_agents.build_outfit_description(o) for o in outfits],
+    }
+    assert analysis_json is not None
+
+    # Image loading: serve representative JPEGs from an in-process transport
+    photos = {
+        "phone_12mp_rotated": make_jpeg(4032, 3024, orientation=6),
+        "web_2mp": make_jpeg(1600, 1200),
+    }
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, headers={"content-type": "image/jpeg"}, content=photos[request.url.path.strip("/")])
+
+    gemini_agents.http_client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    loop = asyncio.new_event_loop()
+    for name in photos:
+        url = f"https://photos.local/{name}"
+
+        def load_cold(url=url):
+            gemini_agents.prepared_image_cache.clear()
+            return loop.run_until_complete(gemini_agents.load_image_from_url(url))
+
+        def load_cached(url=url):
+            return loop.run_until_complete(gemini_agents.load_image_from_url(url))
+
+        benchmarks[f"gemini.load_image_from_url.{name}"] = load_cold
+        benchmarks[f"gemini.load_image_from_url.{name}.cached"] = load_cached
+    return benchmarks
+
+
+def git_revision() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return "unknown"
+
+
+def compare(report: dict, baseline_path: str, threshold: float) -> bool:
+    """Print a comparison against a previous report and return True if nothing regressed"""
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    ok = True
+    print(f"\n{'benchmark':55} {'baseline':>12} {'current':>12} {'change':>8}", file=sys.stderr)
+    for name, result in report["benchmarks"].items():
+        previous = baseline.get("benchmarks", {}).get(name)
+        if not previous:
+            print(f"{name:55} {'-':>12} {result['us_per_op']:>12.2f} {'new':>8}", file=sys.stderr)
+            continue
+        change = result["us_per_op"] / previous["us_per_op"] - 1
+        flag = ""
+        if change > threshold:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:55} {previous['us_per_op']:>12.2f} {result['us_per_op']:>12.2f} {change:>+8.1%}{flag}",
+              file=sys.stderr)
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5, help="timed repeats per benchmark")
+    parser.add_argument("--min-time", type=float, default=0.2, help="target seconds per repeat")
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    parser.add_argument("--compare", help="baseline JSON report to compare against")
+    parser.add_argument("--threshold", type=float, default=0.10, help="allowed slowdown before flagging")
+    args = parser.parse_args()
+
+    report = {
+        "revision": git_revision(),
+        "python": sys.version.split()[0],
+        "benchmarks": {},
+    }
+    for name, fn in build_benchmarks().items():
+        if args.filter and args.filter not in name:
+            continue
+        # Keep the services' stderr diagnostics out of the timings and the output
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stderr(devnull):
+            fn()  # warm up caches, imports and lazy initializers
+            report["benchmarks"][name] = measure(fn, args.repeat, args.min_time)
+        print(f"{name}: {report['benchmarks'][name]['us_per_op']:.2f} us/op", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    if args.compare and not compare(report, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
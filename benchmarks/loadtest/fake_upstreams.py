@@ -0,0 +1,134 @@
+"""
+Local stand-ins for the services the agents call: Gemini, Tavily, Replicate and the
+photo blob store. Every route sleeps for a latency drawn from a per-upstream
+lognormal distribution and fails at a configurable rate, so the agent services can
+be load tested without touching paid APIs.
+
+Started by benchmarks/loadtest/run.py; can also be run on its own:
+    python benchmarks/loadtest/fake_upstreams.py --port 9100 \
+        --profile '{"gemini": {"median": 1.5, "sigma": 0.4, "error_rate": 0.02}}'
+
+Profile keys are gemini, tavily, replicate and photos; each takes median (seconds),
+sigma (lognormal shape, 0 for a fixed delay) and error_rate (0-1).
+"""
+import argparse
+import asyncio
+import json
+import random
+import uuid
+from io import BytesIO
+
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import Response
+
+DEFAULT_PROFILE = {
+    "gemini": {"median": 1.5, "sigma": 0.35, "error_rate": 0.0},
+    "tavily": {"median": 0.6, "sigma": 0.5, "error_rate": 0.0},
+    "replicate": {"median": 6.0, "sigma": 0.3, "error_rate": 0.0},
+    "photos": {"median": 0.05, "sigma": 0.3, "error_rate": 0.0},
+}
+
+ANALYSIS_JSON = {
+    "body_analysis": {"body_type": "rectangle", "key_features": ["balanced shoulders", "long legs"],
+                      "proportions": "Even shoulder and hip width with a defined waist"},
+    "color_analysis": {"skin_undertone": "warm", "best_colors": ["olive", "camel", "rust"],
+                       "colors_to_avoid": ["icy blue", "neon pink"]},
+    "style_assessment": {"current_style": "Smart casual", "strengths": ["Good fit"],
+                         "improvement_areas": ["Add structure"]},
+    "recommendations_summary": "Structured layers in warm earth tones.",
+}
+
+OUTFIT_JSON = {
+    "name": "Earth Tone Layers",
+    "description": "Relaxed tailoring in warm neutrals",
+    "items": {
+        "top": {"item": "silk blouse", "color": "cream", "why": "softens the shoulder line"},
+        "bottom": {"item": "wide-leg trousers", "color": "camel", "why": "balances proportions"},
+        "shoes": {"item": "leather loafers", "color": "cognac", "why": "polished but comfortable"},
+        "accessories": [{"item": "gold hoops", "why": "complements warm undertones"}],
+    },
+    "styling_tips": ["Tuck the blouse loosely", "Roll the sleeves once"],
+    "budget_estimate": "$120-180",
+    "occasion_fit": "Works for the office and after-work plans",
+}
+
+RECOMMENDATION_JSON = {
+    "outfit_recommendations": [OUTFIT_JSON, OUTFIT_JSON, OUTFIT_JSON],
+    "general_styling_advice": ["Define the waist", "Stay in warm neutrals"],
+    "shopping_tips": ["Check fabric content", "Buy basics first"],
+    "image_generation_prompt": "Person in cream blouse and camel trousers in a bright office",
+}
+
+
+def build_app(profile: dict) -> FastAPI:
+    app = FastAPI(title="Fake upstreams")
+    photo_cache = {}
+
+    async def simulate(upstream: str):
+        settings = profile[upstream]
+        sigma = settings.get("sigma", 0)
+        delay = settings["median"] * (random.lognormvariate(0, sigma) if sigma else 1)
+        await asyncio.sleep(delay)
+        if random.random() < settings.get("error_rate", 0):
+            raise HTTPException(status_code=random.choice([429, 500, 503]), detail=f"Injected {upstream} failure")
+
+    @app.post("/gemini/generate")
+    async def gemini_generate(request: Request):
+        body = await request.json()
+        await simulate("gemini")
+        payload = RECOMMENDATION_JSON if body.get("kind") == "recommendation" else ANALYSIS_JSON
+        return {"text": json.dumps(payload)}
+
+    @app.post("/search")
+    async def tavily_search(request: Request):
+        body = await request.json()
+        await simulate("tavily")
+        results = [
+            {"title": f"{body.get('query', '')} #{i}", "url": f"https://example.com/{i}",
+             "content": "Seasonal pieces and where to find them. " * 12, "score": 0.9 - i / 10}
+            for i in range(body.get("max_results", 5))
+        ]
+        return {"query": body.get("query"), "results": results, "response_time": profile["tavily"]["median"]}
+
+    @app.post("/v1/models/{owner}/{name}/predictions")
+    async def replicate_prediction(owner: str, name: str, request: Request):
+        body = await request.json()
+        await simulate("replicate")
+        prediction_id = uuid.uuid4().hex
+        return {
+            "id": prediction_id, "model": f"{owner}/{name}", "version": "fake", "status": "succeeded",
+            "input": body.get("input"), "output": f"https://renders.local/{prediction_id}.jpg",
+            "logs": "", "error": None, "metrics": {}, "created_at": None, "started_at": None,
+            "completed_at": None, "urls": {"get": f"/v1/predictions/{prediction_id}"},
+        }
+
+    @app.get("/photos/{photo_id}")
+    async def photo(photo_id: str):
+        await simulate("photos")
+        if photo_id not in photo_cache:
+            from PIL import Image
+            seed = sum(photo_id.encode())
+            image = Image.new("RGB", (1600, 1200), (seed % 255, (seed * 7) % 255, (seed * 13) % 255))
+            output = BytesIO()
+            image.save(output, format="JPEG", quality=90)
+            photo_cache[photo_id] = output.getvalue()
+        return Response(photo_cache[photo_id], media_type="image/jpeg")
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--profile", default="{}", help="JSON overrides for DEFAULT_PROFILE")
+    args = parser.parse_args()
+
+    profile = {name: dict(settings) for name, settings in DEFAULT_PROFILE.items()}
+    for name, overrides in json.loads(args.profile).items():
+        profile[name].update(overrides)
+    uvicorn.run(build_app(profile), host="127.0.0.1", port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+"""
+End-to-end load test for the Python agent services against fake upstreams.
+
+Starts fake_upstreams.py and each selected service (via serve_app.py) as local
+processes, then drives one endpoint scenario at a time either closed-loop (a fixed
+number of concurrent clients) or open-loop (a fixed arrival rate, so queueing shows
+up as latency instead of lower throughput). Reports per scenario:
+
+  - latency p50/p95/p99 and time to first byte (matters for the SSE endpoints)
+  - throughput and error counts by status
+  - service event-loop lag (p50/p99/max) and RSS (current/peak)
+
+Payloads are unique per request and the service caches are disabled unless
+--warm-caches is given, so the numbers reflect real work rather than cache hits.
+
+Usage (from the repo root):
+    python benchmarks/loadtest/run.py --concurrency 32 --duration 30
+    python benchmarks/loadtest/run.py --qps 20 --duration 60 --scenarios agents.analyze
+    python benchmarks/loadtest/run.py --latency gemini=2.0:0.5 --error-rate tavily=0.05 --output load.json
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(os.path.dirname(HERE))
+
+APP_PORTS = {"agents": 9201, "gemini_agents": 9202, "flux_agents": 9203}
+UPSTREAM_PORT = 9100
+
+OCCASIONS = ["work", "date night", "wedding guest", "weekend brunch", "job interview", "gallery opening"]
+STYLES = ["minimal", "classic", "streetwear", "bohemian", "preppy", "edgy"]
+BUDGETS = ["budget", "mid-range", "luxury"]
+
+ANALYSIS_RESULT = json.dumps({
+    "body_analysis": {"body_type": "rectangle", "key_features": ["balanced shoulders"], "proportions": "even"},
+    "color_analysis": {"skin_undertone": "warm", "best_colors": ["olive", "camel"], "colors_to_avoid": ["neon"]},
+    "style_assessment": {"current_style": "smart casual", "strengths": ["fit"], "improvement_areas": ["structure"]},
+    "recommendations_summary": "Structured layers in warm tones",
+})
+OUTFIT = {"name": "Earth Tone Layers", "items": {"top": {"item": "silk blouse", "color": "cream"},
+                                                 "bottom": {"item": "trousers", "color": "camel"}}}
+
+
+class Payloads:
+    """Builds a unique request for each call so coalescing and caches do not short-circuit work"""
+
+    def __init__(self, upstream: str, unique: bool):
+        self.upstream = upstream
+        self.unique = unique
+        self.counter = itertools.count()
+
+    def _n(self) -> int:
+        return next(self.counter) if self.unique else 0
+
+    def photo_url(self, n: int) -> str:
+        return f"{self.upstream}/photos/user-{n}.jpg"
+
+    def preferences(self, n: int) -> dict:
+        return {"style": STYLES[n % len(STYLES)], "budget": BUDGETS[n % len(BUDGETS)], "request": n}
+
+    def analysis(self) -> dict:
+        n = self._n()
+        return {"json": {"photo_url": self.photo_url(n), "user_preferences": self.preferences(n),
+                         "occasion": OCCASIONS[n % len(OCCASIONS)], "constraints": f"request {n}"}}
+
+    def batch(self) -> dict:
+        n = self._n()
+        return {"json": {"photo_urls": [self.photo_url(n * 4 + i) for i in range(4)],
+                         "user_preferences": self.preferences(n), "occasion": OCCASIONS[n % len(OCCASIONS)]}}
+
+    def recommendation(self) -> dict:
+        n = self._n()
+        return {"json": {"analysis_result": ANALYSIS_RESULT.replace("Structured", f"Structured #{n}"),
+                         "user_preferences": self.preferences(n), "occasion": OCCASIONS[n % len(OCCASIONS)],
+                         "budget_range": BUDGETS[n % len(BUDGETS)]}}
+
+    def style_session(self) -> dict:
+        n = self._n()
+        return {"json": {"photo_url": self.photo_url(n), "user_preferences": self.preferences(n),
+                         "occasion": OCCASIONS[n % len(OCCASIONS)], "budget_range": BUDGETS[n % len(BUDGETS)]}}
+
+    def visualization(self) -> dict:
+        n = self._n()
+        return {"json": {"user_photo_url": self.photo_url(n), "outfit_description": f"cream blouse, look {n}",
+                         "style_prompt": "editorial", "bypass_cache": self.unique}}
+
+    def multiple_outfits(self) -> dict:
+        n = self._n()
+        outfits = [dict(OUTFIT, name=f"Look {n}-{i}") for i in range(3)]
+        return {"params": {"user_photo_url": self.photo_url(n), "bypass_cache": str(self.unique).lower()},
+                "json": outfits}
+
+
+# scenario name -> (app, path, payload builder)
+SCENARIOS = {
+    "agents.ping": ("agents", "/ping", None),
+    "agents.analyze": ("agents", "/analyze-photo", "analysis"),
+    "agents.analyze_stream": ("agents", "/analyze-photo/stream", "analysis"),
+    "agents.analyze_batch": ("agents", "/analyze-photo/batch", "batch"),
+    "agents.recommend": ("agents", "/recommend-outfit", "recommendation"),
+    "agents.recommend_stream": ("agents", "/recommend-outfit/stream", "recommendation"),
+    "agents.style_session": ("agents", "/style-session", "style_session"),
+    "gemini.analyze": ("gemini_agents", "/analyze-photo", "analysis"),
+    "gemini.recommend": ("gemini_agents", "/recommend-outfit", "recommendation"),
+    "flux.visualize": ("flux_agents", "/generate-outfit-visualization", "visualization"),
+    "flux.multiple": ("flux_agents", "/generate-multiple-outfits", "multiple_outfits"),
+}
+
+
+def percentile(values: list, q: float):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+
+
+async def timed_request(client: httpx.AsyncClient, method: str, url: str, kwargs: dict, results: list):
+    started = time.perf_counter()
+    first_byte = None
+    status = None
+    try:
+        async with client.stream(method, url, **kwargs) as response:
+            status = response.status_code
+            async for _ in response.aiter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+    except Exception as e:
+        status = type(e).__name__
+    results.append((status, time.perf_counter() - started, first_byte))
+
+
+async def drive(client, scenario: str, base_url: str, payloads: Payloads, args) -> dict:
+    app, path, builder = SCENARIOS[scenario]
+    method = "GET" if builder is None else "POST"
+    url = base_url + path
+    results = []
+    deadline = time.perf_counter() + args.duration
+
+    def next_kwargs():
+        return {} if builder is None else getattr(payloads, builder)()
+
+    started = time.perf_counter()
+    if args.qps:
+        # Open loop: Poisson arrivals regardless of how fast responses come back
+        pending = set()
+        while time.perf_counter() < deadline:
+            if len(pending) < args.max_outstanding:
+                task = asyncio.create_task(timed_request(client, method, url, next_kwargs(), results))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            else:
+                results.append(("dropped", 0.0, None))
+            await asyncio.sleep(random.expovariate(args.qps))
+        if pending:
+            await asyncio.wait(pending, timeout=args.drain_timeout)
+    else:
+        async def client_loop():
+            while time.perf_counter() < deadline:
+                await timed_request(client, method, url, next_kwargs(), results)
+
+        await asyncio.gather(*(client_loop() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ok = [r for r in results if isinstance(r[0], int) and r[0] < 400]
+    errors = {}
+    for status, _, _ in results:
+        if not (isinstance(status, int) and status < 400):
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    latencies = [r[1] for r in ok]
+    first_bytes = [r[2] for r in ok if r[2] is not None]
+    return {
+        "requests": len(results),
+        "succeeded": len(ok),
+        "errors": errors,
+        "throughput_rps": round(len(ok) / elapsed, 2),
+        "latency_ms": {"p50": percentile(latencies, 0.50), "p95": percentile(latencies, 0.95),
+                       "p99": percentile(latencies, 0.99), "max": percentile(latencies, 1.0)},
+        "ttfb_ms": {"p50": percentile(first_bytes, 0.50), "p99": percentile(first_bytes, 0.99)},
+    }
+
+
+def start_process(argv: list, log_path: str) -> subprocess.Popen:
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    log = open(log_path, "w")
+    return subprocess.Popen([sys.executable] + argv, cwd=REPO_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+async def wait_ready(client, url: str, process: subprocess.Popen, timeout: float = 60):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.TransportError:
+            pass
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} not ready after {timeout}s")
+
+
+def parse_overrides(pairs: list, field: str) -> dict:
+    """Turn ["gemini=1.5:0.4"] / ["tavily=0.05"] into fake upstream profile overrides"""
+    profile = {}
+    for pair in pairs:
+        upstream, value = pair.split("=", 1)
+        if field == "latency":
+            median, _, sigma = value.partition(":")
+            profile[upstream] = {"median": float(median), **({"sigma": float(sigma)} if sigma else {})}
+        else:
+            profile[upstream] = {"error_rate": float(value)}
+    return profile
+
+
+def print_table(report: dict):
+    header = f"{'scenario':26} {'reqs':>6} {'ok':>6} {'rps':>7} {'p50':>8} {'p95':>8} {'p99':>8} " \
+             f"{'ttfb50':>8} {'lag99':>7} {'rss':>7}"
+    print(header, file=sys.stderr)
+    for name, result in report["scenarios"].items():
+        latency = result["latency_ms"]
+        lag = result["service"]["loop_lag"].get("p99_ms")
+        rss = result["service"]["rss"]["current_mb"]
+        print(f"{name:26} {result['requests']:>6} {result['succeeded']:>6} {result['throughput_rps']:>7} "
+              f"{latency['p50'] or '-':>8} {latency['p95'] or '-':>8} {latency['p99'] or '-':>8} "
+              f"{result['ttfb_ms']['p50'] or '-':>8} {lag if lag is not None else '-':>7} {rss or '-':>7}",
+              file=sys.stderr)
+        if result["errors"]:
+            print(f"{'':26} errors: {result['errors']}", file=sys.stderr)
+
+
+async def run(args) -> dict:
+    selected = [name for name in SCENARIOS if not args.scenarios or any(s in name for s in args.scenarios)]
+    apps = sorted({SCENARIOS[name][0] for name in selected})
+    upstream = f"http://127.0.0.1:{UPSTREAM_PORT}"
+    profile = parse_overrides(args.latency, "latency")
+    for name, overrides in parse_overrides(args.error_rate, "error_rate").items():
+        profile.setdefault(name, {}).update(overrides)
+
+    os.makedirs(args.log_dir, exist_ok=True)
+    if not args.warm_caches:
+        for var in ("SEARCH_CACHE_MAX_ENTRIES", "PREPARED_IMAGE_CACHE_ENTRIES", "RENDER_CACHE_MAX_ENTRIES"):
+            os.environ[var] = "0"
+        os.environ["COALESCE_RESULT_TTL_SECONDS"] = "0"
+    processes = {"upstreams": start_process(
+        [os.path.join(HERE, "fake_upstreams.py"), "--port", str(UPSTREAM_PORT), "--profile", json.dumps(profile)],
+        os.path.join(args.log_dir, "upstreams.log"))}
+    for app in apps:
+        processes[app] = start_process(
+            [os.path.join(HERE, "serve_app.py"), app, "--port", str(APP_PORTS[app]), "--upstream", upstream],
+            os.path.join(args.log_dir, f"{app}.log"))
+
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=None)
+    report = {"mode": {"qps": args.qps} if args.qps else {"concurrency": args.concurrency},
+              "duration_seconds": args.duration, "warm_caches": args.warm_caches,
+              "upstream_profile": profile, "scenarios": {}}
+    try:
+        async with httpx.AsyncClient(timeout=httpx.Timeout(args.request_timeout), limits=limits) as client:
+            await wait_ready(client, f"{upstream}/docs", processes["upstreams"])
+            for app in apps:
+                await wait_ready(client, f"http://127.0.0.1:{APP_PORTS[app]}/ping", processes[app])
+
+            payloads = Payloads(upstream, unique=not args.warm_caches)
+            for name in selected:
+                base_url = f"http://127.0.0.1:{APP_PORTS[SCENARIOS[name][0]]}"
+                await client.get(f"{base_url}/__loadtest/stats", params={"reset": "true"})
+                print(f"running {name} ...", file=sys.stderr)
+                result = await drive(client, name, base_url, payloads, args)
+                result["service"] = (await client.get(f"{base_url}/__loadtest/stats",
+                                                      params={"reset": "true"})).json()
+                report["scenarios"][name] = result
+    finally:
+        for process in processes.values():
+            process.terminate()
+        for process in processes.values():
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_mutually_exclusive_group()
+    load.add_argument("--concurrency", type=int, default=16, help="closed-loop concurrent clients (default)")
+    load.add_argument("--qps", type=float, help="open-loop arrival rate instead of a fixed concurrency")
+    parser.add_argument("--duration", type=float, default=20, help="seconds per scenario")
+    parser.add_argument("--scenarios", nargs="*", default=[], help="substring filters, e.g. agents. flux.visualize")
+    parser.add_argument("--latency", nargs="*", default=[], metavar="UPSTREAM=MEDIAN[:SIGMA]",
+                        help="fake upstream latency, e.g. gemini=1.5:0.4 replicate=6")
+    parser.add_argument("--error-rate", nargs="*", default=[], metavar="UPSTREAM=RATE",
+                        help="fake upstream failure rate, e.g. tavily=0.05")
+    parser.add_argument("--warm-caches", action="store_true", help="keep service caches on and repeat payloads")
+    parser.add_argument("--max-outstanding", type=int, default=2000, help="open-loop cap on in-flight requests")
+    parser.add_argument("--request-timeout", type=float, default=180)
+    parser.add_argument("--drain-timeout", type=float, default=60, help="open-loop wait for stragglers")
+    parser.add_argument("--log-dir", default=os.path.join(tempfile.gettempdir(), "fashion-loadtest"),
+                        help="where the service and fake upstream logs go")
+    parser.add_argument("--output", help="write the JSON report to this file as well as stdout")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print_table(report)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
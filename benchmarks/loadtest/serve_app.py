@@ -0,0 +1,157 @@
+"""
+Run one agent service under uvicorn with every outbound client pointed at the fake
+upstreams, plus a /__loadtest/stats endpoint reporting RSS and event-loop lag.
+
+    python benchmarks/loadtest/serve_app.py agents --port 9201 --upstream http://127.0.0.1:9100
+
+Tavily and Replicate are redirected at the HTTP level (client base URL and
+REPLICATE_BASE_URL), and photo URLs in the load payloads already point at the fake
+photo store. The Gemini SDKs talk gRPC/streaming protocols that are heavy to emulate,
+so the model call itself is swapped for a shim that POSTs to the fake's
+/gemini/generate route; everything above the model call (ADK runner, sessions, event
+loop, retries, parsing) runs unmodified.
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import resource
+import sys
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, REPO_ROOT)
+
+import httpx  # noqa: E402
+import uvicorn  # noqa: E402
+
+LAG_SAMPLE_INTERVAL_SECONDS = 0.05
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes up from a fixed-interval sleep"""
+
+    def __init__(self, interval: float = LAG_SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples = []
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, loop.time() - started - self.interval))
+
+    def snapshot(self, reset: bool = False) -> dict:
+        samples = sorted(self.samples)
+        if reset:
+            self.samples = []
+        if not samples:
+            return {"samples": 0}
+
+        def pick(q):
+            return round(samples[min(len(samples) - 1, int(q * len(samples)))] * 1000, 2)
+
+        return {"samples": len(samples), "p50_ms": pick(0.50), "p99_ms": pick(0.99),
+                "max_ms": round(samples[-1] * 1000, 2)}
+
+
+def rss_mb() -> dict:
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    current = None
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        pass
+    return {"current_mb": round(current, 1) if current is not None else None, "peak_mb": round(peak_kb / 1024, 1)}
+
+
+def patch_adk(upstream: str, client: httpx.AsyncClient):
+    from google.adk.models.google_llm import Gemini
+    from google.adk.models.llm_response import LlmResponse
+    from google.genai import types
+
+    async def generate_content_async(self, llm_request, stream=False):
+        schema = getattr(llm_request.config, "response_schema", None)
+        instruction = str(getattr(llm_request.config, "system_instruction", "") or "")
+        recommending = "Recommendation" in getattr(schema, "__name__", "") or "outfit recommendation" in instruction.lower()
+        response = await client.post(f"{upstream}/gemini/generate",
+                                     json={"kind": "recommendation" if recommending else "analysis"})
+        response.raise_for_status()
+        text = response.json()["text"]
+        if stream:
+            step = max(1, len(text) // 4)
+            for start in range(0, len(text), step):
+                yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text[start:start + step])]),
+                                  partial=True)
+        yield LlmResponse(content=types.Content(role="model", parts=[types.Part(text=text)]))
+
+    Gemini.generate_content_async = generate_content_async
+
+
+class FakeGeminiModel:
+    """Stands in for google.generativeai.GenerativeModel in gemini_agents"""
+
+    def __init__(self, upstream: str, client: httpx.AsyncClient):
+        self.upstream = upstream
+        self.client = client
+
+    async def generate_content_async(self, contents, generation_config=None):
+        has_image = isinstance(contents, list) and any(isinstance(part, dict) for part in contents)
+        response = await self.client.post(f"{self.upstream}/gemini/generate",
+                                          json={"kind": "analysis" if has_image else "recommendation"})
+        response.raise_for_status()
+        return type("FakeGeminiResponse", (), {"text": response.json()["text"]})()
+
+
+def load_app(name: str, upstream: str):
+    os.environ.setdefault("GOOGLE_API_KEY", "loadtest")
+    os.environ.setdefault("TAVILY_API_KEY", "loadtest")
+    os.environ.setdefault("REPLICATE_API_TOKEN", "loadtest")
+    os.environ["REPLICATE_BASE_URL"] = upstream
+
+    module = importlib.import_module(f"api.{name}")
+    client = httpx.AsyncClient(timeout=httpx.Timeout(120.0),
+                               limits=httpx.Limits(max_connections=1000, max_keepalive_connections=200))
+    if name == "agents":
+        patch_adk(upstream, client)
+        tavily = module.get_tavily_client()
+        tavily.base_url = upstream
+        module.get_tavily_client = lambda: tavily
+    elif name == "gemini_agents":
+        fake_model = FakeGeminiModel(upstream, client)
+        module.get_gemini_model = lambda: fake_model
+    return module.app
+
+
+async def serve(name: str, port: int, upstream: str):
+    import_started = time.perf_counter()
+    app = load_app(name, upstream)
+    import_ms = round((time.perf_counter() - import_started) * 1000, 1)
+    monitor = LoopLagMonitor()
+
+    @app.get("/__loadtest/stats")
+    async def loadtest_stats(reset: bool = False):
+        return {"service": name, "import_ms": import_ms, "rss": rss_mb(), "loop_lag": monitor.snapshot(reset)}
+
+    monitor_task = asyncio.create_task(monitor.run())
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning",
+                                           backlog=4096, timeout_keep_alive=30))
+    try:
+        await server.serve()
+    finally:
+        monitor_task.cancel()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("app", choices=["agents", "gemini_agents", "flux_agents"])
+    parser.add_argument("--port", type=int, required=True)
+    parser.add_argument("--upstream", required=True, help="base URL of fake_upstreams.py")
+    args = parser.parse_args()
+    asyncio.run(serve(args.app, args.port, args.upstream))
+
+
+if __name__ == "__main__":
+    main()
@@ -193,12 +193,12 @@ export const generateFashionRecommendations = inngest.createFunction(
       }
     });
     
-    if (typeof analysisResultUnknown !== 'string') {
+    if (!isAgentOutput(analysisResultUnknown)) {
       console.error(`[Inngest] STEP 1 FAILED - Invalid analysis result type:`, typeof analysisResultUnknown);
       throw new Error(`Fashion analysis agent returned invalid type: ${typeof analysisResultUnknown}`);
     }
     const analysisResult = analysisResultUnknown;
-    console.log(`[Inngest] STEP 1 COMPLETED - Analysis result length: ${analysisResult.length} characters`);
+    console.log(`[Inngest] STEP 1 COMPLETED - Analysis result received as ${typeof analysisResult === 'string' ? 'text' : 'structured object'}`);
 
     // Step 2: Generate Outfit Recommendations
     console.log(`[Inngest] STEP 2: Starting outfit recommendations for session ${sessionId}`);
@@ -216,12 +216,12 @@ export const generateFashionRecommendations = inngest.createFunction(
       }
     });
     
-    if (typeof recommendationsUnknown !== 'string') {
+    if (!isAgentOutput(recommendationsUnknown)) {
       console.error(`[Inngest] STEP 2 FAILED - Invalid recommendations result type:`, typeof recommendationsUnknown);
       throw new Error(`Outfit recommendation agent returned invalid type: ${typeof recommendationsUnknown}`);
     }
     const recommendations = recommendationsUnknown;
-    console.log(`[Inngest] STEP 2 COMPLETED - Recommendations result length: ${recommendations.length} characters`);
+    console.log(`[Inngest] STEP 2 COMPLETED - Recommendations received as ${typeof recommendations === 'string' ? 'text' : 'structured object'}`);
 
     // Step 3: Generate Visualization Images with Flux-kontext
     console.log(`[Inngest] STEP 3: Starting outfit visualizations for session ${sessionId}`);
@@ -230,7 +230,7 @@ export const generateFashionRecommendations = inngest.createFunction(
     const visualizationsUnknown = await step.run("generate-visualizations", async () => {
       try {
         console.log(`[Inngest] Parsing recommendations JSON...`);
-        const parsedRecommendations = JSON.parse(extractJsonFromMarkdown(recommendations));
+        const parsedRecommendations = parseAgentOutput(recommendations);
         console.log(`[Inngest] Parsed recommendations:`, JSON.stringify(parsedRecommendations, null, 2));
         
         console.log(`[Inngest] Calling generateOutfitVisualizations function...`);
@@ -257,8 +257,8 @@ export const generateFashionRecommendations = inngest.createFunction(
       userId,
       sessionId,
       originalPhoto: photoUrl,
-      analysis: JSON.parse(extractJsonFromMarkdown(analysisResult)),
-      recommendations: JSON.parse(extractJsonFromMarkdown(recommendations)),
+      analysis: parseAgentOutput(analysisResult),
+      recommendations: parseAgentOutput(recommendations),
       visualizations: visualizations.visualizations || [],
       timestamp: new Date().toISOString(),
       userPreferences,
@@ -336,8 +336,8 @@ export const generateFashionRecommendations = inngest.createFunction(
       success: true,
       sessionId,
       resultsUrl: savedResults.url,
-      analysis: JSON.parse(extractJsonFromMarkdown(analysisResult)),
-      recommendations: JSON.parse(extractJsonFromMarkdown(recommendations)),
+      analysis: parseAgentOutput(analysisResult),
+      recommendations: parseAgentOutput(recommendations),
       visualizations: visualizations.visualizations || [],
       processing_time_ms: totalTime,
       message: `Fashion recommendations and visualizations generated for session ${sessionId} in ${totalTime}ms` 
@@ -365,6 +365,18 @@ function extractJsonFromMarkdown(markdownText: string): string {
   return markdownText;
 }
 
+// The agents return a structured object when the model output matches its schema,
+// and the raw model text (possibly fenced JSON) when it does not
+type AgentOutput = string | Record<string, unknown>;
+
+function isAgentOutput(value: unknown): value is AgentOutput {
+  return typeof value === 'string' || (typeof value === 'object' && value !== null && !Array.isArray(value));
+}
+
+function parseAgentOutput(value: AgentOutput): Record<string, unknown> {
+  return typeof value === 'string' ? JSON.parse(extractJsonFromMarkdown(value)) : value;
+}
+
 // Helper function to get the Python fashion agents URL
 function getFashionAgentUrl(): string {
   // Use custom APP_URL if set (recommended approach)
@@ -437,7 +449,7 @@ async function analyzeFashionPhoto(
     const data = await response.json();
     console.log(`[Inngest] Photo analysis response data:`, JSON.stringify(data, null, 2));
     
-    const analysis = data.analysis;
+    const analysis: AgentOutput | undefined = data.analysis;
     
     if (!analysis) {
       console.error(`[Inngest] Fashion analysis agent returned no analysis content for session ${sessionId}`);
@@ -453,7 +465,7 @@ async function analyzeFashionPhoto(
 }
 
 async function generateOutfitRecommendations(
-  analysisResult: string, 
+  analysisResult: AgentOutput, 
   userPreferences: Record<string, unknown>, 
   occasion: string, 
   budgetRange: string, 
@@ -494,7 +506,7 @@ async function generateOutfitRecommendations(
     const data = await response.json();
     console.log(`[Inngest] Outfit recommendations response data:`, JSON.stringify(data, null, 2));
     
-    const recommendations = data.recommendations;
+    const recommendations: AgentOutput | undefined = data.recommendations;
     
     if (!recommendations) {
       console.error(`[Inngest] Outfit recommendation agent returned no recommendations content for session ${sessionId}`);
@@ -0,0 +1,41 @@
+import asyncio
+import time
+
+from api._cache import SingleFlight, SQLiteCache, TieredCache, TTLCache
+
+
+def test_sqlite_get_with_ttl_reports_remaining_time(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=60)
+    disk.set("key", {"a": 1}, ttl_seconds=10)
+    value, remaining = disk.get_with_ttl("key")
+    assert value == {"a": 1}
+    assert 9 < remaining <= 10
+    assert disk.get_with_ttl("missing", "default") == ("default", None)
+
+
+def test_disk_hit_keeps_its_expiry_in_memory(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.db"), ttl_seconds=3600)
+    disk.set("key", "value", ttl_seconds=0.2)
+    cache = TieredCache(TTLCache(max_entries=10, ttl_seconds=3600), disk)
+    assert cache.get("key") == "value"
+    time.sleep(0.25)
+    assert cache.get("key") is None
+
+
+def test_single_flight_does_not_remember_uncacheable_results():
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"fallback": len(calls) == 1}
+
+    flight = SingleFlight(result_ttl_seconds=30, cacheable=lambda result: not result["fallback"])
+
+    async def run():
+        first = await flight.run("key", compute)
+        second = await flight.run("key", compute)
+        third = await flight.run("key", compute)
+        return first, second, third
+
+    assert asyncio.run(run()) == ({"fallback": True}, {"fallback": False}, {"fallback": False})
+    assert len(calls) == 2
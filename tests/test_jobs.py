@@ -0,0 +1,89 @@
+import asyncio
+
+import httpx
+import pytest
+
+from api._jobs import JobQueue, MemoryJobStore, SQLiteJobStore, UnsafeWebhookURL, check_webhook_url, new_job
+
+
+@pytest.mark.parametrize("url", [
+    "ftp://example.com/hook",
+    "http://127.0.0.1/hook",
+    "http://localhost:8080/hook",
+    "http://10.0.0.5/hook",
+    "http://192.168.1.1/hook",
+    "http://169.254.169.254/latest/meta-data",
+    "http://[::1]/hook",
+    "http://[::ffff:127.0.0.1]/hook",
+])
+def test_check_webhook_url_rejects_internal_targets(url):
+    with pytest.raises(UnsafeWebhookURL):
+        asyncio.run(check_webhook_url(url))
+
+
+def test_check_webhook_url_accepts_public_address():
+    asyncio.run(check_webhook_url("https://93.184.215.14/hook"))
+
+
+def test_webhook_to_private_host_is_blocked():
+    posted = []
+    client = httpx.AsyncClient(transport=httpx.MockTransport(lambda request: posted.append(request) or httpx.Response(204)))
+
+    async def handler(job):
+        return {"ok": True}
+
+    async def run():
+        queue = JobQueue(MemoryJobStore(), handler, workers=1, webhook_client=client)
+        job = queue.submit("test", {}, webhook_url="http://127.0.0.1/hook")
+        await asyncio.sleep(0.05)
+        await queue.close()
+        return queue.store.get(job["id"])
+
+    job = asyncio.run(run())
+    assert job["status"] == "succeeded"
+    assert job["webhook_status"] == "blocked"
+    assert not posted
+
+
+def test_webhook_redirects_are_not_followed():
+    posted = []
+
+    def respond(request):
+        posted.append(request.url.host)
+        return httpx.Response(302, headers={"location": "http://127.0.0.1/internal"})
+
+    async def handler(job):
+        return {"ok": True}
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(respond), follow_redirects=True)
+        queue = JobQueue(MemoryJobStore(), handler, workers=1, webhook_client=client)
+        job = queue.submit("test", {}, webhook_url="https://93.184.215.14/hook")
+        await asyncio.sleep(0.05)
+        await queue.close()
+        return queue.store.get(job["id"])
+
+    job = asyncio.run(run())
+    assert job["webhook_status"] == 302
+    assert posted == ["93.184.215.14"]
+
+
+def test_start_resumes_queued_sqlite_jobs(tmp_path):
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+    store.put(new_job("test", {"n": 1}))
+    interrupted = new_job("test", {"n": 2})
+    interrupted["status"] = "running"
+    store.put(interrupted)
+
+    async def handler(job):
+        return job["payload"]["n"]
+
+    async def run():
+        queue = JobQueue(store, handler, workers=1)
+        queue.start()
+        await asyncio.sleep(0.05)
+        await queue.close()
+
+    asyncio.run(run())
+    assert store.stats()["by_status"] == {"succeeded": 1, "failed": 1}
+    assert store.get(interrupted["id"])["error"] == "Interrupted by a restart"
@@ -0,0 +1,52 @@
+from typing import List
+
+from pydantic import BaseModel
+
+from api._json_output import balanced_json_prefix, parse_json_output, parse_model_output, repair_truncated_json
+
+
+class Outfit(BaseModel):
+    name: str
+    colors: List[str]
+
+
+def test_clean_json_validates_against_schema():
+    assert parse_json_output('{"name": "Smart casual", "colors": ["navy"]}', Outfit) == {
+        "name": "Smart casual", "colors": ["navy"]}
+
+
+def test_fenced_json():
+    text = 'Here you go:\n```json\n{"name": "Weekend", "colors": []}\n```'
+    assert parse_json_output(text, Outfit) == {"name": "Weekend", "colors": []}
+
+
+def test_bare_json_followed_by_prose():
+    assert parse_json_output('{"a":1}\nthanks') == {"a": 1}
+    assert parse_json_output('{"a": "}"} Let me know if you need {more}!') == {"a": "}"}
+
+
+def test_prose_wrapped_json():
+    assert parse_json_output('Sure! {"a": {"b": [1, 2]}} Enjoy.') == {"a": {"b": [1, 2]}}
+
+
+def test_truncated_json_is_repaired():
+    assert parse_json_output('{"name": "Office", "colors": ["navy", "cre') == {
+        "name": "Office", "colors": ["navy", "cre"]}
+    assert repair_truncated_json('{"a": [1, 2') == '{"a": [1, 2]}'
+
+
+def test_balanced_json_prefix():
+    assert balanced_json_prefix('x {"a": "[", "b": [1]} y') == '{"a": "[", "b": [1]}'
+    assert balanced_json_prefix('{"a": 1') is None
+    assert balanced_json_prefix("no json here") is None
+
+
+def test_non_json_returns_none():
+    assert parse_json_output("I could not analyze this photo.") is None
+    assert parse_json_output("") is None
+
+
+def test_parse_model_output():
+    model = parse_model_output('{"name": "Date night", "colors": ["black"]}\nHope this helps!', Outfit)
+    assert model == Outfit(name="Date night", colors=["black"])
+    assert parse_model_output('{"unexpected": true}', Outfit) is None
@@ -0,0 +1,51 @@
+import json
+import logging
+import queue
+
+from api._logging import (
+    ContextQueueHandler, JSONFormatter, RequestContextFilter, TextFormatter, debug_enabled, debug_sampled_var,
+)
+
+
+def enqueue_exception() -> logging.LogRecord:
+    log_queue = queue.SimpleQueue()
+    logger = logging.getLogger("test.logging")
+    logger.propagate = False
+    handler = ContextQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter())
+    logger.addHandler(handler)
+    try:
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Request failed for %s", "photo")
+    finally:
+        logger.removeHandler(handler)
+    return log_queue.get_nowait()
+
+
+def test_json_lines_carry_the_traceback_separately():
+    entry = json.loads(JSONFormatter().format(enqueue_exception()))
+    assert entry["msg"] == "Request failed for photo"
+    assert entry["exc_info"].startswith("Traceback")
+    assert "ValueError: boom" in entry["exc_info"]
+
+
+def test_text_lines_still_include_the_traceback():
+    line = TextFormatter().format(enqueue_exception())
+    assert "Request failed for photo" in line
+    assert "ValueError: boom" in line
+
+
+def test_debug_enabled_follows_level_and_request_sampling():
+    logger = logging.getLogger("test.logging.debug")
+    logger.setLevel(logging.DEBUG)
+    token = debug_sampled_var.set(False)
+    try:
+        assert not debug_enabled(logger)
+        debug_sampled_var.set(True)
+        assert debug_enabled(logger)
+        logger.setLevel(logging.INFO)
+        assert not debug_enabled(logger)
+    finally:
+        debug_sampled_var.reset(token)
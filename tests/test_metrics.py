@@ -0,0 +1,48 @@
+from api._metrics import MetricsRegistry
+
+
+def metric_lines(registry: MetricsRegistry, name: str) -> list:
+    return [line for line in registry.render().splitlines() if line.startswith(name)]
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("stage_seconds", "Stage duration", ("stage",), buckets=(1, 5, 0.5))
+    for value in (0.2, 0.7, 3, 7):
+        histogram.observe(value, stage="search")
+    assert metric_lines(registry, "stage_seconds") == [
+        'stage_seconds_bucket{stage="search",le="0.5"} 1',
+        'stage_seconds_bucket{stage="search",le="1.0"} 2',
+        'stage_seconds_bucket{stage="search",le="5.0"} 3',
+        'stage_seconds_bucket{stage="search",le="+Inf"} 4',
+        'stage_seconds_sum{stage="search"} 10.9',
+        'stage_seconds_count{stage="search"} 4',
+    ]
+
+
+def test_histogram_bucket_bounds_are_inclusive():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("size", "Size", buckets=(10,))
+    histogram.observe(10)
+    assert metric_lines(registry, "size_bucket") == ['size_bucket{le="10.0"} 1', 'size_bucket{le="+Inf"} 1']
+
+
+def test_histogram_time_marks_failures():
+    registry = MetricsRegistry()
+    histogram = registry.histogram("call_seconds", "Call duration", ("outcome",))
+    try:
+        with histogram.time(outcome="ok"):
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert 'call_seconds_count{outcome="error"} 1' in metric_lines(registry, "call_seconds_count")
+
+
+def test_render_escapes_label_values_and_documents_each_metric():
+    registry = MetricsRegistry()
+    registry.counter("lookups", "Cache lookups", ("outcome",)).inc(outcome='a"b')
+    assert registry.render().splitlines() == [
+        "# HELP lookups Cache lookups",
+        "# TYPE lookups counter",
+        'lookups_total{outcome="a\\"b"} 1',
+    ]
@@ -0,0 +1,63 @@
+import time
+
+from api._phash import PerceptualHashIndex, hamming_distance
+
+
+def flip(value: int, *bits: int) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+BASE = 0x0F0F_3C3C_A5A5_5A5A
+
+
+def test_nearest_finds_hashes_within_max_distance():
+    index = PerceptualHashIndex(max_distance=4)
+    index.add(BASE, "ctx", "photo")
+    query = flip(BASE, 0, 17, 33, 63)
+    assert hamming_distance(BASE, query) == 4
+    assert index.nearest(query, "ctx") == ("photo", 4)
+    assert index.nearest(flip(query, 50), "ctx") is None
+
+
+def test_nearest_prefers_the_closest_entry():
+    index = PerceptualHashIndex(max_distance=6)
+    index.add(flip(BASE, 1, 2, 3), "ctx", "far")
+    index.add(flip(BASE, 40), "ctx", "near")
+    assert index.nearest(BASE, "ctx") == ("near", 1)
+
+
+def test_nearest_only_compares_entries_sharing_a_block():
+    index = PerceptualHashIndex(max_distance=3)
+    index.add(BASE, "ctx", "photo")
+    index.add(~BASE & (2 ** 64 - 1), "ctx", "inverse")
+    assert index.nearest(flip(BASE, 5), "ctx") == ("photo", 1)
+    assert index.stats()["compared"] == 1
+
+
+def test_nearest_ignores_other_contexts():
+    index = PerceptualHashIndex(max_distance=4)
+    index.add(BASE, "user-a", "photo")
+    assert index.nearest(BASE, "user-b") is None
+    assert index.stats()["misses"] == 1
+
+
+def test_expired_entries_are_dropped_on_lookup():
+    index = PerceptualHashIndex(max_distance=4, ttl_seconds=0.05)
+    index.add(BASE, "ctx", "photo")
+    time.sleep(0.06)
+    assert index.nearest(BASE, "ctx") is None
+    assert len(index) == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    index = PerceptualHashIndex(max_distance=2, max_entries=2)
+    first, second, third = BASE, flip(BASE, *range(0, 64, 4)), flip(BASE, *range(1, 64, 4))
+    index.add(first, "ctx", "first")
+    index.add(second, "ctx", "second")
+    assert index.nearest(first, "ctx") == ("first", 0)
+    index.add(third, "ctx", "third")
+    assert index.nearest(second, "ctx") is None
+    assert index.nearest(first, "ctx") == ("first", 0)
+    assert index.stats()["evictions"] == 1
@@ -0,0 +1,119 @@
+import json
+
+from api import _prompt_budget
+from api._prompt_budget import COLOR_LISTS, compact_json, estimate_tokens, fit_json_to_budget, shorten_words
+
+# A full-length Gemini analysis (~550 tokens as compact JSON)
+GEMINI_ANALYSIS = {
+    "body_analysis": {
+        "body_type": "hourglass",
+        "key_features": [
+            "Defined waist that sits noticeably narrower than the bust and hips",
+            "Balanced shoulder and hip width",
+            "Long legs relative to torso",
+            "Softly rounded shoulders"
+        ],
+        "proportions": "Shoulders and hips are close in width with a clearly defined waist. The torso is slightly shorter than average, which makes the legs appear longer. Overall the frame is balanced and curvy.",
+        "posture_notes": "Stands upright with relaxed shoulders and weight evenly distributed."
+    },
+    "color_analysis": {
+        "skin_undertone": "warm",
+        "complexion_notes": "Medium complexion with golden undertones and a light natural flush on the cheeks.",
+        "best_colors": [
+            "camel",
+            "olive green",
+            "terracotta",
+            "warm ivory",
+            "mustard",
+            "teal"
+        ],
+        "colors_to_avoid": [
+            "icy pastels",
+            "stark white",
+            "cool grey",
+            "fuchsia"
+        ],
+        "hair_color": "dark brown with warm highlights",
+        "eye_color": "hazel"
+    },
+    "current_style_analysis": {
+        "current_outfit": "Loose grey crew-neck sweater over straight-leg blue jeans and white trainers.",
+        "fit_assessment": "The sweater is boxy and hides the waist; the jeans fit well through the hip but are slightly long.",
+        "style_category": "casual",
+        "strengths": [
+            "Comfortable, practical base pieces",
+            "Jeans flatter the hips",
+            "Neutral palette is easy to build on"
+        ],
+        "improvement_areas": [
+            "Define the waist",
+            "Bring warmer colours near the face",
+            "Add structure with a tailored layer",
+            "Hem trousers to the right length"
+        ]
+    },
+    "body_proportion_advice": {
+        "silhouettes_to_emphasize": [
+            "wrap dresses",
+            "high-waisted trousers",
+            "fit-and-flare skirts"
+        ],
+        "areas_to_highlight": [
+            "waist",
+            "legs"
+        ],
+        "styling_techniques": [
+            "Belt loose layers at the natural waist",
+            "Choose V or scoop necklines",
+            "Use mid-weight fabrics that drape rather than cling",
+            "Keep hemlines at the knee or ankle"
+        ]
+    },
+    "occasion_suitability": {
+        "current_appropriateness": "Too casual for a client-facing work setting.",
+        "needed_adjustments": [
+            "Swap the sweater for a fitted knit or blouse",
+            "Add a tailored blazer",
+            "Replace trainers with loafers or block heels"
+        ]
+    },
+    "recommendations_summary": "Build outfits around warm earth tones and pieces that define the waist. Tailored layers and V necklines will balance the hourglass frame while keeping the look polished for work."
+}
+
+
+def test_fits_without_changes_when_under_budget():
+    assert json.loads(fit_json_to_budget(GEMINI_ANALYSIS, 800, COLOR_LISTS)) == GEMINI_ANALYSIS
+
+
+def test_color_lists_are_never_trimmed():
+    fitted = json.loads(fit_json_to_budget(GEMINI_ANALYSIS, 300, COLOR_LISTS))
+    colors = fitted["color_analysis"]
+    assert colors["best_colors"] == GEMINI_ANALYSIS["color_analysis"]["best_colors"]
+    assert colors["colors_to_avoid"] == GEMINI_ANALYSIS["color_analysis"]["colors_to_avoid"]
+
+
+def test_strings_are_shortened_before_list_items_are_dropped():
+    budget = estimate_tokens(compact_json(GEMINI_ANALYSIS)) - 40
+    fitted = json.loads(fit_json_to_budget(GEMINI_ANALYSIS, budget, COLOR_LISTS))
+    assert fitted["body_analysis"]["proportions"] != GEMINI_ANALYSIS["body_analysis"]["proportions"]
+    assert fitted["body_analysis"]["proportions"].endswith(".")
+    for section in ("body_analysis", "current_style_analysis", "body_proportion_advice"):
+        for key, value in GEMINI_ANALYSIS[section].items():
+            if isinstance(value, list):
+                assert len(fitted[section][key]) == len(value)
+
+
+def test_shorten_words_keeps_whole_sentences():
+    text = "First sentence is short. Second sentence is a good deal longer than the first one."
+    assert shorten_words(text, 8) == "First sentence is short."
+    assert shorten_words("one two three four five", 3) == "one two three…"
+    assert shorten_words(text, 50) == text
+
+
+def test_trimming_logs_a_warning(monkeypatch):
+    warnings = []
+    monkeypatch.setattr(_prompt_budget.logger, "warning", lambda msg, *args, **kwargs: warnings.append(msg))
+    fit_json_to_budget(GEMINI_ANALYSIS, 800, COLOR_LISTS)
+    assert not warnings
+    fit_json_to_budget(GEMINI_ANALYSIS, 300, COLOR_LISTS)
+    assert len(warnings) == 1
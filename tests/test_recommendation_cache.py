@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from api._cache import TieredCache, TTLCache
+from api._recommendation_cache import RecommendationCache
+
+
+def make_cache(fresh_seconds: float = 60) -> RecommendationCache:
+    return RecommendationCache(TieredCache(TTLCache(max_entries=10, ttl_seconds=3600)), fresh_seconds)
+
+
+def test_young_entries_are_fresh():
+    cache = make_cache()
+    cache.set("bucket", "recs", {"trends": []})
+    entry, age, stale = cache.get("bucket")
+    assert entry["recommendations"] == "recs" and entry["search_data"] == {"trends": []}
+    assert age < 1 and not stale
+    assert cache.stats()["fresh_hits"] == 1
+    assert cache.get("missing") is None
+
+
+def test_old_entries_are_served_stale():
+    cache = make_cache(fresh_seconds=0.05)
+    cache.set("bucket", "recs", {})
+    time.sleep(0.06)
+    entry, age, stale = cache.get("bucket")
+    assert entry["recommendations"] == "recs"
+    assert stale and age >= 0.05
+    assert cache.stats()["stale_hits"] == 1
+
+
+def test_refresh_runs_once_per_bucket_and_stores_the_result():
+    cache = make_cache(fresh_seconds=0.05)
+    cache.set("bucket", "old", {})
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.01)
+        return "new", {"fresh": True}
+
+    async def run():
+        cache.refresh("bucket", compute)
+        cache.refresh("bucket", compute)
+        await asyncio.sleep(0.05)
+
+    asyncio.run(run())
+    assert len(calls) == 1
+    entry, _, stale = cache.get("bucket")
+    assert entry["recommendations"] == "new" and not stale
+    assert cache.stats()["refreshes"] == 1 and cache.stats()["refreshing"] == 0
+
+
+def test_refresh_returning_none_keeps_the_entry():
+    cache = make_cache()
+    cache.set("bucket", "old", {})
+
+    async def compute():
+        return None
+
+    async def run():
+        cache.refresh("bucket", compute)
+        await asyncio.sleep(0.01)
+
+    asyncio.run(run())
+    assert cache.get("bucket")[0]["recommendations"] == "old"
@@ -0,0 +1,105 @@
+import asyncio
+import time
+
+import pytest
+
+from api._resilience import CircuitBreaker, CircuitOpenError, RetryPolicy, resilient_call
+
+
+class Unavailable(Exception):
+    status_code = 503
+
+
+def open_breaker(reset_timeout_seconds: float = 0.05) -> CircuitBreaker:
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_seconds=reset_timeout_seconds)
+    breaker.record_failure()
+    breaker.record_failure()
+    return breaker
+
+
+def test_breaker_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_seconds=30)
+    breaker.record_failure()
+    assert breaker.state == "closed" and breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_seconds=30)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_probe_through():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+
+def test_half_open_probe_success_closes():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_half_open_probe_failure_reopens():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_released_probe_lets_next_call_probe():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half_open"
+    assert breaker.allow()
+
+
+def test_resilient_call_records_transient_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout_seconds=30)
+
+    async def failing():
+        raise Unavailable("down")
+
+    policy = RetryPolicy(max_attempts=2, base_delay_seconds=0, min_attempt_seconds=0)
+    with pytest.raises(Unavailable):
+        asyncio.run(resilient_call(failing, policy, breaker))
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(resilient_call(failing, policy, breaker))
+
+
+def test_cancelled_probe_releases_half_open_circuit():
+    breaker = open_breaker()
+    time.sleep(0.06)
+    policy = RetryPolicy(max_attempts=1, deadline_seconds=5)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def succeed():
+        return "ok"
+
+    async def run():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(resilient_call(hang, policy, breaker), timeout=0.05)
+        assert breaker.state == "half_open"
+        return await resilient_call(succeed, policy, breaker)
+
+    assert asyncio.run(run()) == "ok"
+    assert breaker.state == "closed"
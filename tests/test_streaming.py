@@ -0,0 +1,61 @@
+import asyncio
+import json
+
+from api._streaming import stream_batch_frames
+
+
+def parse_frames(frames: list) -> list:
+    parsed = []
+    for frame in frames:
+        event_line, data_line = frame.strip().split("\n")
+        parsed.append((event_line[len("event: "):], json.loads(data_line[len("data: "):])))
+    return parsed
+
+
+def collect(worker, keys, limit=4):
+    async def run():
+        return [frame async for frame in stream_batch_frames(worker, keys, limit, key_name="url")]
+
+    return parse_frames(asyncio.run(run()))
+
+
+def test_duplicate_keys_are_computed_once_and_fanned_out():
+    calls = []
+
+    async def worker(key):
+        calls.append(key)
+        return {"value": key.upper()}
+
+    frames = collect(worker, ["a", "b", "a"])
+    assert sorted(calls) == ["a", "b"]
+    items = sorted((data for event, data in frames if event == "item"), key=lambda data: data["index"])
+    assert items == [
+        {"index": 0, "url": "a", "value": "A"},
+        {"index": 1, "url": "b", "value": "B"},
+        {"index": 2, "url": "a", "value": "A"},
+    ]
+    assert frames[-1] == ("done", {"total": 3, "succeeded": 3, "failed": 0})
+
+
+def test_items_arrive_in_completion_order():
+    delays = {"slow": 0.05, "fast": 0.0}
+
+    async def worker(key):
+        await asyncio.sleep(delays[key])
+        return {}
+
+    frames = collect(worker, ["slow", "fast"])
+    assert [data["url"] for event, data in frames if event == "item"] == ["fast", "slow"]
+
+
+def test_failures_become_error_frames():
+    async def worker(key):
+        if key == "bad":
+            raise ValueError("no photo")
+        return {"ok": True}
+
+    frames = collect(worker, ["bad", "good", "bad"])
+    errors = [data for event, data in frames if event == "item" and "error" in data]
+    assert sorted(data["index"] for data in errors) == [0, 2]
+    assert all(data["error"] == "no photo" for data in errors)
+    assert frames[-1] == ("done", {"total": 3, "succeeded": 1, "failed": 2})